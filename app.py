@@ -17,7 +17,8 @@ from config import (
     EMAIL_HOST, EMAIL_PORT, EMAIL_USER, EMAIL_PASSWORD, EMAIL_FROM,
     DEFAULT_RESTAURANT_ID, PROCESSED_DATA_DIRECTORY,  # Added PROCESSED_DATA_DIRECTORY
     BASE_DIR,  # Import BASE_DIR
-    DEMO_RESTAURANT_ID, DEMO_RESTAURANT_NAME, DEMO_MODE_ENABLED
+    DEMO_RESTAURANT_ID, DEMO_RESTAURANT_NAME, DEMO_MODE_ENABLED,
+    SESSION_REAPER_INTERVAL_MINUTES
 )
 from werkzeug.exceptions import HTTPException, InternalServerError
 from asgiref.wsgi import WsgiToAsgi
@@ -216,6 +217,18 @@ if DEMO_MODE_ENABLED:
     logger.info(f"Modo de demostración habilitado para el restaurante {DEMO_RESTAURANT_NAME} (ID: {DEMO_RESTAURANT_ID})")
     initialize_demo_restaurant_if_needed()
 
+# Limpieza periódica de sesiones de WhatsApp expiradas
+from utils.session_manager import start_session_reaper
+start_session_reaper(SESSION_REAPER_INTERVAL_MINUTES * 60)
+
+# Índice de números de WhatsApp de contacto para resolver restaurantes sin escanear la tabla
+from services.restaurant_phone_index import start_phone_index_refresher
+start_phone_index_refresher()
+
+# Envíos diferidos persistentes (feedback, "escribiendo..."): retoma los pendientes tras un reinicio
+from services.twilio.messaging import start_scheduled_sends
+start_scheduled_sends()
+
 # Before request handler to share restaurant information with templates
 @app.before_request
 def before_request():
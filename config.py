@@ -70,4 +70,82 @@ if IS_PRODUCTION:
 else:
     # En desarrollo, usar las rutas del .env
     PDF_DIRECTORY = os.environ.get('PDF_DIRECTORY', str(BASE_DIR / 'data/raw'))
-    PROCESSED_DATA_DIRECTORY = os.environ.get('PROCESSED_DATA_DIRECTORY', str(BASE_DIR / 'data/processed'))
\ No newline at end of file
+    PROCESSED_DATA_DIRECTORY = os.environ.get('PROCESSED_DATA_DIRECTORY', str(BASE_DIR / 'data/processed'))
+# Configuración de sesiones de WhatsApp
+# 'file' escribe un JSON por conversación; 'memory' mantiene un LRU en proceso con escritura diferida a disco;
+# 'sqlite' usa una base SQLite en modo WAL compartida por todos los workers de gunicorn
+SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'file').lower()
+SESSION_CACHE_MAX_ENTRIES = int(os.environ.get('SESSION_CACHE_MAX_ENTRIES', 5000))
+SESSION_FLUSH_INTERVAL = float(os.environ.get('SESSION_FLUSH_INTERVAL', 2))  # segundos entre volcados a disco
+SESSION_DB_PATH = os.environ.get('SESSION_DB_PATH', str(Path(__file__).parent / 'data' / 'sessions.db'))
+SESSION_REAPER_INTERVAL_MINUTES = int(os.environ.get('SESSION_REAPER_INTERVAL_MINUTES', 60))  # 0 desactiva la limpieza periódica
+
+# Caché de configuración de restaurantes por número de Twilio (segundos, 0 desactiva)
+RESTAURANT_CONFIG_CACHE_TTL = int(os.environ.get('RESTAURANT_CONFIG_CACHE_TTL', 300))
+# Cada cuántos segundos se refresca el índice de WhatsApp de contacto -> restaurante (0 = solo al iniciar)
+RESTAURANT_PHONE_INDEX_REFRESH_SECONDS = int(os.environ.get('RESTAURANT_PHONE_INDEX_REFRESH_SECONDS', 300))
+
+# Procesamiento del webhook de WhatsApp: 'sync' responde con TwiML al terminar;
+# 'async' confirma a Twilio de inmediato y procesa en un pool de hilos con un carril ordenado por conversación
+WEBHOOK_PROCESSING_MODE = os.environ.get('WEBHOOK_PROCESSING_MODE', 'sync').lower()
+WEBHOOK_WORKERS = int(os.environ.get('WEBHOOK_WORKERS', 4))
+WEBHOOK_QUEUE_SIZE = int(os.environ.get('WEBHOOK_QUEUE_SIZE', 500))  # mensajes en espera en total
+WEBHOOK_LANE_DEPTH = int(os.environ.get('WEBHOOK_LANE_DEPTH', 20))  # mensajes en espera por conversación
+
+# Clientes REST de Twilio compartidos por cuenta (conexiones keep-alive)
+TWILIO_HTTP_POOL_SIZE = int(os.environ.get('TWILIO_HTTP_POOL_SIZE', 10))
+TWILIO_HTTP_MAX_RETRIES = int(os.environ.get('TWILIO_HTTP_MAX_RETRIES', 2))  # solo errores de conexión
+TWILIO_HTTP_TIMEOUT = float(os.environ.get('TWILIO_HTTP_TIMEOUT', 15))
+
+# Hilos que ejecutan los envíos programados (send_whatsapp_message_async, feedback)
+SCHEDULED_SEND_WORKERS = int(os.environ.get('SCHEDULED_SEND_WORKERS', 4))
+# Planificador persistente de esos envíos: tabla SQLite + un hilo temporizador por proceso
+JOB_SCHEDULER_DB_PATH = os.environ.get('JOB_SCHEDULER_DB_PATH', SESSION_DB_PATH)
+JOB_SCHEDULER_POLL_SECONDS = float(os.environ.get('JOB_SCHEDULER_POLL_SECONDS', 5))  # para ver trabajos de otros procesos
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+JOB_STALE_SECONDS = int(os.environ.get('JOB_STALE_SECONDS', 300))  # trabajo "en ejecución" de un proceso caído
+JOB_RETENTION_HOURS = int(os.environ.get('JOB_RETENTION_HOURS', 48))
+
+# Despachador de mensajes salientes: token bucket por número de origen, prioridades y reintentos ante 429/5xx
+OUTBOUND_DISPATCHER_ENABLED = os.environ.get('OUTBOUND_DISPATCHER_ENABLED', 'true').lower() == 'true'
+OUTBOUND_WORKERS = int(os.environ.get('OUTBOUND_WORKERS', 8))
+OUTBOUND_RATE_PER_SECOND = float(os.environ.get('OUTBOUND_RATE_PER_SECOND', os.environ.get('REMINDER_RATE_PER_SECOND', 5)))
+OUTBOUND_MAX_RETRIES = int(os.environ.get('OUTBOUND_MAX_RETRIES', 3))
+OUTBOUND_BACKOFF_SECONDS = float(os.environ.get('OUTBOUND_BACKOFF_SECONDS', 1))
+OUTBOUND_BACKOFF_MAX_SECONDS = float(os.environ.get('OUTBOUND_BACKOFF_MAX_SECONDS', 30))
+
+# Envío de recordatorios: hilos en paralelo (el límite por número lo aplica el despachador)
+REMINDER_WORKERS = int(os.environ.get('REMINDER_WORKERS', 4))
+REMINDER_ALL_RESTAURANTS = os.environ.get('REMINDER_ALL_RESTAURANTS', 'false').lower() == 'true'  # una corrida para todos los restaurantes activos
+REMINDER_UPDATE_BATCH_SIZE = int(os.environ.get('REMINDER_UPDATE_BATCH_SIZE', 50))  # reservas por UPDATE ... IN (...)
+# Modo ventana deslizante: corridas cada N minutos para las reservas que entran en la ventana
+REMINDER_WINDOW_MINUTES = int(os.environ.get('REMINDER_WINDOW_MINUTES', 15))
+REMINDER_LEAD_HOURS = float(os.environ.get('REMINDER_LEAD_HOURS', 24))  # anticipación del recordatorio
+# Índice de recordatorios enviados por teléfono (lo consulta el webhook al recibir la respuesta)
+REMINDER_INDEX_DB_PATH = os.environ.get('REMINDER_INDEX_DB_PATH', SESSION_DB_PATH)
+REMINDER_INDEX_TTL_HOURS = int(os.environ.get('REMINDER_INDEX_TTL_HOURS', 72))
+# Ventana en la que un mensaje del cliente se toma como respuesta al recordatorio (la vida de una sesión)
+REMINDER_RESPONSE_WINDOW_MINUTES = int(os.environ.get('REMINDER_RESPONSE_WINDOW_MINUTES', 30))
+# Bitácora local de corridas de recordatorios (reanudación sin reenvíos)
+REMINDER_JOURNAL_ENABLED = os.environ.get('REMINDER_JOURNAL_ENABLED', 'true').lower() == 'true'
+REMINDER_JOURNAL_PATH = os.environ.get('REMINDER_JOURNAL_PATH', str(Path(__file__).parent / 'data' / 'reminder_journal.db'))
+REMINDER_JOURNAL_RETENTION_DAYS = int(os.environ.get('REMINDER_JOURNAL_RETENTION_DAYS', 14))
+
+# Agregados diarios de reservas por restaurante/fecha/estado, mantenidos en cada escritura
+DAILY_STATS_ENABLED = os.environ.get('DAILY_STATS_ENABLED', 'true').lower() == 'true'
+DAILY_STATS_DB_PATH = os.environ.get('DAILY_STATS_DB_PATH', SESSION_DB_PATH)
+
+# Caché de ocupación (personas por restaurante y fecha) de los chequeos de capacidad
+OCCUPANCY_CACHE_TTL = int(os.environ.get('OCCUPANCY_CACHE_TTL', 300))
+
+# Capacidad por franjas horarias: tamaño de la franja (15 o 30 min) y minutos que ocupa una reserva
+RESERVATION_SLOT_MINUTES = int(os.environ.get('RESERVATION_SLOT_MINUTES', 30))
+RESERVATION_DURATION_MINUTES = int(os.environ.get('RESERVATION_DURATION_MINUTES', 120))
+
+# Caché del dashboard de administración por restaurante y día (se invalida con cada escritura de reservas)
+DASHBOARD_CACHE_TTL = int(os.environ.get('DASHBOARD_CACHE_TTL', 60))
+
+# Deduplicación de mensajes entrantes por MessageSid ('sqlite' compartido entre workers o 'memory')
+MESSAGE_DEDUP_BACKEND = os.environ.get('MESSAGE_DEDUP_BACKEND', 'sqlite').lower()
+MESSAGE_DEDUP_DB_PATH = os.environ.get('MESSAGE_DEDUP_DB_PATH', SESSION_DB_PATH)
+MESSAGE_DEDUP_TTL_SECONDS = int(os.environ.get('MESSAGE_DEDUP_TTL_SECONDS', 3600))
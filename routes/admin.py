@@ -2,6 +2,8 @@ from flask import render_template, request, redirect, url_for, flash, jsonify, s
 from .admin_routes import admin_bp # Import admin_bp from admin_routes.py
 from utils.auth import login_required 
 from services.file_service import guardar_datos_json, cargar_datos_json
+from services.restaurant_config_cache import invalidate_restaurant_config
+from services.restaurant_phone_index import refresh_phone_index
 import os
 import json
 import logging
@@ -186,6 +188,7 @@ def guardar_menu():
         
         with open(menu_file_path, 'w', encoding='utf-8') as f:
             json.dump(menu_data, f, ensure_ascii=False, indent=2)
+        invalidate_restaurant_config(restaurant_id)
         
         # Return JSON response for AJAX requests, redirect for form submissions
         if is_json_request:
@@ -493,7 +496,13 @@ def save_restaurant_info():
                 
         except Exception as e:
             logger.warning(f"No se pudo actualizar la BD, pero el archivo se guardó: {e}")
-        
+
+        invalidate_restaurant_config(restaurant_id)
+        try:
+            # El WhatsApp de contacto puede haber cambiado; los demás workers lo toman en su próximo refresco
+            refresh_phone_index()
+        except Exception as e:
+            logger.warning(f"No se pudo refrescar el índice de teléfonos de restaurantes: {e}")
         return jsonify({"success": True, "message": "Información del restaurante guardada correctamente"})
         
     except Exception as e:
@@ -1,13 +1,12 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, jsonify, flash, current_app
-from datetime import datetime, timedelta, timezone
-from dateutil.relativedelta import relativedelta
-import json
+from datetime import datetime, timezone
 import os
 import uuid
 from functools import wraps
 from db.supabase_client import supabase
 from services.db.supabase import get_supabase_client, execute_with_retry  # Import robust service
 from services.reservas_service import actualizar_estado_reserva
+from services.dashboard_service import construir_dashboard
 # Usaremos obtener_reservas_proximas directamente desde services.reservas.db
 from services.file_service import guardar_datos_json, cargar_datos_json
 import logging
@@ -418,7 +417,6 @@ DEFAULT_RESTAURANT_DATA = {
 }
 
 import os
-import json
 
 @admin_bp.route('/dashboard', methods=['GET'])
 @login_required
@@ -556,505 +554,45 @@ def dashboard():
             total_reservas_semana = demo_info.get('total_reservas_semana', 0)
             total_reservas_mes = demo_info.get('total_reservas_mes', 0)
         else:
-            now = datetime.now(timezone.utc)
-            start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
-            
-            # For created_at comparisons (timestamps) - Card "Resumen"
-            start_of_day_ts = start_of_day.isoformat()
-            end_of_day_ts = (start_of_day + timedelta(days=1)).isoformat()
-
-            start_of_week_dt = start_of_day - timedelta(days=now.weekday())
-            start_of_week_ts = start_of_week_dt.isoformat()
-            end_of_week_ts = (start_of_week_dt + timedelta(days=7)).isoformat()
-
-            start_of_month_dt = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            start_of_month_ts = start_of_month_dt.isoformat()
-            end_of_month_ts = (start_of_month_dt + relativedelta(months=1)).isoformat()
-
-            # For fecha comparisons (dates) - Card "Estado de Reservas" & other charts
-            today_date_iso = start_of_day.date().isoformat() 
-            
-            # For 'fecha' based monthly charts (distinct from 'Resumen' card's created_at logic)
-            legacy_month_start_date = start_of_day.replace(day=1).date()
-            legacy_month_end_date = (start_of_day.replace(day=1) + relativedelta(months=1)).date()
-            legacy_month_start_date_iso = legacy_month_start_date.isoformat()
-            legacy_month_end_date_iso = legacy_month_end_date.isoformat()
-            
-            logger.info(f"[Estado de Reservas] Buscando reservas desde {legacy_month_start_date_iso} hasta {legacy_month_end_date_iso}")
-
             try:
-                # from services.reservas.db import obtener_reservas_proximas as get_proximas # Not used here
-                reservas_table = 'reservas_prod'
-                id_column = 'restaurante_id'
-                created_at_column = 'created_at' # For "Resumen" card
-                fecha_column = 'fecha' # For "Estado de Reservas" and other charts
-
-                logger.info(f"Consultando reservas en tabla {reservas_table} para restaurante {current_restaurant_id}")
-
-                # Card "Estado de Reservas" (for TODAY using 'fecha')
-                today_card_status_labels = ["Pendiente", "Confirmada", "Cancelada", "No asistió"]
-                today_card_status_counts = [0, 0, 0, 0]
-                today_card_status_map = {
-                    'pendiente': 0,
-                    'Pendiente': 0,
-                    'PENDIENTE': 0,
-                    'confirmada': 1,
-                    'confirmado': 1,
-                    'Confirmada': 1,
-                    'Confirmado': 1,
-                    'CONFIRMADA': 1,
-                    'CONFIRMADO': 1,
-                    'cancelada': 2,
-                    'cancelado': 2,
-                    'Cancelada': 2,
-                    'Cancelado': 2,
-                    'CANCELADA': 2,
-                    'CANCELADO': 2,
-                    'no asistio': 3,
-                    'no_asistio': 3,
-                    'No asistio': 3,
-                    'No asistió': 3,
-                    'NO ASISTIO': 3,
-                    'NO ASISTIÓ': 3
-                }
-                
-                estado_rows_for_today_card_data = []
-                try:
-                    # Debug current state
-                    logger.info(f"[Estado de Reservas] Querying for today ({today_date_iso})")
-                    logger.info(f"[Estado de Reservas] Restaurant ID: {current_restaurant_id}")
-                    
-                    # First get all reservations regardless of date to check data
-                    test_query = (supabase.table(reservas_table)
-                        .select('estado, fecha')
-                        .eq(id_column, current_restaurant_id)
-                        .execute())
-                    
-                    if hasattr(test_query, 'data'):
-                        logger.info(f"[Estado de Reservas] Total reservations found: {len(test_query.data)}")
-                        if test_query.data:
-                            logger.info(f"[Estado de Reservas] Sample reservation: {test_query.data[0]}")
-                            # Log unique estados found
-                            estados = set(r.get('estado', '').strip().lower() for r in test_query.data if r.get('estado'))
-                            logger.info(f"[Estado de Reservas] Unique estados found: {estados}")
-                    
-                        # Get current month's reservations for the status card
-                    all_reservas_response = (supabase.table(reservas_table)
-                        .select('*')
-                        .eq(id_column, current_restaurant_id)
-                        .gte(fecha_column, legacy_month_start_date_iso)
-                        .lt(fecha_column, legacy_month_end_date_iso)
-                        .execute())
-
-                    # Log raw data for debugging
-                    if hasattr(all_reservas_response, 'data') and all_reservas_response.data:
-                        estado_rows_for_today_card_data = all_reservas_response.data
-                        logger.info(f"[Estado de Reservas] Found {len(estado_rows_for_today_card_data)} reservations for current month")
-                        # Log each reservation's estado for debugging
-                        for idx, res in enumerate(estado_rows_for_today_card_data):
-                            logger.info(f"[Estado de Reservas] Reservation {idx + 1}: estado='{res.get('estado')}', fecha='{res.get('fecha')}'")
-                    else:
-                        logger.info("[Estado de Reservas] No reservations found for current month")
-                except Exception as e_usuarios:
-                    logger.error(f"[Estado de Reservas] Error fetching data: {e_usuarios}", exc_info=True)
-
-                today_card_status_counts = [0, 0, 0, 0] 
-                # Reset counters
-                today_card_status_counts = [0, 0, 0, 0]
-                
-                if estado_rows_for_today_card_data:
-                    estado_processed = {}  # For debugging
-                    for record in estado_rows_for_today_card_data:
-                        estado = record.get('estado', '')
-                        if estado:
-                            estado_original = estado
-                            estado = estado.strip()
-                            
-                            # Map estados directamente sin normalización
-                            status_index = None
-                            
-                            # Pendiente
-                            if estado in ['Pendiente', 'PENDIENTE', 'pendiente']:
-                                status_index = 0
-                            # Confirmada/Confirmado
-                            elif estado in ['Confirmada', 'CONFIRMADA', 'confirmada', 'Confirmado', 'CONFIRMADO', 'confirmado']:
-                                status_index = 1
-                            # Cancelada/Cancelado
-                            elif estado in ['Cancelada', 'CANCELADA', 'cancelada', 'Cancelado', 'CANCELADO', 'cancelado']:
-                                status_index = 2
-                            # No asistió
-                            elif estado in ['No asistió', 'NO ASISTIÓ', 'no asistió', 'No asistio', 'NO ASISTIO', 'no asistio']:
-                                status_index = 3
-            
-                            if status_index is not None:
-                                today_card_status_counts[status_index] += 1
-                                estado_processed[estado] = estado_processed.get(estado, 0) + 1
-                                logger.info(f"[Estado de Reservas] Procesado estado: {estado_original} -> índice {status_index} -> {today_card_status_labels[status_index]}")
-                            else:
-                                logger.warning(f"[Estado de Reservas] Estado no reconocido: {estado_original}")
-    
-                    # Log detailed estado processing
-                    logger.info(f"[Estado de Reservas] Processed estados (raw): {estado_processed}")
-                    logger.info(f"[Estado de Reservas] Final counts by estado: {dict(zip(today_card_status_labels, today_card_status_counts))}")
-                    logger.info(f"[Estado de Reservas] Total reservations processed: {sum(today_card_status_counts)}")
-                
+                # Una sola lectura de reservas y agregación en memoria de todas las tarjetas y gráficos
+                dashboard_data = construir_dashboard(supabase, current_restaurant_id, current_app.root_path)
+
+                proximas_reservas_lista = dashboard_data['proximas_reservas']
+                # Card "Resumen" (counts by created_at)
+                total_reservas_hoy = dashboard_data['today_count']
+                total_reservas_semana = dashboard_data['week_count']
+                total_reservas_mes = dashboard_data['month_count']
+                # Card "Estado de Reservas" (current month by fecha)
+                today_card_status_labels = dashboard_data['status_labels']
+                today_card_status_counts = dashboard_data['status_counts']
+                # Monthly Trend chart (by fecha)
+                month_labels_trend = dashboard_data['month_labels']
+                reservation_trend_counts = dashboard_data['reservation_trend']
+                confirmed_trend_counts = dashboard_data['confirmed_trend']
+                pending_trend_counts = dashboard_data['pending_trend']
+                no_asistio_trend_counts = dashboard_data['no_asistio_trend']
+                canceladas_trend_counts = dashboard_data['canceladas_trend']
+                # Daily chart for the current month (by fecha)
+                dias_labels_chart = dashboard_data['dias_labels']
+                reservas_counts_daily_chart = dashboard_data['reservas_counts']
+                personas_counts_diarias_chart = dashboard_data['personas_counts_diarias']
+                ocupacion_diaria_pct_chart = dashboard_data['ocupacion_diaria_pct']
+                # Top Clientes chart (confirmed reservations by fecha)
+                top_clientes_labels_chart = dashboard_data['top_clientes_labels']
+                top_clientes_counts_chart = dashboard_data['top_clientes_counts']
+
+                logger.info(f"Resumen de conteos (created_at) - hoy: {total_reservas_hoy}, semana: {total_reservas_semana}, mes: {total_reservas_mes}")
                 logger.info(f"[Estado de Reservas] Final counts: {dict(zip(today_card_status_labels, today_card_status_counts))}")
-
-                # Card "Resumen" (Counts using 'created_at')
-                logger.info(f"Querying for 'Resumen' card using '{created_at_column}'")
-
-                # Hoy (created_at)
-                logger.info(f"Resumen - Hoy: Querying {created_at_column} between {start_of_day_ts} and {end_of_day_ts}")
-                count_response_hoy = (supabase.table(reservas_table)
-                    .select('id', count='exact')
-                    .eq(id_column, current_restaurant_id)
-                    .gte(created_at_column, start_of_day_ts)
-                    .lt(created_at_column, end_of_day_ts)
-                    .execute())
-                total_reservas_hoy = count_response_hoy.count if hasattr(count_response_hoy, 'count') and count_response_hoy.count is not None else 0
-                logger.info(f"Resumen - Hoy: Found {total_reservas_hoy} reservations (using {created_at_column})")
-
-                # Semana (created_at)
-                logger.info(f"Resumen - Semana: Querying {created_at_column} between {start_of_week_ts} and {end_of_week_ts}")
-                count_response_semana = (supabase.table(reservas_table)
-                    .select('id', count='exact')
-                    .eq(id_column, current_restaurant_id)
-                    .gte(created_at_column, start_of_week_ts)
-                    .lt(created_at_column, end_of_week_ts)
-                    .execute())
-                total_reservas_semana = count_response_semana.count if hasattr(count_response_semana, 'count') and count_response_semana.count is not None else 0
-                logger.info(f"Resumen - Semana: Found {total_reservas_semana} reservations (using {created_at_column})")
-                
-                # Mes (created_at)
-                logger.info(f"Resumen - Mes: Querying {created_at_column} between {start_of_month_ts} and {end_of_month_ts}")
-                count_response_mes = (supabase.table(reservas_table)
-                    .select('id', count='exact')
-                    .eq(id_column, current_restaurant_id)
-                    .gte(created_at_column, start_of_month_ts)
-                    .lt(created_at_column, end_of_month_ts)
-                    .execute())
-                total_reservas_mes = count_response_mes.count if hasattr(count_response_mes, 'count') and count_response_mes.count is not None else 0
-                logger.info(f"Resumen - Mes: Found {total_reservas_mes} reservations (using {created_at_column})")
-
-                logger.info(f"Resumen de conteos ({created_at_column}) - hoy: {total_reservas_hoy}, semana: {total_reservas_semana}, mes: {total_reservas_mes}")
-
-                # Monthly status chart (using 'fecha')
-                monthly_chart_status_labels = ["Pendiente", "Confirmada", "Cancelada", "No asistió"] 
-                monthly_chart_status_counts = [0, 0, 0, 0] 
-                monthly_chart_status_map = {
-                    'pendiente': 0,
-                    'Pendiente': 0,
-                    'PENDIENTE': 0,
-                    'confirmada': 1,
-                    'confirmado': 1,
-                    'Confirmada': 1,
-                    'Confirmado': 1,
-                    'CONFIRMADA': 1,
-                    'CONFIRMADO': 1,
-                    'cancelada': 2,
-                    'cancelado': 2,
-                    'Cancelada': 2,
-                    'Cancelado': 2,
-                    'CANCELADA': 2,
-                    'CANCELADO': 2,
-                    'no asistio': 3,
-                    'no_asistio': 3,
-                    'No asistio': 3,
-                    'No asistió': 3,
-                    'NO ASISTIO': 3,
-                    'NO ASISTIÓ': 3
-                }
-                try:
-                    logger.info(f"Querying for monthly status chart using '{fecha_column}' between {legacy_month_start_date_iso} and {legacy_month_end_date_iso}")
-                    estado_rows_for_monthly_chart = (supabase.table(reservas_table)
-                        .select('estado')
-                        .eq(id_column, current_restaurant_id)
-                        .gte(fecha_column, legacy_month_start_date_iso)
-                        .lt(fecha_column, legacy_month_end_date_iso)
-                        .execute())
-
-                    if hasattr(estado_rows_for_monthly_chart, 'data') and estado_rows_for_monthly_chart.data:
-                        _internal_monthly_chart_counter = {}
-                        for record in estado_rows_for_monthly_chart.data:
-                            estado_db = record.get('estado', '').strip()
-                            estado_original = estado_db
-                            estado_db = estado_db.lower()
-                            
-                            # Map estados directamente sin normalización
-                            status_index = None
-                            
-                            # Pendiente
-                            if estado_db in ['pendiente']:
-                                status_index = 0
-                            # Confirmada/Confirmado
-                            elif estado_db in ['confirmada', 'confirmado']:
-                                status_index = 1
-                            # Cancelada/Cancelado
-                            elif estado_db in ['cancelada', 'cancelado']:
-                                status_index = 2
-                            # No asistió
-                            elif estado_db in ['no asistió', 'no asistio']:
-                                status_index = 3
-
-                            if status_index is not None:
-                                monthly_chart_status_counts[status_index] += 1
-                                logger.info(f"[Monthly Chart] Procesado estado: {estado_original} -> índice {status_index} -> {monthly_chart_status_labels[status_index]}")
-                            else:
-                                logger.warning(f"[Monthly Chart] Estado no reconocido: {estado_original}")
-                        
-                        logger.info(f"[Monthly Chart] Final counts: {dict(zip(monthly_chart_status_labels, monthly_chart_status_counts))}")
-                    logger.info(f"Monthly chart status_counts: {monthly_chart_status_counts}")
-                except Exception as e:
-                    logger.error(f"Error processing monthly status chart data (using {fecha_column}): {e}", exc_info=True)
-                    monthly_chart_status_counts = [0,0,0,0]
-
-                # Top Clientes chart data (using confirmed reservations)
-                top_clientes_labels_chart = []
-                top_clientes_counts_chart = []
-                try:
-                    logger.info("[Top Clientes] Starting query")
-                    
-                    three_months_ago_dt_chart = start_of_month_dt - relativedelta(months=3)
-                    today_dt_chart = now.date()
-                    three_months_ago_iso_chart = three_months_ago_dt_chart.date().isoformat()
-                    today_iso_chart = today_dt_chart.isoformat()
-
-                    logger.info(f"Calculando top clientes desde {three_months_ago_iso_chart} hasta {today_iso_chart}")
-                    
-                    # Query all reservations for the date range with the correct column name
-                    raw_response = (supabase.table(reservas_table)
-                        .select('nombre_cliente, estado, fecha')  # Using correct column name 'nombre_cliente'
-                        .eq(id_column, current_restaurant_id)
-                        .gte(fecha_column, three_months_ago_iso_chart)
-                        .lt(fecha_column, today_iso_chart)
-                        .execute())
-
-                    if hasattr(raw_response, 'data') and raw_response.data:
-                        logger.info(f"[Top Clientes] Found {len(raw_response.data)} total reservations")
-                        
-                        client_confirmations = {}
-                        for res in raw_response.data:
-                            estado = res.get('estado', '').strip().lower()
-                            # Only count confirmed reservations
-                            if estado in ['confirmada', 'confirmado']:
-                                client_name = res.get('nombre_cliente', 'Sin nombre').strip()  # Using correct column name
-                                if client_name:
-                                    client_confirmations[client_name] = client_confirmations.get(client_name, 0) + 1
-                                    logger.info(f"Confirmed reservation - Cliente: {client_name}, Estado: {estado}")
-            
-                        logger.info(f"[Top Clientes] Client confirmations: {client_confirmations}")
-            
-                        # Convert to sorted list and take top 5
-                        sorted_clients = sorted(client_confirmations.items(), key=lambda x: x[1], reverse=True)[:5]
-                        if sorted_clients:
-                            # Unzip the sorted pairs into two lists
-                            top_clientes_labels_chart = [name for name, _ in sorted_clients]
-                            top_clientes_counts_chart = [count for _, count in sorted_clients]
-                            logger.info(f"[Top Clientes] Final data: {dict(zip(top_clientes_labels_chart, top_clientes_counts_chart))}")
-                        else:
-                            logger.info("[Top Clientes] No confirmed reservations found for any client")
-                    else:
-                        logger.info("[Top Clientes] No reservations data found")
-
-                except Exception as e:
-                    logger.error(f"[Top Clientes] Error processing chart data: {e}", exc_info=True)
-                    top_clientes_labels_chart = []
-                    top_clientes_counts_chart = []
-
-                # Daily data for current month chart (using 'fecha')
-                dias_labels_chart = []
-                reservas_counts_daily_chart = [] 
-                personas_counts_diarias_chart = [] 
-                ocupacion_diaria_pct_chart = [] 
-                try:
-                    current_chart_day_dt = start_of_month_dt 
-                    while current_chart_day_dt.date() <= now.date(): 
-                        day_label_for_chart = current_chart_day_dt.strftime('%d/%m')
-                        dias_labels_chart.append(day_label_for_chart)
-                        
-                        day_iso_start = current_chart_day_dt.date().isoformat()
-                        day_iso_end = (current_chart_day_dt.date() + timedelta(days=1)).isoformat()
-
-                        logger.debug(f"Daily chart: querying '{fecha_column}' between {day_iso_start} and {day_iso_end}")
-                        day_reservas_for_chart = (supabase.table(reservas_table)
-                            .select('id, personas')
-                            .eq(id_column, current_restaurant_id)
-                            .gte(fecha_column, day_iso_start)
-                            .lt(fecha_column, day_iso_end)
-                            .execute())
-
-                        reservas_count_for_day = len(day_reservas_for_chart.data) if hasattr(day_reservas_for_chart, 'data') and day_reservas_for_chart.data else 0
-                        personas_count_for_day = sum(r.get('personas', 0) for r in (day_reservas_for_chart.data or []))
-                        
-                        reservas_counts_daily_chart.append(reservas_count_for_day)
-                        personas_counts_diarias_chart.append(personas_count_for_day)
-                        
-                        # Get max_capacity from restaurant-specific info file
-                        restaurant_info = {}
-                        try:
-                            info_file_path = os.path.join(current_app.root_path, 'data', 'info', f'{current_restaurant_id}_info.json')
-                            with open(info_file_path, 'r') as f:
-                                restaurant_info = json.load(f)
-                            max_capacity = int(restaurant_info.get('capacity', {}).get('max_capacity', 100))
-                            logger.debug(f"Max capacity loaded from {info_file_path}: {max_capacity}")
-                        except Exception as e:
-                            logger.warning(f"Could not load max_capacity from restaurant info file for {current_restaurant_id}, using default 100: {e}")
-                            max_capacity = 100
-                        
-                        # Debug logging para investigar el problema de ocupación
-                        ocupacion_pct_for_day = (personas_count_for_day / max_capacity * 100) if max_capacity > 0 else 0
-                        logger.info(f"DEBUG OCUPACIÓN - Día: {current_chart_day_dt.strftime('%Y-%m-%d')}, Personas: {personas_count_for_day}, Max Capacity: {max_capacity}, Ocupación %: {ocupacion_pct_for_day:.1f}")
-                        
-                        ocupacion_diaria_pct_chart.append(round(ocupacion_pct_for_day, 1))
-                        
-                        current_chart_day_dt += timedelta(days=1)
-                    logger.info(f"Datos diarios (chart - {fecha_column}) generados - días: {len(dias_labels_chart)}")
-                except Exception as e:
-                    logger.error(f"Error processing daily chart data (using {fecha_column}): {e}", exc_info=True)
-                    dias_labels_chart, reservas_counts_daily_chart, personas_counts_diarias_chart, ocupacion_diaria_pct_chart = [], [], [], []
-                
-                # Monthly Trend chart (using 'fecha')
-                month_labels_trend = []
-                reservation_trend_counts = []
-                confirmed_trend_counts = []
-                pending_trend_counts = []
-                no_asistio_trend_counts = []
-                canceladas_trend_counts = []
-                try:
-                    for i in range(5, -1, -1):
-                        month_start_dt_trend = start_of_month_dt - relativedelta(months=i)
-                        month_end_dt_trend = month_start_dt_trend + relativedelta(months=1)
-                        
-                        month_label_for_trend = month_start_dt_trend.strftime('%B %Y')
-                        month_labels_trend.append(month_label_for_trend)
-                        
-                        month_start_iso_trend = month_start_dt_trend.date().isoformat()
-                        month_end_iso_trend = month_end_dt_trend.date().isoformat()
-
-                        total_response_trend = (supabase.table(reservas_table)
-                            .select('id', count='exact')
-                            .eq(id_column, current_restaurant_id)
-                            .gte(fecha_column, month_start_iso_trend)
-                            .lt(fecha_column, month_end_iso_trend)
-                            .execute())
-                        reservation_trend_counts.append(total_response_trend.count if hasattr(total_response_trend, 'count') and total_response_trend.count is not None else 0)
-                        
-                        month_estado_rows_trend = (supabase.table(reservas_table)
-                            .select('estado')
-                            .eq(id_column, current_restaurant_id)
-                            .gte(fecha_column, month_start_iso_trend)
-                            .lt(fecha_column, month_end_iso_trend)
-                            .execute())
-                        
-                        estado_counts_map_for_trend = {'pendiente': 0, 'confirmada': 0, 'cancelada': 0, 'no_asistio': 0}
-                        if hasattr(month_estado_rows_trend, 'data') and month_estado_rows_trend.data:
-                            for record in month_estado_rows_trend.data:
-                                estado_db_trend = record.get('estado', '').strip().lower()
-                                if estado_db_trend == "no asistio": # Handle space
-                                    estado_db_trend = "no_asistio"
-                                if estado_db_trend in estado_counts_map_for_trend:
-                                    estado_counts_map_for_trend[estado_db_trend] += 1
-                        
-                        confirmed_trend_counts.append(estado_counts_map_for_trend['confirmada'])
-                        pending_trend_counts.append(estado_counts_map_for_trend['pendiente'])
-                        no_asistio_trend_counts.append(estado_counts_map_for_trend['no_asistio'])
-                        canceladas_trend_counts.append(estado_counts_map_for_trend['cancelada'])
-                    logger.info(f"Monthly trend data (using {fecha_column}) generated for {len(month_labels_trend)} months.")
-                except Exception as e:
-                    logger.error(f"Error generating monthly trend data (using {fecha_column}): {e}", exc_info=True)
-                    month_labels_trend, reservation_trend_counts, confirmed_trend_counts, pending_trend_counts, no_asistio_trend_counts, canceladas_trend_counts = [],[],[],[],[],[]
-
-                # Top Clients chart (using 'fecha')
-                top_clientes_labels_chart = []
-                top_clientes_counts_chart = []
-                try:
-                    three_months_ago_dt_chart = start_of_month_dt - relativedelta(months=3)
-                    today_dt_chart = now.date()
-                    three_months_ago_iso_chart = three_months_ago_dt_chart.date().isoformat()
-                    today_iso_chart = today_dt_chart.isoformat()
-
-                    logger.info(f"Calculando top clientes desde {three_months_ago_iso_chart} hasta {today_iso_chart}")
-                    logger.info(f"Buscando top clientes con: restaurant_id={current_restaurant_id}, desde={three_months_ago_iso_chart}, hasta={today_iso_chart}")
-
-                    # Add detailed debug logging for top clientes query
-                    logger.info(f"Top clientes - Comprobando la tabla '{reservas_table}'")
-                    test_response = (supabase.table(reservas_table)
-                        .select('nombre_cliente, estado, fecha')  # Changed to use correct column name
-                        .eq(id_column, current_restaurant_id)
-                        .execute())
-                    logger.info(f"Total reservations for restaurant: {len(test_response.data) if hasattr(test_response, 'data') and test_response.data else 0}")
-                    
-                    test_response_confirmed = (supabase.table(reservas_table)
-                        .select('nombre_cliente, estado, fecha')
-                        .eq(id_column, current_restaurant_id)
-                        .eq('estado', 'Confirmada')
-                        .execute())
-                    logger.info(f"Total confirmed reservations for restaurant: {len(test_response_confirmed.data) if hasattr(test_response_confirmed, 'data') and test_response_confirmed.data else 0}")
-                    if hasattr(test_response_confirmed, 'data') and test_response_confirmed.data:
-                        logger.info(f"Sample confirmed reservation: {test_response_confirmed.data[0]}")
-
-                    # Debug date filters
-                    logger.info(f"Filtros de fecha: {fecha_column} >= {three_months_ago_iso_chart} and < {today_iso_chart}")
-
-                    # Query all reservations for the date range first
-                    top_clients_response = (supabase.table(reservas_table)
-                        .select('nombre_cliente, estado, fecha')  # Changed to use correct column name
-                        .eq(id_column, current_restaurant_id)
-                        .gte(fecha_column, three_months_ago_iso_chart)
-                        .lt(fecha_column, today_iso_chart)
-                        .execute())
-
-                    logger.info(f"Total reservations found: {len(top_clients_response.data) if hasattr(top_clients_response, 'data') else 0}")
-
-                    if hasattr(top_clients_response, 'data') and top_clients_response.data:
-                        client_confirmations = {}
-                        for res in top_clients_response.data:
-                            estado = res.get('estado', '').strip().lower()
-                            # Only count confirmed reservations
-                            # Case-insensitive check for 'Confirmada' status
-                            if estado in ['confirmada', 'confirmado', 'Confirmada', 'Confirmado']:
-                                client_name = res.get('nombre_cliente', 'Sin nombre').strip()
-                                fecha = res.get('fecha', '')
-                                if client_name and client_name != 'Sin nombre':
-                                    client_confirmations[client_name] = client_confirmations.get(client_name, 0) + 1
-                                    logger.info(f"Confirmed reservation - Cliente: {client_name}, Fecha: {fecha}, Estado: {estado}")
-                                
-                        logger.info(f"Top clientes encontrados: {client_confirmations}")
-                        
-                        sorted_clients = sorted(client_confirmations.items(), key=lambda item: item[1], reverse=True)[:8] # Top 8
-                        for name, count_val in sorted_clients:
-                            top_clientes_labels_chart.append(name)
-                            top_clientes_counts_chart.append(count_val)
-                    logger.info(f"Top clients data (using {fecha_column}) generated: {len(top_clientes_labels_chart)} clients.")
-                except Exception as e:
-                    logger.error(f"Error generating top clients data (using {fecha_column}): {e}", exc_info=True)
-                    top_clientes_labels_chart, top_clientes_counts_chart = [], []
-
-                # Obtener próximas reservas
-                try:
-                    logger.info("Obteniendo próximas reservas para el dashboard")
-                    proximas_response = supabase.table(reservas_table).select('*').eq(id_column, current_restaurant_id).gte('fecha', now.date().isoformat()).neq('estado', 'Cancelada').order('fecha', desc=False).order('hora', desc=False).limit(10).execute()
-                    
-                    if proximas_response.data:
-                        proximas_reservas_lista = proximas_response.data
-                        logger.info(f"Cargadas {len(proximas_reservas_lista)} próximas reservas para el dashboard")
-                    else:
-                        proximas_reservas_lista = []
-                        logger.info("No se encontraron próximas reservas")
-                except Exception as e:
-                    logger.error(f"Error obteniendo próximas reservas: {e}", exc_info=True)
-                    proximas_reservas_lista = []
-                
                 logger.info(f"Dashboard data preparation complete.")
                 
             except Exception as e:
                 logger.error(f"Critical error during dashboard data preparation block: {e}", exc_info=True)
                 # Initialize all potentially undefined variables to safe defaults for the template
+                proximas_reservas_lista = []
                 today_card_status_labels = ["Pendiente", "Confirmada", "Cancelada", "No asistió"]
                 today_card_status_counts = [0,0,0,0]
                 total_reservas_hoy, total_reservas_semana, total_reservas_mes = 0,0,0
-                monthly_chart_status_labels = ["Pendiente", "Confirmada", "Cancelada", "No asistió"]
-                monthly_chart_status_counts = [0,0,0,0]
                 dias_labels_chart, reservas_counts_daily_chart, personas_counts_diarias_chart, ocupacion_diaria_pct_chart = [],[],[],[]
                 month_labels_trend, reservation_trend_counts, confirmed_trend_counts, pending_trend_counts, no_asistio_trend_counts, canceladas_trend_counts = [],[],[],[],[],[]
                 top_clientes_labels_chart, top_clientes_counts_chart = [], []
@@ -94,7 +94,7 @@ def validar_disponibilidad_endpoint():
         try:
             # Run the async function in the current thread
             disponible_capacidad, msg_capacidad, _ = asyncio.run(
-                verificar_capacidad_disponible(fecha_formateada, personas, restaurant_config)
+                verificar_capacidad_disponible(fecha_formateada, personas, restaurant_config, hora_str)
             )
         except Exception as e:
             logger.error(f"Error validating capacity: {str(e)}")
@@ -86,7 +86,7 @@ def validar_disponibilidad_endpoint():
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
             disponible_capacidad, msg_capacidad, _ = loop.run_until_complete(
-                verificar_capacidad_disponible(fecha_formateada, personas, restaurant_config)
+                verificar_capacidad_disponible(fecha_formateada, personas, restaurant_config, hora_str)
             )
             loop.close()
         except Exception as e:
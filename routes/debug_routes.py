@@ -55,6 +55,35 @@ def debug_supabase():
     
     return jsonify(debug_info)
 
+@debug_bp.route('/webhook-stats')
+def debug_webhook_stats():
+    """Contadores del webhook de WhatsApp: deduplicación por MessageSid, cola asíncrona, caché de configuración, índice de recordatorios, despachador saliente y envíos programados"""
+    from config import WEBHOOK_PROCESSING_MODE
+    from services.twilio.idempotency import get_dedup_stats
+    from services.restaurant_config_cache import get_cache_stats
+    from services.reminder_index import get_reminder_index_stats
+    from services.twilio.dispatcher import get_dispatcher_stats
+    from services.job_scheduler import get_job_scheduler_stats
+    from services.dashboard_service import get_dashboard_cache_stats
+    from services.reservas.ocupacion import get_occupancy_cache_stats
+    from services.reservas.franjas import get_franjas_cache_stats
+
+    stats = {
+        "processing_mode": WEBHOOK_PROCESSING_MODE,
+        "message_dedup": get_dedup_stats(),
+        "restaurant_config_cache": get_cache_stats(),
+        "reminder_index": get_reminder_index_stats(),
+        "outbound_dispatcher": get_dispatcher_stats(),
+        "scheduled_jobs": get_job_scheduler_stats(),
+        "dashboard_cache": get_dashboard_cache_stats(),
+        "occupancy_cache": get_occupancy_cache_stats(),
+        "slot_cache": get_franjas_cache_stats()
+    }
+    if WEBHOOK_PROCESSING_MODE == 'async':
+        from services.twilio.webhook_queue import get_webhook_pool
+        stats["queue"] = get_webhook_pool().get_stats()
+    return jsonify(stats)
+
 @debug_bp.route('/env')
 def debug_env():
     """Endpoint para debuggear variables de entorno (sin mostrar valores sensibles)"""
@@ -2,7 +2,6 @@ from flask import Blueprint, request, jsonify
 from twilio.twiml.messaging_response import MessagingResponse
 import logging
 import traceback
-import re
 import json
 import os
 from datetime import datetime, timedelta
@@ -14,12 +13,25 @@ from utils.db import supabase_client
 from utils.session_manager import get_session, save_session, delete_session
 from services.email_service import enviar_correo_confirmacion
 from services.twilio.handler import handle_whatsapp_message
+from services.twilio.webhook_queue import get_webhook_pool, conversation_key
+from services.twilio.idempotency import claim_message, release_message
+from config import WEBHOOK_PROCESSING_MODE
+from services.restaurant_phone_index import lookup_restaurant_id_by_whatsapp, ensure_phone_index
+from services.restaurant_config_cache import (
+    normalize_twilio_number, get_cached_restaurant_config, cache_restaurant_config,
+    cache_restaurant_config_miss, is_restaurant_config_miss, attach_local_restaurant_files
+)
 
 twilio_bp = Blueprint('twilio', __name__, url_prefix='')
 
 # Configuración de logging
 logger = logging.getLogger(__name__)
 
+# Marca de "no hay restaurante para este número" (distinta de None, que execute_with_retry usa para errores)
+RESTAURANT_NOT_FOUND = object()
+# No encontrado sin el índice de teléfonos armado: no se cachea, puede ser un falso negativo
+RESTAURANT_NOT_FOUND_UNINDEXED = object()
+
 def get_restaurant_config_by_twilio_number(twilio_to_number: str):
     """
     Obtiene la configuración de un restaurante desde Supabase usando el número de Twilio 'To'.
@@ -31,6 +43,17 @@ def get_restaurant_config_by_twilio_number(twilio_to_number: str):
         logger.error("Número de Twilio no proporcionado para buscar configuración.")
         return None
 
+    # Normalizar el número
+    normalized_number = normalize_twilio_number(twilio_to_number)
+
+    cached_config = get_cached_restaurant_config(normalized_number)
+    if cached_config:
+        logger.info(f"⚡ Configuración en caché para {normalized_number}: {cached_config.get('nombre')} (ID: {cached_config.get('id')})")
+        return cached_config
+    if is_restaurant_config_miss(normalized_number):
+        logger.info(f"⚡ Número {normalized_number} sin restaurante asignado (en caché)")
+        return None
+
     # Intentar reconectar si no hay cliente
     if not supabase_client:
         logger.warning("Cliente Supabase no inicializado. Reintentando conexión...")
@@ -45,11 +68,6 @@ def get_restaurant_config_by_twilio_number(twilio_to_number: str):
         except Exception as e:
             logger.error(f"Error al reconectar Supabase: {str(e)}")
             return None
-
-    # Normalizar el número
-    normalized_number = twilio_to_number.strip()
-    if normalized_number.startswith('whatsapp:'):
-        normalized_number = normalized_number.split('whatsapp:')[1].strip()
     
     logger.info(f"🔍 Buscando configuración para: {normalized_number}")
 
@@ -65,57 +83,45 @@ def get_restaurant_config_by_twilio_number(twilio_to_number: str):
         if response.data:
             return response.data[0]
         
-        # Si no encuentra, buscar en info_json.contact.whatsapp
-        logger.info("🔍 Buscando en números de WhatsApp...")
-        local_number = re.sub(r'\D', '', normalized_number)[-10:]
+        if not ensure_phone_index(supabase_client):
+            # Sin índice no se recorre la tabla en el webhook: miss sin cachear hasta que se arme
+            return RESTAURANT_NOT_FOUND_UNINDEXED
+
+        # Si no encuentra, buscar en info_json.contact.whatsapp usando el índice precalculado
+        restaurant_id = lookup_restaurant_id_by_whatsapp(normalized_number)
+        if not restaurant_id:
+            return RESTAURANT_NOT_FOUND
+        logger.info(f"🔍 Número de WhatsApp indexado para restaurante {restaurant_id}")
         
-        all_restaurants = supabase_client.table('restaurantes') \
+        response = supabase_client.table('restaurantes') \
             .select('id, nombre, config, menu, info_json, estado') \
+            .eq('id', restaurant_id) \
             .eq('estado', 'activo') \
             .execute()
         
-        # Filtrar manualmente
-        for restaurant in all_restaurants.data:
-            info_json = restaurant.get('info_json', {})
-            contact = info_json.get('contact', {})
-            whatsapp = re.sub(r'\D', '', contact.get('whatsapp', ''))[-10:]
-            if whatsapp == local_number:
-                return restaurant
-        
-        return None
+        return response.data[0] if response.data else RESTAURANT_NOT_FOUND
 
     try:
         # Ejecutar con retry usando la función helper
         from services.db.supabase import execute_with_retry
         restaurant_data = execute_with_retry(query_restaurant)
         
-        if restaurant_data:
+        if restaurant_data is RESTAURANT_NOT_FOUND:
+            # Solo se cachea el "no encontrado" real; None significa que fallaron todos los reintentos
+            logger.warning(f"❌ No se encontró restaurante para: {normalized_number}")
+            cache_restaurant_config_miss(normalized_number)
+            return None
+        elif restaurant_data is RESTAURANT_NOT_FOUND_UNINDEXED:
+            logger.warning(f"❌ No se encontró restaurante para: {normalized_number} (índice de teléfonos no disponible, no se cachea)")
+            return None
+        elif restaurant_data:
             logger.info(f"✅ Restaurante encontrado: {restaurant_data.get('nombre')} (ID: {restaurant_data.get('id')})")
             
             # Agregar campo nombre_restaurante para compatibilidad
             restaurant_data['nombre_restaurante'] = restaurant_data.get('nombre')
             
-            # Cargar datos JSON del restaurante
-            restaurant_id = restaurant_data.get('id')
-            if restaurant_id:
-                # Cargar archivos locales
-                try:
-                    import json
-                    
-                    # Cargar menú
-                    menu_file = os.path.join(os.getcwd(), 'data', 'menus', f"{restaurant_id}_menu.json")
-                    if os.path.exists(menu_file):
-                        with open(menu_file, 'r', encoding='utf-8') as f:
-                            restaurant_data['menu_json'] = json.load(f)
-                    
-                    # Cargar info
-                    info_file = os.path.join(os.getcwd(), 'data', 'info', f"{restaurant_id}_info.json")
-                    if os.path.exists(info_file):
-                        with open(info_file, 'r', encoding='utf-8') as f:
-                            restaurant_data['info_json'] = json.load(f)
-                            
-                except Exception as e:
-                    logger.warning(f"Error cargando archivos JSON: {str(e)}")
+            # Cargar datos JSON del restaurante desde archivos locales
+            attach_local_restaurant_files(restaurant_data)
             
             # Configurar credenciales de Twilio
             config_json = restaurant_data.get('config', {})
@@ -127,16 +133,75 @@ def get_restaurant_config_by_twilio_number(twilio_to_number: str):
                     'twilio_phone_number': TWILIO_WHATSAPP_NUMBER
                 }
             
+            cache_restaurant_config(normalized_number, restaurant_data)
             logger.info("✅ Configuración de restaurante completada")
             return restaurant_data
         else:
-            logger.warning(f"❌ No se encontró restaurante para: {normalized_number}")
+            logger.warning(f"❌ No se pudo consultar el restaurante para: {normalized_number}")
             return None
             
     except Exception as e:
         logger.error(f"❌ Error crítico en búsqueda de restaurante: {str(e)}")
         logger.error(traceback.format_exc())
         return None
+
+def get_sandbox_fallback_config(twilio_to_number):
+    """
+    Configuración de fallback para números sin restaurante asignado (sandbox de Twilio):
+    el primer restaurante activo con credenciales globales, o una configuración mínima
+    si no hay restaurantes. Se cachea por número 'To' igual que la configuración normal.
+    """
+    cache_key = f"fallback:{normalize_twilio_number(twilio_to_number)}"
+    cached_config = get_cached_restaurant_config(cache_key)
+    if cached_config:
+        logger.info(f"⚡ Usando restaurante fallback en caché: {cached_config.get('nombre')} (ID: {cached_config.get('id')})")
+        return cached_config
+
+    from config import TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_WHATSAPP_NUMBER, DEFAULT_RESTAURANT_NAME
+
+    # Buscar el primer restaurante activo como fallback
+    fallback_response = supabase_client.table('restaurantes')\
+        .select('id, nombre, config, menu, info_json')\
+        .eq('estado', 'activo')\
+        .limit(1)\
+        .execute()
+
+    if fallback_response.data:
+        restaurant_config = fallback_response.data[0]
+        restaurant_config['nombre_restaurante'] = restaurant_config.get('nombre')
+        attach_local_restaurant_files(restaurant_config)
+
+        # Asegurar configuración de Twilio
+        restaurant_config['config'] = {
+            'twilio_account_sid': TWILIO_ACCOUNT_SID,
+            'twilio_auth_token': TWILIO_AUTH_TOKEN,
+            'twilio_phone_number': TWILIO_WHATSAPP_NUMBER
+        }
+
+        logger.info(f"✅ Usando restaurante fallback: {restaurant_config.get('nombre')} (ID: {restaurant_config.get('id')})")
+    else:
+        # Si no hay restaurantes, crear config mínima
+        restaurant_config = {
+            'id': 'sandbox-default',
+            'nombre': DEFAULT_RESTAURANT_NAME or 'Restaurante Demo',
+            'nombre_restaurante': DEFAULT_RESTAURANT_NAME or 'Restaurante Demo',
+            'config': {
+                'twilio_account_sid': TWILIO_ACCOUNT_SID,
+                'twilio_auth_token': TWILIO_AUTH_TOKEN,
+                'twilio_phone_number': TWILIO_WHATSAPP_NUMBER
+            },
+            'info_json': {
+                'contact': {
+                    'phone': '11-6668-6255',
+                    'whatsapp': '+5491166686255'
+                }
+            }
+        }
+        logger.info("✅ Usando configuración mínima de sandbox")
+
+    cache_restaurant_config(cache_key, restaurant_config)
+    return restaurant_config
+
 @twilio_bp.route('/status', methods=['POST'])
 def twilio_status_callback():
     """Procesa las notificaciones de estado de los mensajes de Twilio"""
@@ -259,6 +324,11 @@ def twilio_webhook():
             response.message("Parece que tu mensaje contiene caracteres que no podemos procesar. Por favor, intenta enviarlo nuevamente usando solo texto.")
             return str(response)
 
+        # Descartar reintentos de Twilio de un mensaje ya recibido, antes de tocar la base o la IA
+        if not claim_message(message_sid):
+            logger.info(f"♻️ Mensaje duplicado ignorado (MessageSid ya procesado): {message_sid} de {sender}")
+            return str(response)
+
         # Obtener y validar configuración del restaurante
         if not twilio_to_number:
             logger.warning("Número de Twilio 'To' no proporcionado en la solicitud. Intentando con número por defecto...")
@@ -276,109 +346,101 @@ def twilio_webhook():
                 response.message("Error: No se pudo identificar el número de destino. Por favor, contacta al administrador.")
                 return str(response)
             
-        try:
-            logger.debug(f"Obteniendo configuración para el número: {twilio_to_number}")
-            restaurant_config = get_restaurant_config_by_twilio_number(twilio_to_number)
-            logger.debug(f"Configuración del restaurante obtenida: {restaurant_config}")
-
-            if not restaurant_config:
-                logger.warning(f"No se encontró configuración para el número: {twilio_to_number}")
-                logger.info("🔧 USANDO CONFIGURACIÓN DE FALLBACK PARA SANDBOX")
-                
-                # Crear configuración de fallback para sandbox
-                from config import TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_WHATSAPP_NUMBER, DEFAULT_RESTAURANT_NAME
-                
-                # Buscar el primer restaurante activo como fallback
-                try:
-                    fallback_response = supabase_client.table('restaurantes')\
-                        .select('id, nombre, config, menu, info_json')\
-                        .eq('estado', 'activo')\
-                        .limit(1)\
-                        .execute()
-                    
-                    if fallback_response.data:
-                        restaurant_config = fallback_response.data[0]
-                        restaurant_config['nombre_restaurante'] = restaurant_config.get('nombre')
-                        
-                        # Asegurar configuración de Twilio
-                        restaurant_config['config'] = {
-                            'twilio_account_sid': TWILIO_ACCOUNT_SID,
-                            'twilio_auth_token': TWILIO_AUTH_TOKEN,
-                            'twilio_phone_number': TWILIO_WHATSAPP_NUMBER
-                        }
-                        
-                        logger.info(f"✅ Usando restaurante fallback: {restaurant_config.get('nombre')} (ID: {restaurant_config.get('id')})")
-                    else:
-                        # Si no hay restaurantes, crear config mínima
-                        restaurant_config = {
-                            'id': 'sandbox-default',
-                            'nombre': DEFAULT_RESTAURANT_NAME or 'Restaurante Demo',
-                            'nombre_restaurante': DEFAULT_RESTAURANT_NAME or 'Restaurante Demo',
-                            'config': {
-                                'twilio_account_sid': TWILIO_ACCOUNT_SID,
-                                'twilio_auth_token': TWILIO_AUTH_TOKEN,
-                                'twilio_phone_number': TWILIO_WHATSAPP_NUMBER
-                            },
-                            'info_json': {
-                                'contact': {
-                                    'phone': '11-6668-6255',
-                                    'whatsapp': '+5491166686255'
-                                }
-                            }
-                        }
-                        logger.info("✅ Usando configuración mínima de sandbox")
-                        
-                except Exception as fallback_error:
-                    logger.error(f"Error buscando restaurante fallback: {str(fallback_error)}")
-                    response.message("Lo sentimos, este servicio no está disponible actualmente para este número. Por favor, contacta al administrador.")
-                    return str(response)
-                
-            if not restaurant_config:
-                logger.error(f"No se pudo obtener la configuración para el número de Twilio: {twilio_to_number}")
-                response.message("Lo sentimos, este servicio no está disponible actualmente para este número. Por favor, contacta al administrador.")
+        if WEBHOOK_PROCESSING_MODE == 'async':
+            lane_key = conversation_key(twilio_to_number, sender)
+            if get_webhook_pool().submit(lane_key, process_and_reply_whatsapp_message, incoming_msg, sender, twilio_to_number, message_sid):
+                logger.info(f"📥 Mensaje {message_sid} de {sender} encolado para procesamiento asíncrono")
                 return str(response)
+            # Nunca procesar fuera del carril: rompería el orden de la conversación y la sesión.
+            # Se libera el MessageSid para que el reintento de Twilio no se tome como duplicado.
+            release_message(message_sid)
+            logger.warning(f"Cola del webhook llena, mensaje {message_sid} de {sender} rechazado con 503 para que Twilio reintente")
+            return str(response), 503, {'Retry-After': '30'}
 
-            # Validación adicional de la configuración
-            required_config = ['id', 'config', 'info_json']
-            if not all(key in restaurant_config for key in required_config):
-                missing_fields = [key for key in required_config if key not in restaurant_config]
-                logger.error(f"Configuración de restaurante incompleta. Faltan campos: {missing_fields}")
-                response.message("Error de configuración del sistema. Por favor, contacta al administrador.")
-                return str(response)
-        except Exception as e:
-            logger.error(f"Error al obtener o validar la configuración del restaurante: {str(e)}")
-            logger.error(traceback.format_exc())
-            response.message("Ocurrió un error procesando tu mensaje. Por favor, intenta nuevamente más tarde.")
-            return str(response)
+        reply, _, failed = process_incoming_whatsapp_message(incoming_msg, sender, twilio_to_number, message_sid)
+        if failed:
+            # Permitir que el reintento de Twilio vuelva a procesarlo
+            release_message(message_sid)
+        if reply:
+            response.message(reply)
+            logger.info(f"Enviando respuesta TwiML: {reply}")
+        return str(response)
+    except Exception as e:
+        logger.error(f"Error general en webhook de Twilio: {str(e)}")
+        logger.error(traceback.format_exc())
+        final_response = MessagingResponse()
+        final_response.message("Ocurrió un error inesperado. Por favor, intenta más tarde.")
+        return str(final_response)
 
-        logger.info(f"Procesando mensaje para el restaurante: {restaurant_config.get('nombre_restaurante')} (ID: {restaurant_config.get('id')})")
-        
-        # El restaurant_id será necesario para la gestión de sesiones y otras lógicas específicas
-        restaurant_id = restaurant_config.get('id')
-        
-        # Verificar si es una solicitud de reinicio/reset - PRIORIDAD MÁXIMA
-        reset_commands = [
-            "reset", "reiniciar", "refresh", "reinicio", "comenzar de nuevo", 
-            "empezar de nuevo", "borrar", "limpiar", "salir", "0", "restart",
-            "nuevo", "start", "inicio", "empezar", "comenzar", "clear"
-        ]
-        is_reset_request = incoming_msg.strip().lower() in reset_commands
-        
-        if is_reset_request:
+def process_incoming_whatsapp_message(incoming_msg, sender, twilio_to_number, message_sid):
+    """
+    Procesa un mensaje entrante ya validado: resuelve el restaurante, atiende
+    reinicios, respuestas a recordatorios y el flujo normal del handler.
+
+    Returns:
+        tuple: (respuesta, restaurant_config, fallo). respuesta es None cuando no hay
+        que responder (por ejemplo, porque el handler ya envió el mensaje directamente).
+        fallo es True cuando respuesta es un mensaje de error porque el procesamiento
+        falló: el llamador libera el MessageSid para que un reintento lo procese.
+    """
+    restaurant_config = None
+    try:
+        logger.debug(f"Obteniendo configuración para el número: {twilio_to_number}")
+        restaurant_config = get_restaurant_config_by_twilio_number(twilio_to_number)
+        logger.debug(f"Configuración del restaurante obtenida: {restaurant_config}")
+
+        if not restaurant_config:
+            logger.warning(f"No se encontró configuración para el número: {twilio_to_number}")
+            logger.info("🔧 USANDO CONFIGURACIÓN DE FALLBACK PARA SANDBOX")
             try:
-                logger.info(f"🔄 COMANDO DE REINICIO DETECTADO: '{incoming_msg}' de {sender} para restaurante {restaurant_id}")
-                
-                # Importar función de reset
-                from services.twilio.reminder_handler import reset_user_session 
-                from utils.session_manager import clear_session
-                
-                # Limpiar sesión completamente
-                clear_session(sender, restaurant_id)
-                logger.info(f"Sesión limpiada para {sender} en R:{restaurant_id}")
-                
-                # Enviar mensaje de reinicio exitoso
-                restaurant_name = restaurant_config.get('nombre_restaurante', 'el restaurante')
-                reset_message = f"""🔄 *Sesión reiniciada exitosamente*
+                restaurant_config = get_sandbox_fallback_config(twilio_to_number)
+            except Exception as fallback_error:
+                logger.error(f"Error buscando restaurante fallback: {str(fallback_error)}")
+                return "Lo sentimos, este servicio no está disponible actualmente para este número. Por favor, contacta al administrador.", restaurant_config, True
+            
+        if not restaurant_config:
+            logger.error(f"No se pudo obtener la configuración para el número de Twilio: {twilio_to_number}")
+            return "Lo sentimos, este servicio no está disponible actualmente para este número. Por favor, contacta al administrador.", restaurant_config, True
+
+        # Validación adicional de la configuración
+        required_config = ['id', 'config', 'info_json']
+        if not all(key in restaurant_config for key in required_config):
+            missing_fields = [key for key in required_config if key not in restaurant_config]
+            logger.error(f"Configuración de restaurante incompleta. Faltan campos: {missing_fields}")
+            return "Error de configuración del sistema. Por favor, contacta al administrador.", restaurant_config, True
+    except Exception as e:
+        logger.error(f"Error al obtener o validar la configuración del restaurante: {str(e)}")
+        logger.error(traceback.format_exc())
+        return "Ocurrió un error procesando tu mensaje. Por favor, intenta nuevamente más tarde.", restaurant_config, True
+
+    logger.info(f"Procesando mensaje para el restaurante: {restaurant_config.get('nombre_restaurante')} (ID: {restaurant_config.get('id')})")
+    
+    # El restaurant_id será necesario para la gestión de sesiones y otras lógicas específicas
+    restaurant_id = restaurant_config.get('id')
+    
+    # Verificar si es una solicitud de reinicio/reset - PRIORIDAD MÁXIMA
+    reset_commands = [
+        "reset", "reiniciar", "refresh", "reinicio", "comenzar de nuevo", 
+        "empezar de nuevo", "borrar", "limpiar", "salir", "0", "restart",
+        "nuevo", "start", "inicio", "empezar", "comenzar", "clear"
+    ]
+    is_reset_request = incoming_msg.strip().lower() in reset_commands
+    
+    if is_reset_request:
+        try:
+            logger.info(f"🔄 COMANDO DE REINICIO DETECTADO: '{incoming_msg}' de {sender} para restaurante {restaurant_id}")
+            
+            from services.reminder_index import delete_reminder
+            from utils.session_manager import clear_session
+            
+            # Limpiar sesión completamente, incluido el recordatorio pendiente (ya no vive en la sesión)
+            clear_session(sender, restaurant_id)
+            delete_reminder(sender, restaurant_id)
+            logger.info(f"Sesión y recordatorio pendiente limpiados para {sender} en R:{restaurant_id}")
+            
+            # Enviar mensaje de reinicio exitoso
+            restaurant_name = restaurant_config.get('nombre_restaurante', 'el restaurante')
+            reset_message = f"""🔄 *Sesión reiniciada exitosamente*
 
 ¡Hola! Tu sesión con {restaurant_name} ha sido completamente reiniciada. 
 
@@ -389,104 +451,107 @@ Escribí:
 ➡️ *Menu* - para ver nuestro menú  
 ➡️ *Ubicacion* - para saber dónde encontrarnos
 ➡️ *Hola* - para iniciar una conversación"""
-                
-                response.message(reset_message)
-                logger.info(f"✅ Reinicio exitoso para {sender} en R:{restaurant_id}")
-                return str(response)
-                
-            except Exception as e:
-                logger.error(f"❌ Error al reiniciar sesión para {restaurant_id}: {str(e)}")
-                logger.error(traceback.format_exc())
-                response.message("Lo sentimos, ocurrió un error al reiniciar la sesión. Por favor, intenta nuevamente.")
-                return str(response)
-
-        # Verificar si es una respuesta a un recordatorio
-        try:
-            from services.twilio.reminder_handler import get_user_session_data, handle_reminder_response
-            logger.info(f"🔍 DEBUG: Verificando recordatorio para {sender} en restaurante {restaurant_id}")
             
-            reminder_data = get_user_session_data(sender, restaurant_id)
-            logger.info(f"🔍 DEBUG: reminder_data obtenido: {reminder_data}")
+            logger.info(f"✅ Reinicio exitoso para {sender} en R:{restaurant_id}")
+            return reset_message, restaurant_config, False
             
-            if reminder_data:
-                logger.info(f"🔍 DEBUG: reminder_data encontrado - is_reminder: {reminder_data.get('is_reminder')}, completed_at: {reminder_data.get('completed_at')}")
-                
-                if reminder_data.get('is_reminder') and not reminder_data.get('completed_at'):
-                    logger.info(f"🔔 Detectada respuesta a recordatorio activo de {sender} para restaurante {restaurant_id}")
-                    logger.info(f"🔔 Mensaje recibido: '{incoming_msg}'")
-                    
-                    # Procesar la respuesta directamente aquí
-                    try:
-                        result = handle_reminder_response(incoming_msg, sender, restaurant_config)
-                        logger.info(f"✅ Respuesta de recordatorio procesada: {result}")
-                        return str(response)  # Retornar respuesta vacía ya que handle_reminder_response envía el mensaje
-                    except Exception as reminder_error:
-                        logger.error(f"❌ Error procesando respuesta de recordatorio: {str(reminder_error)}")
-                        logger.error(traceback.format_exc())
-                        response.message("Lo sentimos, hubo un error procesando tu respuesta. Por favor contacta al restaurante directamente.")
-                        return str(response)
-                else:
-                    logger.info(f"🔍 DEBUG: reminder_data encontrado pero no es activo - is_reminder: {reminder_data.get('is_reminder')}, completed_at: {reminder_data.get('completed_at')}")
-            else:
-                logger.info(f"🔍 DEBUG: No se encontró reminder_data para {sender} en restaurante {restaurant_id}")
         except Exception as e:
-            logger.error(f"Error al verificar recordatorio: {str(e)}")
+            logger.error(f"❌ Error al reiniciar sesión para {restaurant_id}: {str(e)}")
             logger.error(traceback.format_exc())
+            return "Lo sentimos, ocurrió un error al reiniciar la sesión. Por favor, intenta nuevamente.", restaurant_config, True
 
-        # Si no es respuesta a recordatorio o el recordatorio ya fue completado, continuar con el flujo normal
+    # Verificar si es una respuesta a un recordatorio
+    try:
+        from services.twilio.reminder_handler import get_user_session_data, handle_reminder_response
+        logger.info(f"🔍 DEBUG: Verificando recordatorio para {sender} en restaurante {restaurant_id}")
         
-        # Normalizar el mensaje para verificaciones
-        normalized_msg = incoming_msg.strip().lower()
-        logger.info(f"Mensaje normalizado para verificación: '{normalized_msg}'")
+        reminder_data = get_user_session_data(sender, restaurant_id)
+        logger.info(f"🔍 DEBUG: reminder_data obtenido: {reminder_data}")
+        
+        if reminder_data:
+            logger.info(f"🔍 DEBUG: reminder_data encontrado - is_reminder: {reminder_data.get('is_reminder')}, completed_at: {reminder_data.get('completed_at')}")
+            
+            if reminder_data.get('is_reminder') and not reminder_data.get('completed_at'):
+                logger.info(f"🔔 Detectada respuesta a recordatorio activo de {sender} para restaurante {restaurant_id}")
+                logger.info(f"🔔 Mensaje recibido: '{incoming_msg}'")
+                
+                # Procesar la respuesta directamente aquí
+                try:
+                    result = handle_reminder_response(incoming_msg, sender, restaurant_config)
+                    logger.info(f"✅ Respuesta de recordatorio procesada: {result}")
+                    return None, restaurant_config, False  # Sin respuesta: handle_reminder_response ya envió el mensaje
+                except Exception as reminder_error:
+                    logger.error(f"❌ Error procesando respuesta de recordatorio: {str(reminder_error)}")
+                    logger.error(traceback.format_exc())
+                    return "Lo sentimos, hubo un error procesando tu respuesta. Por favor contacta al restaurante directamente.", restaurant_config, True
+            else:
+                logger.info(f"🔍 DEBUG: reminder_data encontrado pero no es activo - is_reminder: {reminder_data.get('is_reminder')}, completed_at: {reminder_data.get('completed_at')}")
+        else:
+            logger.info(f"🔍 DEBUG: No se encontró reminder_data para {sender} en restaurante {restaurant_id}")
+    except Exception as e:
+        logger.error(f"Error al verificar recordatorio: {str(e)}")
+        logger.error(traceback.format_exc())
 
-        # Obtener la sesión actual si existe
-        try:
-            session = get_session(sender, restaurant_id)
-            current_step = session.get('current_step') if session else None
-            logger.info(f"Paso actual de la sesión para {restaurant_id}: {current_step}")
-        except Exception as e:
-            logger.error(f"Error al obtener sesión: {str(e)}")
-            logger.error(traceback.format_exc())
-            session = None
-            current_step = None
+    # Si no es respuesta a recordatorio o el recordatorio ya fue completado, continuar con el flujo normal
+    
+    # Normalizar el mensaje para verificaciones
+    normalized_msg = incoming_msg.strip().lower()
+    logger.info(f"Mensaje normalizado para verificación: '{normalized_msg}'")
 
-        # Procesar el mensaje con el handler
+    # Obtener la sesión actual si existe
+    try:
+        session = get_session(sender, restaurant_id)
+        current_step = session.get('current_step') if session else None
+        logger.info(f"Paso actual de la sesión para {restaurant_id}: {current_step}")
+    except Exception as e:
+        logger.error(f"Error al obtener sesión: {str(e)}")
+        logger.error(traceback.format_exc())
+        session = None
+        current_step = None
+
+    # Procesar el mensaje con el handler
+    try:
+        handler_result_message = handle_whatsapp_message(incoming_msg, sender, restaurant_config, message_sid)
+        logger.info(f"Resultado del handler: {handler_result_message}")
+        
+        # Solo responder si el handler retorna un mensaje específico
+        # Si retorna None, significa que el mensaje ya fue enviado directamente por el handler
+        if handler_result_message:
+            logger.info(f"Respuesta del handler a enviar: {handler_result_message}")
+            return handler_result_message, restaurant_config, False
+        elif session and session.get('error'):
+            # Si hay un error específico en la sesión, usarlo
+            error_msg = session.get('error')
+            logger.warning(f"Error recuperado de la sesión: {error_msg}")
+            return error_msg, restaurant_config, False
+        else:
+            # Si handler_result_message es None, el mensaje ya fue enviado directamente
+            # No enviar mensaje adicional para evitar duplicados
+            logger.info("Handler retornó None - mensaje ya enviado directamente, no enviando respuesta adicional")
+        return None, restaurant_config, False
+    except Exception as e:
+        logger.error(f"Error en handle_whatsapp_message: {str(e)}")
+        logger.error(traceback.format_exc())
+        # Obtener número de contacto del restaurante para el mensaje de error
         try:
-            handler_result_message = handle_whatsapp_message(incoming_msg, sender, restaurant_config, message_sid)
-            logger.info(f"Resultado del handler: {handler_result_message}")
-            
-            # Solo enviar respuesta TwiML si el handler retorna un mensaje específico
-            # Si retorna None, significa que el mensaje ya fue enviado directamente por el handler
-            if handler_result_message:
-                response.message(handler_result_message)
-                logger.info(f"Enviando respuesta TwiML: {handler_result_message}")
-            elif session and session.get('error'):
-                # Si hay un error específico en la sesión, usarlo
-                error_msg = session.get('error')
-                logger.warning(f"Error recuperado de la sesión: {error_msg}")
-                response.message(error_msg)
-            else:
-                # Si handler_result_message es None, el mensaje ya fue enviado directamente
-                # No enviar mensaje adicional para evitar duplicados
-                logger.info("Handler retornó None - mensaje ya enviado directamente, no enviando respuesta TwiML adicional")
-            return str(response)
-        except Exception as e:
-            logger.error(f"Error en handle_whatsapp_message: {str(e)}")
-            logger.error(traceback.format_exc())
-            # Obtener número de contacto del restaurante para el mensaje de error
-            try:
-                contact_phone = restaurant_config.get('info_json', {}).get('contact', {}).get('phone', '116-6668-6255')
-                response.message(f"Lo sentimos, ocurrió un error al procesar tu mensaje. Por favor, contacta al {contact_phone} o intenta nuevamente en unos minutos.")
-            except:
-                response.message("Lo sentimos, ocurrió un error al procesar tu mensaje. Por favor, intenta nuevamente en unos minutos.")
-            return str(response)
+            contact_phone = restaurant_config.get('info_json', {}).get('contact', {}).get('phone', '116-6668-6255')
+            return f"Lo sentimos, ocurrió un error al procesar tu mensaje. Por favor, contacta al {contact_phone} o intenta nuevamente en unos minutos.", restaurant_config, True
+        except:
+            return "Lo sentimos, ocurrió un error al procesar tu mensaje. Por favor, intenta nuevamente en unos minutos.", restaurant_config, True
 
+def process_and_reply_whatsapp_message(incoming_msg, sender, twilio_to_number, message_sid):
+    """Variante para la cola asíncrona: la respuesta se envía por la API REST en lugar de TwiML."""
+    try:
+        reply, restaurant_config, failed = process_incoming_whatsapp_message(incoming_msg, sender, twilio_to_number, message_sid)
+        if failed:
+            release_message(message_sid)
+        if reply:
+            from services.twilio.messaging import send_whatsapp_message
+            send_whatsapp_message(sender, reply, restaurant_config or {'id': None, 'nombre_restaurante': 'Sistema'})
     except Exception as e:
-        logger.error(f"Error general en webhook de Twilio: {str(e)}")
+        release_message(message_sid)
+        logger.error(f"Error procesando mensaje {message_sid} en segundo plano: {str(e)}")
         logger.error(traceback.format_exc())
-        final_response = MessagingResponse()
-        final_response.message("Ocurrió un error inesperado. Por favor, intenta más tarde.")
-        return str(final_response)
 
 @twilio_bp.route('/menu', methods=['GET'])
 def get_menu():
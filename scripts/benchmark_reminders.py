@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Benchmark del envío de recordatorios sin tocar servicios reales.
+
+Siembra N reservas sintéticas para mañana en un query builder de Supabase falso
+(en memoria, cuenta cada execute() como un round trip), reemplaza el cliente de
+Twilio por uno que simula latencia y errores en messages.create, y mide
+enviar_recordatorios_reservas de punta a punta.
+
+Informa, para cada N: mensajes/s, round trips a la BD y pico de memoria
+(tracemalloc). La bitácora y el índice de recordatorios se escriben en un
+directorio temporal que se borra al terminar.
+
+Uso:
+    python3 scripts/benchmark_reminders.py
+    python3 scripts/benchmark_reminders.py --sizes 100 1000 --twilio-latency-ms 120 --error-rate 0.02
+    python3 scripts/benchmark_reminders.py --restaurants 5 --workers 8 --db-latency-ms 30
+"""
+
+import sys
+import os
+import argparse
+import contextlib
+import random
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+import logging
+from types import SimpleNamespace
+
+# Add the project root to the Python path
+app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, app_dir)
+
+# Estado local del benchmark: debe definirse antes de importar config
+work_dir = tempfile.mkdtemp(prefix='bench_recordatorios_')
+os.environ.setdefault('TWILIO_ACCOUNT_SID', 'ACbenchmark')
+os.environ.setdefault('TWILIO_AUTH_TOKEN', 'benchmark')
+os.environ.setdefault('TWILIO_WHATSAPP_NUMBER', '+14155238886')
+os.environ['REMINDER_INDEX_DB_PATH'] = os.path.join(work_dir, 'reminder_index.db')
+os.environ['REMINDER_JOURNAL_PATH'] = os.path.join(work_dir, 'reminder_journal.db')
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('benchmark_reminders')
+logger.setLevel(logging.INFO)
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+class FakeQuery:
+    """Subconjunto del query builder de supabase-py que usa el servicio de recordatorios."""
+    def __init__(self, db, table):
+        self.db = db
+        self.table_name = table
+        self.filters = []
+        self.update_data = None
+        self.limit_count = None
+
+    def select(self, *args, **kwargs):
+        return self
+
+    def update(self, data):
+        self.update_data = data
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def in_(self, column, values):
+        values = set(values)
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row.get(column) >= value)
+        return self
+
+    def lte(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row.get(column) <= value)
+        return self
+
+    def order(self, *args, **kwargs):
+        return self
+
+    def limit(self, count):
+        self.limit_count = count
+        return self
+
+    def execute(self):
+        self.db.round_trip(self.table_name, 'update' if self.update_data else 'select')
+        rows = [row for row in self.db.tables.get(self.table_name, []) if all(f(row) for f in self.filters)]
+        if self.update_data:
+            with self.db.lock:
+                for row in rows:
+                    row.update(self.update_data)
+        if self.limit_count is not None:
+            rows = rows[:self.limit_count]
+        return FakeResponse([dict(row) for row in rows])
+
+class FakeSupabase:
+    def __init__(self, latency_ms=0):
+        self.latency = latency_ms / 1000.0
+        self.tables = {}
+        self.lock = threading.Lock()
+        self.round_trips = {}
+
+    def round_trip(self, table, kind):
+        with self.lock:
+            key = f"{table}.{kind}"
+            self.round_trips[key] = self.round_trips.get(key, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+class FakeTwilioError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status} simulado por el benchmark")
+        self.status = status
+
+class FakeTwilioClient:
+    """Reemplaza a twilio.rest.Client: messages.create con latencia y tasa de errores configurables."""
+    def __init__(self, latency_ms, jitter_ms, error_rate):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.lock = threading.Lock()
+        self.created = 0
+        self.errors = 0
+
+    def create(self, **kwargs):
+        time.sleep(max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000.0)
+        with self.lock:
+            if random.random() < self.error_rate:
+                self.errors += 1
+                raise FakeTwilioError(random.choice([429, 500, 503]))
+            self.created += 1
+            sid = f"SMbench{self.created:010d}"
+        return SimpleNamespace(sid=sid, from_=kwargs.get('from_'), to=kwargs.get('to'))
+
+class FakeMessagesResource:
+    """client.messages.create(...) y client.messages(sid).fetch(), como en twilio.rest.Client."""
+    def __init__(self, client):
+        self.client = client
+
+    def __call__(self, sid):
+        return SimpleNamespace(fetch=lambda: SimpleNamespace(sid=sid, from_='whatsapp:+14155238886', to=None))
+
+    def create(self, **kwargs):
+        return self.client.create(**kwargs)
+
+def seed_reservas(db, n, restaurants, fecha):
+    db.tables['restaurantes'] = [
+        {'id': f'rest-{i}', 'nombre': f'Restaurante {i}', 'estado': 'activo'} for i in range(restaurants)
+    ]
+    db.tables['reservas_prod'] = [
+        {
+            'id': i + 1,
+            'restaurante_id': f'rest-{i % restaurants}',
+            'fecha': fecha,
+            'hora': f"{19 + (i % 4)}:{'00' if i % 2 else '30'}",
+            'personas': 2 + (i % 5),
+            'nombre_cliente': f'Cliente {i}',
+            'telefono': f'11{40000000 + i:08d}',
+            'estado': 'Pendiente',
+            'recordatorio_enviado': False
+        }
+        for i in range(n)
+    ]
+
+def run_once(n, args):
+    import services.recordatorio_service as recordatorio_service
+    import services.reminder_journal as reminder_journal
+    import services.twilio.client_pool as client_pool
+    import services.twilio.messaging as messaging
+    import services.twilio.dispatcher as dispatcher
+
+    db = FakeSupabase(args.db_latency_ms)
+    fecha = (recordatorio_service.datetime.now(recordatorio_service.ARGENTINA_TZ)
+             + recordatorio_service.timedelta(days=1)).strftime('%Y-%m-%d')
+    seed_reservas(db, n, args.restaurants, fecha)
+
+    twilio = FakeTwilioClient(args.twilio_latency_ms, args.twilio_jitter_ms, args.error_rate)
+    twilio_client = SimpleNamespace(messages=FakeMessagesResource(twilio))
+    get_client = lambda *a, **k: twilio_client
+
+    # Cada corrida con bitácora nueva para que no se tome como reanudación
+    journal_path = os.path.join(work_dir, f'reminder_journal_{n}.db')
+    reminder_journal.REMINDER_JOURNAL_PATH = journal_path
+    reminder_journal._journal = None
+
+    recordatorio_service.supabase_client = db
+    recordatorio_service.REMINDER_WORKERS = args.workers
+    # Despachador propio por corrida: límite por número y reintentos con backoff como en producción
+    dispatcher._dispatcher = dispatcher.OutboundDispatcher(
+        workers=args.workers, rate_per_second=args.rate_per_second,
+        max_retries=dispatcher.OUTBOUND_MAX_RETRIES, backoff_seconds=args.backoff_ms / 1000.0
+    )
+    recordatorio_service.get_restaurant_id = lambda *a, **k: 'rest-0'
+    client_pool.get_twilio_client = get_client
+    messaging.get_twilio_client = get_client
+
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    # Los errores simulados se cuentan en el resultado; no volcar sus trazas en consola
+    logging.disable(logging.ERROR)
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            result = recordatorio_service.enviar_recordatorios_reservas(todos_los_restaurantes=args.restaurants > 1)
+    finally:
+        logging.disable(logging.NOTSET)
+    elapsed = time.perf_counter() - inicio
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    despacho = dispatcher._dispatcher.get_stats()
+    dispatcher._dispatcher.shutdown()
+    dispatcher._dispatcher = None
+
+    if not result.get('success'):
+        logger.error(f"La corrida con N={n} falló: {result.get('error')}")
+    enviados = result.get('mensajes_enviados', 0)
+    return {
+        'n': n,
+        'enviados': enviados,
+        'fallidos': result.get('mensajes_fallidos', 0),
+        'errores_twilio': twilio.errors,
+        'reintentos': despacho['retried'],
+        'latencia_envio_ms': despacho['latency_ms'].get('bulk', {}),
+        'segundos': elapsed,
+        'mensajes_por_segundo': enviados / elapsed if elapsed else 0.0,
+        'round_trips': sum(db.round_trips.values()),
+        'detalle_round_trips': dict(sorted(db.round_trips.items())),
+        'pico_memoria_mb': peak / (1024 * 1024)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del envío de recordatorios con Twilio y Supabase simulados")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000], help="Cantidades de reservas a medir")
+    parser.add_argument('--restaurants', type=int, default=1, help="Restaurantes entre los que se reparten las reservas (>1 usa el modo multi-restaurante)")
+    parser.add_argument('--workers', type=int, default=4, help="Hilos de envío (REMINDER_WORKERS)")
+    parser.add_argument('--rate-per-second', type=float, default=0, help="Límite por número de Twilio (0 = sin límite)")
+    parser.add_argument('--twilio-latency-ms', type=float, default=80, help="Latencia media de messages.create")
+    parser.add_argument('--twilio-jitter-ms', type=float, default=20, help="Variación aleatoria de la latencia")
+    parser.add_argument('--error-rate', type=float, default=0.01, help="Proporción de envíos que fallan (429/5xx)")
+    parser.add_argument('--backoff-ms', type=float, default=200, help="Espera inicial entre reintentos del despachador")
+    parser.add_argument('--db-latency-ms', type=float, default=20, help="Latencia de cada round trip a Supabase")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    logger.info(f"Twilio: {args.twilio_latency_ms}±{args.twilio_jitter_ms} ms, {args.error_rate:.1%} errores | "
+                f"BD: {args.db_latency_ms} ms por round trip | {args.workers} hilos | {args.restaurants} restaurante(s)")
+    resultados = []
+    try:
+        for n in args.sizes:
+            logger.info(f"▶️  N = {n}...")
+            resultados.append(run_once(n, args))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    logger.info("=== RESULTADOS ===")
+    logger.info(f"{'N':>7} {'enviados':>9} {'fallidos':>9} {'reintentos':>10} {'seg':>8} {'msg/s':>8} {'round trips':>12} {'pico MB':>8}")
+    for r in resultados:
+        logger.info(f"{r['n']:>7} {r['enviados']:>9} {r['fallidos']:>9} {r['reintentos']:>10} {r['segundos']:>8.2f} "
+                    f"{r['mensajes_por_segundo']:>8.1f} {r['round_trips']:>12} {r['pico_memoria_mb']:>8.1f}")
+    for r in resultados:
+        logger.info(f"Round trips N={r['n']}: {r['detalle_round_trips']}")
+        logger.info(f"Latencia de envío N={r['n']} (ms): {r['latencia_envio_ms']}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
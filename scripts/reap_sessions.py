@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Limpieza de sesiones de WhatsApp expiradas.
+
+Recorre en una sola pasada las sesiones de todos los restaurantes y elimina las
+que no tuvieron actividad en SESSION_TIMEOUT (o en --max-age-minutes), usando
+sólo la fecha de modificación, sin abrir los JSON. Informa cantidades y bytes liberados.
+
+Uso:
+    python3 scripts/reap_sessions.py
+    python3 scripts/reap_sessions.py --max-age-minutes 120 --dry-run
+"""
+
+import sys
+import os
+import argparse
+import logging
+from datetime import timedelta
+from dotenv import load_dotenv
+
+# Add the project root to the Python path
+app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, app_dir)
+
+# Cargar variables de entorno (solo si el archivo existe)
+env_file = os.path.join(app_dir, '.env')
+if os.path.exists(env_file):
+    load_dotenv(env_file)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+from utils.session_manager import SESSION_TIMEOUT, get_session_backend, reap_expired_sessions
+
+def main():
+    parser = argparse.ArgumentParser(description="Elimina las sesiones de WhatsApp expiradas de todos los restaurantes")
+    parser.add_argument('--max-age-minutes', type=int, default=None,
+                        help=f"Antigüedad máxima en minutos (default: {int(SESSION_TIMEOUT.total_seconds() // 60)})")
+    parser.add_argument('--dry-run', action='store_true', help="Solo informar, sin eliminar nada")
+    args = parser.parse_args()
+
+    max_age = timedelta(minutes=args.max_age_minutes) if args.max_age_minutes else SESSION_TIMEOUT
+
+    logger.info(f"🧹 Limpiando sesiones con más de {max_age} sin actividad (backend: {get_session_backend().name})")
+    report = reap_expired_sessions(max_age=max_age, dry_run=args.dry_run)
+
+    for restaurant_id, count in sorted(report['restaurants'].items(), key=lambda item: -item[1]):
+        logger.info(f"  🏪 {restaurant_id}: {count} sesiones")
+
+    accion = "a eliminar" if args.dry_run else "eliminadas"
+    logger.info("=== RESUMEN ===")
+    logger.info(f"📊 Sesiones revisadas: {report['scanned']}")
+    logger.info(f"🗑️  Sesiones {accion}: {report['deleted']}")
+    logger.info(f"💾 Espacio liberado: {report['bytes_freed'] / 1024:.1f} KB")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
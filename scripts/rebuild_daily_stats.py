@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Reconstrucción de los agregados diarios de reservas (reservas_daily_stats).
+
+Lee todas las reservas de reservas_prod (de un restaurante o de todos, paginando)
+y reemplaza los contadores por fecha y estado. Usar al activar los agregados por
+primera vez (backfill) o si se editaron reservas por fuera de la app.
+
+Uso:
+    python3 scripts/rebuild_daily_stats.py
+    python3 scripts/rebuild_daily_stats.py --restaurant-id <uuid>
+"""
+
+import sys
+import os
+import argparse
+import logging
+from dotenv import load_dotenv
+
+# Add the project root to the Python path
+app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, app_dir)
+
+# Cargar variables de entorno (solo si el archivo existe)
+env_file = os.path.join(app_dir, '.env')
+if os.path.exists(env_file):
+    load_dotenv(env_file)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+from config import DAILY_STATS_DB_PATH
+from db.supabase_client import supabase_client
+from services.reservas.daily_stats import reconstruir_estadisticas
+
+def main():
+    parser = argparse.ArgumentParser(description="Recalcula reservas_daily_stats desde reservas_prod")
+    parser.add_argument('--restaurant-id', default=None, help="Solo este restaurante (default: todos)")
+    args = parser.parse_args()
+
+    if not supabase_client:
+        logger.error("❌ Cliente de Supabase no disponible")
+        return 1
+
+    alcance = f"restaurante {args.restaurant_id}" if args.restaurant_id else "todos los restaurantes"
+    logger.info(f"📊 Reconstruyendo agregados diarios de {alcance} en {DAILY_STATS_DB_PATH}")
+    total = reconstruir_estadisticas(supabase_client, args.restaurant_id)
+    logger.info(f"✅ {total} reservas contadas")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
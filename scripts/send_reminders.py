@@ -2,6 +2,8 @@
 import sys
 import os
 import logging
+import argparse
+import time
 import traceback
 from datetime import datetime, timedelta
 import pytz
@@ -45,11 +47,44 @@ except Exception as e:
 logging.getLogger().addHandler(logging.StreamHandler())
 
 # Import the reminder function
-from services.recordatorio_service import enviar_recordatorios_reservas
+from services.recordatorio_service import enviar_recordatorios_reservas, enviar_recordatorios_ventana
 
 if __name__ == "__main__":
     logger = logging.getLogger(__name__)
     
+    parser = argparse.ArgumentParser(description="Envía los recordatorios de las reservas de mañana")
+    parser.add_argument('--all-restaurants', action='store_true',
+                        help="Incluir a todos los restaurantes activos en una sola corrida (o REMINDER_ALL_RESTAURANTS=true)")
+    parser.add_argument('--window-minutes', type=int, default=None,
+                        help="Modo ventana: recordar solo las reservas que entran en los próximos N minutos "
+                             "(a REMINDER_LEAD_HOURS de anticipación); pensado para un cron cada N minutos. "
+                             "La primera corrida envía de una vez todo lo pendiente de las próximas "
+                             "REMINDER_LEAD_HOURS horas")
+    parser.add_argument('--loop', action='store_true',
+                        help="Con --window-minutes, repetir la corrida cada N minutos sin terminar el proceso")
+    args = parser.parse_args()
+    todos_los_restaurantes = True if args.all_restaurants else None
+    
+    if args.window_minutes:
+        logger.info(f"=== RECORDATORIOS POR VENTANA DE {args.window_minutes} MINUTOS ===")
+        while True:
+            inicio = time.monotonic()
+            try:
+                result = enviar_recordatorios_ventana(args.window_minutes, todos_los_restaurantes)
+                logger.info(f"📋 Ventana procesada: {result.get('mensajes_enviados', 0)} enviados, "
+                            f"{result.get('mensajes_fallidos', 0)} fallidos")
+                if not result.get('success', False) and not args.loop:
+                    logger.error(f"❌ Error en el proceso: {result.get('error', 'Error desconocido')}")
+                    sys.exit(1)
+            except Exception as e:
+                logger.error(f"💥 Error en la corrida por ventana: {str(e)}")
+                logger.error(traceback.format_exc())
+                if not args.loop:
+                    sys.exit(1)
+            if not args.loop:
+                sys.exit(0)
+            time.sleep(max(0, args.window_minutes * 60 - (time.monotonic() - inicio)))
+    
     # Obtener fecha y hora actual en Argentina
     ahora_argentina = datetime.now(ARGENTINA_TZ)
     manana_argentina = ahora_argentina + timedelta(days=1)
@@ -81,7 +116,7 @@ if __name__ == "__main__":
     
     try:
         logger.info("🚀 Llamando al servicio de recordatorios...")
-        result = enviar_recordatorios_reservas()
+        result = enviar_recordatorios_reservas(todos_los_restaurantes=todos_los_restaurantes)
         logger.info(f"📋 Resultado del servicio: {result}")
         
         # Mostrar un resumen más legible
@@ -0,0 +1,282 @@
+"""
+Agregación de datos del dashboard de administración.
+
+Antes, cada vista del dashboard hacía decenas de consultas secuenciales a
+Supabase (una por día para el gráfico de ocupación, dos por mes para la
+tendencia, conteos separados para hoy/semana/mes y varias pasadas de "Top
+Clientes"). Acá se traen una sola vez las reservas del restaurante del rango más
+amplio que necesita el dashboard, con las columnas justas (paginando de a
+PAGE_SIZE filas), y todas las tarjetas y gráficos se calculan en una pasada en
+memoria con Counter.
+
+Con el agregado diario activo (services/reservas/daily_stats), las series por
+fecha (estados del mes, ocupación diaria y tendencia) salen de reservas_daily_stats,
+una fila por día y estado, y de Supabase solo se leen las filas que necesitan
+datos de cada reserva: las próximas, las creadas este mes y las confirmadas de
+los meses de "Top Clientes".
+
+El resultado se cachea por (restaurante, fecha de hoy) durante DASHBOARD_CACHE_TTL
+segundos. La firma de cada entrada es la versión de reservas del restaurante
+(services/reservas/daily_stats), que incrementa cualquier alta o cambio de reserva
+(update_reservation del admin, reservas por WhatsApp y web) desde cualquier
+worker, así una recarga sin cambios no toca Supabase y una con cambios sí.
+"""
+import copy
+import json
+import logging
+import os
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+
+from dateutil.relativedelta import relativedelta
+
+from config import DASHBOARD_CACHE_TTL
+from services.reservas.daily_stats import (
+    ESTADOS, normalizar_estado, version_restaurante, asegurar_estadisticas, obtener_resumen_diario
+)
+from utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_COLUMNS = 'id, fecha, hora, estado, personas, nombre_cliente, telefono, created_at'
+PAGE_SIZE = 1000
+TREND_MONTHS = 6
+TOP_CLIENTS_MONTHS = 3
+TOP_CLIENTS_LIMIT = 8
+PROXIMAS_LIMIT = 10
+DEFAULT_MAX_CAPACITY = 100
+
+_cache = TTLCache(ttl_seconds=DASHBOARD_CACHE_TTL, max_entries=256)
+
+STATUS_LABELS = ["Pendiente", "Confirmada", "Cancelada", "No asistió"]
+
+def estado_index(estado):
+    """Índice en STATUS_LABELS del estado (sin distinguir mayúsculas ni género), o None si no se reconoce."""
+    clave = normalizar_estado(estado)
+    return ESTADOS.index(clave) if clave in ESTADOS else None
+
+def limites_dashboard(now):
+    """Fechas que delimitan cada tarjeta y gráfico, calculadas una sola vez."""
+    start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    start_of_month = start_of_day.replace(day=1)
+    return {
+        'today': start_of_day.date(),
+        'start_of_day': start_of_day,
+        'start_of_week': start_of_day - timedelta(days=now.weekday()),
+        'start_of_month': start_of_month,
+        'end_of_month': start_of_month + relativedelta(months=1),
+        'trend_start': start_of_month - relativedelta(months=TREND_MONTHS - 1),
+        'top_clients_start': start_of_month - relativedelta(months=TOP_CLIENTS_MONTHS)
+    }
+
+def obtener_reservas_dashboard(supabase, restaurant_id, now, table='reservas_prod', con_resumen=False):
+    """
+    Trae en una sola consulta (paginada) todas las reservas que usa el dashboard:
+    las de fecha desde el inicio de la tendencia en adelante (incluye las próximas)
+    y las creadas este mes aunque sean para más adelante. Con `con_resumen` (las
+    series por fecha salen del agregado diario) solo las próximas, las creadas este
+    mes y las confirmadas desde el inicio de "Top Clientes".
+    """
+    limites = limites_dashboard(now)
+    creadas_desde = limites['start_of_month'].date().isoformat()
+    if con_resumen:
+        filtro = (f"fecha.gte.{limites['today'].isoformat()},created_at.gte.{creadas_desde},"
+                  f"and(fecha.gte.{limites['top_clients_start'].date().isoformat()},estado.ilike.confirmad*)")
+    else:
+        desde_fecha = min(limites['trend_start'], limites['top_clients_start']).date().isoformat()
+        filtro = f"fecha.gte.{desde_fecha},created_at.gte.{creadas_desde}"
+    reservas = []
+    offset = 0
+    while True:
+        response = (supabase.table(table)
+            .select(DASHBOARD_COLUMNS)
+            .eq('restaurante_id', restaurant_id)
+            .or_(filtro)
+            .order('id')
+            .range(offset, offset + PAGE_SIZE - 1)
+            .execute())
+        page = response.data or []
+        reservas.extend(page)
+        if len(page) < PAGE_SIZE:
+            break
+        offset += PAGE_SIZE
+    logger.info(f"Dashboard: {len(reservas)} reservas leídas en {offset // PAGE_SIZE + 1} consulta(s) para {restaurant_id}")
+    return reservas
+
+def cargar_capacidad_maxima(restaurant_id, root_path):
+    """Capacidad máxima del restaurante según data/info/<id>_info.json (DEFAULT_MAX_CAPACITY si no está)."""
+    info_file_path = os.path.join(root_path, 'data', 'info', f'{restaurant_id}_info.json')
+    try:
+        with open(info_file_path, 'r') as f:
+            restaurant_info = json.load(f)
+        return int(restaurant_info.get('capacity', {}).get('max_capacity', DEFAULT_MAX_CAPACITY))
+    except Exception as e:
+        logger.warning(f"Could not load max_capacity from restaurant info file for {restaurant_id}, using default {DEFAULT_MAX_CAPACITY}: {e}")
+        return DEFAULT_MAX_CAPACITY
+
+def _parse_created_at(value):
+    if not value:
+        return None
+    try:
+        created = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return created if created.tzinfo else created.replace(tzinfo=timezone.utc)
+
+def _personas(reserva):
+    try:
+        return int(reserva.get('personas') or 0)
+    except (TypeError, ValueError):
+        return 0
+
+def resumen_dashboard(restaurant_id, now):
+    """Agregado diario ({fecha: totales}) del rango de las series del dashboard: inicio de la tendencia a fin de mes."""
+    limites = limites_dashboard(now)
+    hasta = (limites['end_of_month'] - timedelta(days=1)).date().isoformat()
+    return obtener_resumen_diario(restaurant_id, limites['trend_start'].date().isoformat(), hasta)
+
+def calcular_dashboard(reservas, now, max_capacity=DEFAULT_MAX_CAPACITY, resumen=None):
+    """
+    Calcula en una pasada todas las tarjetas y gráficos del dashboard a partir de las reservas
+    leídas por obtener_reservas_dashboard. Si se pasa `resumen` (resumen_dashboard), las series
+    por fecha salen de ahí y de las reservas solo se usan las tarjetas que necesitan cada fila.
+    Devuelve un dict con las variables del template.
+    """
+    limites = limites_dashboard(now)
+    today_iso = limites['today'].isoformat()
+    month_start_iso = limites['start_of_month'].date().isoformat()
+    month_end_iso = limites['end_of_month'].date().isoformat()
+    top_start_iso = limites['top_clients_start'].date().isoformat()
+    trend_months = [limites['start_of_month'] - relativedelta(months=i) for i in range(TREND_MONTHS - 1, -1, -1)]
+    trend_keys = {month.strftime('%Y-%m'): position for position, month in enumerate(trend_months)}
+    end_of_day = limites['start_of_day'] + timedelta(days=1)
+    end_of_week = limites['start_of_week'] + timedelta(days=7)
+
+    created_counts = Counter()
+    status_counts = [0, 0, 0, 0]
+    reservas_por_dia = Counter()
+    personas_por_dia = Counter()
+    trend_totals = [0] * TREND_MONTHS
+    trend_por_estado = defaultdict(lambda: [0] * TREND_MONTHS)
+    top_clientes = Counter()
+    proximas = []
+
+    def sumar_series(fecha, indice, cantidad, personas):
+        # "Estado de Reservas" y ocupación diaria: reservas con fecha en el mes actual
+        if month_start_iso <= fecha < month_end_iso:
+            if indice is not None:
+                status_counts[indice] += cantidad
+            if fecha <= today_iso:
+                reservas_por_dia[fecha] += cantidad
+                personas_por_dia[fecha] += personas
+
+        # Tendencia de los últimos meses por estado
+        position = trend_keys.get(fecha[:7])
+        if position is not None:
+            trend_totals[position] += cantidad
+            if indice is not None:
+                trend_por_estado[indice][position] += cantidad
+
+    for reserva in reservas:
+        fecha = str(reserva.get('fecha') or '')[:10]
+        indice = estado_index(reserva.get('estado'))
+
+        # "Resumen": reservas creadas hoy / esta semana / este mes (created_at, UTC)
+        created = _parse_created_at(reserva.get('created_at'))
+        if created is not None:
+            if limites['start_of_day'] <= created < end_of_day:
+                created_counts['hoy'] += 1
+            if limites['start_of_week'] <= created < end_of_week:
+                created_counts['semana'] += 1
+            if limites['start_of_month'] <= created < limites['end_of_month']:
+                created_counts['mes'] += 1
+
+        if not fecha:
+            continue
+
+        if resumen is None:
+            sumar_series(fecha, indice, 1, _personas(reserva))
+
+        # Top clientes: reservas confirmadas desde hace tres meses hasta ayer
+        if indice == 1 and top_start_iso <= fecha < today_iso:
+            nombre = (reserva.get('nombre_cliente') or '').strip()
+            if nombre and nombre != 'Sin nombre':
+                top_clientes[nombre] += 1
+
+        if fecha >= today_iso and reserva.get('estado') != 'Cancelada':
+            proximas.append(reserva)
+
+    # Con el agregado diario, las series salen de una fila por día y estado
+    for fecha, dia in (resumen or {}).items():
+        for estado, totales in dia['por_estado'].items():
+            indice = ESTADOS.index(estado) if estado in ESTADOS else None
+            sumar_series(fecha, indice, totales['reservas'], totales['personas'])
+
+    dias_labels, reservas_counts, personas_counts, ocupacion_pct = [], [], [], []
+    day = limites['start_of_month'].date()
+    while day <= limites['today']:
+        day_iso = day.isoformat()
+        dias_labels.append(day.strftime('%d/%m'))
+        reservas_counts.append(reservas_por_dia[day_iso])
+        personas_counts.append(personas_por_dia[day_iso])
+        ocupacion = (personas_por_dia[day_iso] / max_capacity * 100) if max_capacity > 0 else 0
+        ocupacion_pct.append(round(ocupacion, 1))
+        day += timedelta(days=1)
+
+    proximas.sort(key=lambda r: (str(r.get('fecha') or ''), str(r.get('hora') or '')))
+    top = top_clientes.most_common(TOP_CLIENTS_LIMIT)
+
+    return {
+        'proximas_reservas': proximas[:PROXIMAS_LIMIT],
+        'today_count': created_counts['hoy'],
+        'week_count': created_counts['semana'],
+        'month_count': created_counts['mes'],
+        'status_labels': list(STATUS_LABELS),
+        'status_counts': status_counts,
+        'month_labels': [month.strftime('%B %Y') for month in trend_months],
+        'reservation_trend': trend_totals,
+        'confirmed_trend': trend_por_estado[1],
+        'pending_trend': trend_por_estado[0],
+        'no_asistio_trend': trend_por_estado[3],
+        'canceladas_trend': trend_por_estado[2],
+        'dias_labels': dias_labels,
+        'reservas_counts': reservas_counts,
+        'personas_counts_diarias': personas_counts,
+        'ocupacion_diaria_pct': ocupacion_pct,
+        'top_clientes_labels': [name for name, _ in top],
+        'top_clientes_counts': [count for _, count in top]
+    }
+
+def construir_dashboard(supabase, restaurant_id, root_path, now=None, table='reservas_prod'):
+    """
+    Una lectura de reservas + agregación en memoria: todas las variables del dashboard.
+    Si el restaurante no tuvo escrituras desde el último cálculo (y no venció el TTL), se sirve de la caché.
+    """
+    now = now or datetime.now(timezone.utc)
+    key = (str(restaurant_id), now.date().isoformat())
+    # La versión se lee antes de calcular: una escritura concurrente deja la entrada ya desactualizada
+    signature = version_restaurante(restaurant_id)
+    if signature is not None:
+        cached = _cache.get(key, signature)
+        if cached is not None:
+            return copy.deepcopy(cached)
+    # La primera vez reconstruye el agregado del restaurante; si no está disponible, todo sale de las filas
+    resumen = None
+    if asegurar_estadisticas(supabase, restaurant_id, table):
+        # La reconstrucción incrementa la versión: releerla para no guardar con una firma vieja
+        signature = version_restaurante(restaurant_id)
+        resumen = resumen_dashboard(restaurant_id, now)
+    reservas = obtener_reservas_dashboard(supabase, restaurant_id, now, table, con_resumen=resumen is not None)
+    data = calcular_dashboard(reservas, now, cargar_capacidad_maxima(restaurant_id, root_path), resumen)
+    if signature is not None:
+        _cache.set(key, data, signature)
+    return copy.deepcopy(data)
+
+def invalidar_dashboard(restaurant_id=None):
+    """Descarta el dashboard cacheado del restaurante (o de todos) en este proceso."""
+    if restaurant_id is None:
+        return _cache.clear()
+    return _cache.invalidate_where(lambda key, value: key[0] == str(restaurant_id))
+
+def get_dashboard_cache_stats():
+    return dict(_cache.stats, entries=len(_cache))
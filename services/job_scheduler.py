@@ -0,0 +1,357 @@
+"""
+Planificador persistente de trabajos diferidos (SQLite + un hilo temporizador).
+
+Reemplaza el patrón de "un hilo con time.sleep() por envío": cada trabajo es una
+fila (tipo, payload JSON, vencimiento) en la tabla scheduled_jobs, así miles de
+envíos pendientes no ocupan hilos ni stacks y sobreviven a un deploy o al
+reciclado de un worker. Un único hilo por proceso duerme hasta el próximo
+vencimiento (o JOB_SCHEDULER_POLL_SECONDS, para ver trabajos agregados por otros
+procesos), reclama las filas vencidas de forma atómica y las ejecuta en un pool
+chico de hilos.
+
+Los tipos de trabajo se registran con register(tipo, handler); el handler recibe
+el payload. Un trabajo que falla se reintenta con espera creciente hasta
+JOB_MAX_ATTEMPTS. Si el proceso muere mientras ejecuta un trabajo, este vuelve a
+quedar pendiente pasado JOB_STALE_SECONDS (entrega al menos una vez).
+"""
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from config import (
+    JOB_SCHEDULER_DB_PATH, JOB_SCHEDULER_POLL_SECONDS, JOB_MAX_ATTEMPTS, JOB_STALE_SECONDS,
+    JOB_RETENTION_HOURS, SCHEDULED_SEND_WORKERS
+)
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+RETRY_DELAY_SECONDS = 60
+
+class JobScheduler:
+    def __init__(self, db_path, poll_seconds=5, workers=4, max_attempts=3, stale_seconds=300, retention_seconds=172800):
+        self.db_path = db_path
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.stale_seconds = stale_seconds
+        self.retention_seconds = retention_seconds
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._local = threading.local()
+        self._handlers = {}
+        self._futures = {}  # job_id -> Future, solo para trabajos programados en este proceso
+        self._cond = threading.Condition()
+        self._workers = max(1, workers)
+        self._executor = None
+        self._inflight = 0
+        self._wakeup = False
+        self._timer = None
+        self._closed = False
+        self.stats = {'scheduled': 0, 'executed': 0, 'failed': 0, 'retried': 0, 'recovered': 0, 'max_lag_ms': 0.0}
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS scheduled_jobs ("
+                " id TEXT PRIMARY KEY,"
+                " kind TEXT NOT NULL,"
+                " payload TEXT NOT NULL,"
+                " due_at REAL NOT NULL,"
+                " status TEXT NOT NULL,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " last_error TEXT,"
+                " claimed_by TEXT,"
+                " claimed_at REAL,"
+                " created_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL"
+                ")"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_scheduled_jobs_due ON scheduled_jobs (status, due_at)")
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def register(self, kind, handler):
+        """Asocia un tipo de trabajo a la función que lo ejecuta (handler(payload))."""
+        with self._cond:
+            self._handlers[kind] = handler
+            self._wakeup = True
+            self._cond.notify()
+
+    def start(self):
+        """Arranca (una vez por proceso) el hilo temporizador; retoma los trabajos que quedaron en la base."""
+        with self._cond:
+            if self._timer is not None and self._timer.is_alive():
+                return
+            self._closed = False
+            self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix='scheduled-job')
+            self._timer = threading.Thread(target=self._run, name='job-scheduler', daemon=True)
+            self._timer.start()
+        logger.info(f"Planificador de trabajos activo ({self.db_path}), {self.pending()} pendiente(s)")
+
+    def schedule(self, kind, payload, delay_seconds=0, with_future=False):
+        """
+        Guarda un trabajo para dentro de `delay_seconds` y devuelve su id. Con with_future=True
+        devuelve en cambio un Future (con atributo job_id) que se resuelve con el resultado si el
+        trabajo se ejecuta en este proceso; si lo termina otro worker, el Future se cancela en el
+        próximo mantenimiento.
+        """
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT INTO scheduled_jobs (id, kind, payload, due_at, status, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload, default=str), now + max(0.0, delay_seconds or 0), PENDING, now, now)
+            )
+        future = None
+        if with_future:
+            future = Future()
+            future.job_id = job_id
+        with self._cond:
+            if future is not None:
+                self._futures[job_id] = future
+            self.stats['scheduled'] += 1
+            self._wakeup = True
+            self._cond.notify()
+        return future if with_future else job_id
+
+    def pending(self):
+        row = self._connection().execute(
+            "SELECT COUNT(*) FROM scheduled_jobs WHERE status IN (?, ?)", (PENDING, RUNNING)
+        ).fetchone()
+        return row[0]
+
+    def get_stats(self):
+        conn = self._connection()
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM scheduled_jobs GROUP BY status").fetchall())
+        next_due = conn.execute("SELECT MIN(due_at) FROM scheduled_jobs WHERE status = ?", (PENDING,)).fetchone()[0]
+        with self._cond:
+            stats = dict(self.stats)
+            stats['handlers'] = sorted(self._handlers)
+            stats['running_here'] = self._timer is not None and self._timer.is_alive()
+        stats['max_lag_ms'] = round(stats['max_lag_ms'], 2)
+        stats['by_status'] = counts
+        stats['next_due_in_seconds'] = round(next_due - time.time(), 1) if next_due else None
+        return stats
+
+    def _run(self):
+        last_maintenance = 0.0
+        while True:
+            with self._cond:
+                # No reclamar más de lo que el pool puede tomar: el resto espera en la base
+                while not self._closed and self._inflight >= self._workers * 2:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                kinds = list(self._handlers)
+                capacity = self._workers * 2 - self._inflight
+                self._wakeup = False
+            try:
+                now = time.time()
+                if now - last_maintenance >= max(self.poll_seconds, 60):
+                    self._maintenance(now)
+                    last_maintenance = now
+                jobs = self._claim_due(kinds, now, capacity) if kinds else []
+                with self._cond:
+                    self._inflight += len(jobs)
+                for job in jobs:
+                    self._executor.submit(self._execute, *job)
+                wait = self._next_wait(kinds) if not jobs else 0
+            except Exception as e:
+                logger.error(f"Error en el planificador de trabajos: {str(e)}")
+                wait = self.poll_seconds
+            if wait > 0:
+                with self._cond:
+                    # Un trabajo programado mientras se consultaba la base no debe esperar al próximo sondeo
+                    if not self._closed and not self._wakeup:
+                        self._cond.wait(wait)
+
+    def _next_wait(self, kinds):
+        placeholders = ','.join('?' * len(kinds))
+        row = self._connection().execute(
+            f"SELECT MIN(due_at) FROM scheduled_jobs WHERE status = ? AND kind IN ({placeholders})",
+            [PENDING] + kinds
+        ).fetchone()
+        if row[0] is None:
+            return self.poll_seconds
+        return max(0.0, min(self.poll_seconds, row[0] - time.time()))
+
+    def _claim_due(self, kinds, now, limit=50):
+        """Pasa a 'running' (a nombre de este proceso) los trabajos vencidos que sabe ejecutar."""
+        placeholders = ','.join('?' * len(kinds))
+        conn = self._connection()
+        with conn:
+            rows = conn.execute(
+                f"SELECT id, kind, payload, due_at, attempts FROM scheduled_jobs"
+                f" WHERE status = ? AND due_at <= ? AND kind IN ({placeholders}) ORDER BY due_at LIMIT ?",
+                [PENDING, now] + kinds + [limit]
+            ).fetchall()
+            claimed = []
+            for job_id, kind, payload, due_at, attempts in rows:
+                cursor = conn.execute(
+                    "UPDATE scheduled_jobs SET status = ?, claimed_by = ?, claimed_at = ?, updated_at = ?"
+                    " WHERE id = ? AND status = ?",
+                    (RUNNING, self.owner, now, now, job_id, PENDING)
+                )
+                if cursor.rowcount:
+                    claimed.append((job_id, kind, payload, due_at, attempts))
+        return claimed
+
+    def _execute(self, job_id, kind, payload, due_at, attempts):
+        try:
+            self._run_job(job_id, kind, payload, due_at, attempts)
+        except Exception as e:
+            logger.error(f"Error registrando el resultado del trabajo {kind} ({job_id}): {str(e)}")
+        finally:
+            with self._cond:
+                self._inflight -= 1
+                self._cond.notify_all()
+
+    def _run_job(self, job_id, kind, payload, due_at, attempts):
+        lag_ms = (time.time() - due_at) * 1000
+        with self._cond:
+            handler = self._handlers.get(kind)
+            future = self._futures.pop(job_id, None)
+            self.stats['max_lag_ms'] = max(self.stats['max_lag_ms'], lag_ms)
+        try:
+            result = handler(json.loads(payload))
+        except Exception as e:
+            attempts += 1
+            now = time.time()
+            final = attempts >= self.max_attempts
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "UPDATE scheduled_jobs SET status = ?, attempts = ?, last_error = ?, due_at = ?,"
+                    " claimed_by = NULL, claimed_at = NULL, updated_at = ? WHERE id = ?",
+                    (FAILED if final else PENDING, attempts, str(e)[:500],
+                     now if final else now + RETRY_DELAY_SECONDS * attempts, now, job_id)
+                )
+            with self._cond:
+                self.stats['failed' if final else 'retried'] += 1
+            if final:
+                logger.error(f"Trabajo {kind} ({job_id}) falló definitivamente tras {attempts} intento(s): {str(e)}")
+                if future is not None:
+                    future.set_exception(e)
+            else:
+                logger.warning(f"Trabajo {kind} ({job_id}) falló (intento {attempts}/{self.max_attempts}), se reintenta: {str(e)}")
+                if future is not None:
+                    with self._cond:
+                        self._futures[job_id] = future
+            return
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "UPDATE scheduled_jobs SET status = ?, attempts = ?, updated_at = ? WHERE id = ?",
+                (DONE, attempts + 1, now, job_id)
+            )
+        with self._cond:
+            self.stats['executed'] += 1
+        if future is not None:
+            future.set_result(result)
+
+    def _maintenance(self, now):
+        """
+        Devuelve a 'pending' los trabajos de procesos caídos, purga los terminados viejos y
+        suelta los Futures de trabajos que terminó otro proceso.
+        """
+        self._release_foreign_futures()
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute(
+                "UPDATE scheduled_jobs SET status = ?, claimed_by = NULL, claimed_at = NULL, updated_at = ?"
+                " WHERE status = ? AND claimed_at < ?",
+                (PENDING, now, RUNNING, now - self.stale_seconds)
+            )
+            recovered = cursor.rowcount
+            conn.execute(
+                "DELETE FROM scheduled_jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (DONE, FAILED, now - self.retention_seconds)
+            )
+        if recovered:
+            logger.warning(f"Se retomaron {recovered} trabajo(s) que quedaron en ejecución en un proceso caído")
+            with self._cond:
+                self.stats['recovered'] += recovered
+
+    def _release_foreign_futures(self, chunk_size=500):
+        """
+        Cancela y descarta los Futures cuyo trabajo ya no está pendiente acá: terminado (o purgado)
+        por otro proceso. _run_job saca el Future antes de ejecutar, así que uno que sigue en el
+        mapa con el trabajo terminado nunca se va a resolver en este proceso.
+        """
+        with self._cond:
+            job_ids = list(self._futures)
+        if not job_ids:
+            return
+        conn = self._connection()
+        active = set()
+        for start in range(0, len(job_ids), chunk_size):
+            chunk = job_ids[start:start + chunk_size]
+            placeholders = ','.join('?' * len(chunk))
+            active.update(row[0] for row in conn.execute(
+                f"SELECT id FROM scheduled_jobs WHERE id IN ({placeholders}) AND status IN (?, ?)",
+                chunk + [PENDING, RUNNING]
+            ))
+        with self._cond:
+            released = [self._futures.pop(job_id) for job_id in job_ids
+                        if job_id not in active and job_id in self._futures]
+        for future in released:
+            future.cancel()
+        if released:
+            logger.debug(f"Se soltaron {len(released)} Future(s) de trabajos ejecutados por otro proceso")
+
+    def shutdown(self, timeout=10):
+        """Detiene el temporizador. Los trabajos pendientes quedan en la base para el próximo arranque."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            timer, executor = self._timer, self._executor
+        if timer is not None:
+            timer.join(timeout)
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_job_scheduler():
+    """Planificador del proceso (se crea al primer uso; start() arranca su temporizador)."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = JobScheduler(
+                    JOB_SCHEDULER_DB_PATH,
+                    poll_seconds=JOB_SCHEDULER_POLL_SECONDS,
+                    workers=SCHEDULED_SEND_WORKERS,
+                    max_attempts=JOB_MAX_ATTEMPTS,
+                    stale_seconds=JOB_STALE_SECONDS,
+                    retention_seconds=JOB_RETENTION_HOURS * 3600
+                )
+                atexit.register(_scheduler.shutdown)
+    return _scheduler
+
+def get_job_scheduler_stats():
+    if _scheduler is None:
+        return {'started': False}
+    return _scheduler.get_stats()
@@ -1,12 +1,23 @@
 from datetime import datetime, timedelta
 import sys
 import os
+import atexit
 import logging
+import threading
 import pytz
-from services.twilio.messaging import send_whatsapp_message
+from concurrent.futures import ThreadPoolExecutor
+from itertools import zip_longest
+from services.twilio.messaging import send_whatsapp_message, is_real_message_sid
+from services.reminder_index import save_reminder
+from services.twilio.dispatcher import dispatch_send, PRIORITY_BULK
+from services.reminder_journal import get_reminder_journal, PENDING, CLAIMED, SENT, FAILED
 import traceback
 import config
-from config import RESERVAS_TABLE, DEFAULT_RESTAURANT_ID, DEFAULT_RESTAURANT_NAME
+from config import (
+    RESERVAS_TABLE, DEFAULT_RESTAURANT_ID, DEFAULT_RESTAURANT_NAME,
+    REMINDER_WORKERS, OUTBOUND_RATE_PER_SECOND, REMINDER_UPDATE_BATCH_SIZE, REMINDER_ALL_RESTAURANTS,
+    REMINDER_WINDOW_MINUTES, REMINDER_LEAD_HOURS
+)
 
 # Configurar zona horaria de Argentina
 ARGENTINA_TZ = pytz.timezone('America/Argentina/Buenos_Aires')
@@ -119,22 +130,52 @@ def formatear_telefono_argentina(telefono):
     
     return telefono_limpio
 
-import traceback
-from services.twilio.messaging import send_whatsapp_message
-from utils.session_manager import save_session
+def obtener_nombres_restaurantes(restaurante_ids):
+    """
+    Devuelve {restaurante_id: nombre} para todos los IDs con una sola consulta.
+    Los IDs que no se encuentran (o si la consulta falla) quedan fuera del mapa.
+    """
+    ids = sorted({rid for rid in restaurante_ids if rid})
+    if not ids:
+        return {}
+    try:
+        response = supabase_client.table('restaurantes').select('id, nombre').in_('id', ids).execute()
+        return {row['id']: row['nombre'] for row in (response.data or []) if row.get('nombre')}
+    except Exception as e:
+        logger.error(f"Error al obtener nombres de restaurantes: {str(e)}")
+        return {}
+
+def describir_fecha_reserva(fecha, hoy=None):
+    """'hoy', 'mañana' o 'el DD/MM/YYYY' según la fecha (date) respecto de hoy en Argentina."""
+    hoy = hoy or datetime.now(ARGENTINA_TZ).date()
+    if fecha == hoy:
+        return 'hoy'
+    if fecha == hoy + timedelta(days=1):
+        return 'mañana'
+    return f"el {fecha.strftime('%d/%m/%Y')}"
 
-def enviar_recordatorio(reserva):
-    """Envía un recordatorio por WhatsApp para una reserva"""
+def enviar_recordatorio(reserva, actualizar_bd=True, nombres_restaurantes=None):
+    """
+    Envía un recordatorio por WhatsApp para una reserva.
+    Con actualizar_bd=False no marca la reserva en Supabase (la corrida masiva
+    lo hace en lotes con RecordatorioUpdateBatcher) y devuelve el SID del mensaje.
+    nombres_restaurantes es el mapa precargado con obtener_nombres_restaurantes();
+    si el restaurante no está en el mapa se consulta en la BD.
+    """
     try:
         logger.info(f"Iniciando envío de recordatorio para reserva: {reserva['id']}")
         
         # Formatear la fecha para mostrar
         fecha_obj = datetime.strptime(reserva['fecha'], '%Y-%m-%d')
         fecha_display = fecha_obj.strftime('%d/%m/%Y')
+        # La corrida por ventana también recuerda reservas de hoy: el texto sale de la fecha
+        cuando = describir_fecha_reserva(fecha_obj.date())
         
         # Obtener el nombre del restaurante si existe el restaurante_id
         nombre_restaurante = DEFAULT_RESTAURANT_NAME
-        if 'restaurante_id' in reserva and reserva['restaurante_id']:
+        if nombres_restaurantes and reserva.get('restaurante_id') in nombres_restaurantes:
+            nombre_restaurante = nombres_restaurantes[reserva['restaurante_id']]
+        elif 'restaurante_id' in reserva and reserva['restaurante_id']:
             try:
                 response = supabase_client.table('restaurantes').select('nombre').eq('id', reserva['restaurante_id']).execute()
                 if hasattr(response, 'data') and response.data:
@@ -148,7 +189,7 @@ def enviar_recordatorio(reserva):
         
         mensaje = f"""¡Hola {nombre_cliente}! 👋
 
-Te recordamos tu reserva para mañana en {nombre_restaurante}:
+Te recordamos tu reserva para {cuando} en {nombre_restaurante}:
 
 📅 *Fecha:* {fecha_display}
 🕒 *Hora:* {reserva['hora']} hs
@@ -170,7 +211,7 @@ Responde con *1* para CONFIRMAR o *2* para CANCELAR tu reserva.
             'conversation_status': 'pending'
         }
         
-        # Normalizar número y guardar sesión para todas las variantes
+        # Normalizar número
         phone_clean = reserva['telefono'].replace('+', '').replace(' ', '').replace('-', '')
         
         # Asegurar formato correcto del número
@@ -180,34 +221,23 @@ Responde con *1* para CONFIRMAR o *2* para CANCELAR tu reserva.
             else:
                 phone_clean = f"549{phone_clean}"
         
-        session_data = {'reminder_data': reminder_data}
-        logger.info(f"Guardando datos de sesión para recordatorio ID {reserva['id']}")
-        
-        # Obtener restaurant_id para la sesión
+        # Obtener restaurant_id para el índice de recordatorios
         restaurant_id = reserva.get('restaurante_id')
         if not restaurant_id:
             logger.error(f"Recordatorio para reserva {reserva['id']} no tiene restaurant_id - esto puede causar problemas")
             # Usar un valor por defecto para evitar que falle completamente
             restaurant_id = "default"
         
-        # Guardar sesión para todas las variantes posibles del número con restaurant_id
-        for phone_variant in [
-            f"whatsapp:+{phone_clean}",
-            phone_clean,
-            f"+{phone_clean}",
-            phone_clean[2:] if phone_clean.startswith('54') else None,  # Sin 54
-            phone_clean[3:] if phone_clean.startswith('549') else None  # Sin 549
-        ]:
-            if phone_variant:
-                try:
-                    save_session(phone_variant, session_data, restaurant_id)
-                    logger.info(f"Sesión guardada para variante: {phone_variant} en restaurante: {restaurant_id}")
-                except Exception as e:
-                    logger.error(f"Error guardando sesión para {phone_variant} en restaurante {restaurant_id}: {str(e)}")
+        # Una sola escritura bajo el número canónico; el webhook lo resuelve desde cualquier variante
+        try:
+            save_reminder(f"+{phone_clean}", restaurant_id, reminder_data)
+            logger.info(f"Recordatorio indexado para +{phone_clean} en restaurante: {restaurant_id}")
+        except Exception as e:
+            logger.error(f"Error indexando recordatorio para +{phone_clean} en restaurante {restaurant_id}: {str(e)}")
         
         # Usar el método legacy con persistent_action directamente - esto garantiza que se envíen los botones
         try:
-            from twilio.rest import Client
+            from services.twilio.client_pool import get_twilio_client
             
             # Asegurarnos de que tenemos acceso a las credenciales de Twilio
             twilio_account_sid = os.getenv('TWILIO_ACCOUNT_SID')
@@ -222,7 +252,7 @@ Responde con *1* para CONFIRMAR o *2* para CANCELAR tu reserva.
             logger.info(f"🔧 DEBUG - Tipo: {type(twilio_whatsapp_number)}")
             logger.info(f"🔧 DEBUG - Longitud: {len(twilio_whatsapp_number) if twilio_whatsapp_number else 'None'}")
             
-            client = Client(twilio_account_sid, twilio_auth_token)
+            client = get_twilio_client(twilio_account_sid, twilio_auth_token)
             
             # Asegurar que el número tenga el formato correcto para WhatsApp
             to_number = f"whatsapp:+{phone_clean}"
@@ -262,12 +292,13 @@ Responde con *1* para CONFIRMAR o *2* para CANCELAR tu reserva.
             
             logger.info(f"Enviando mensaje WhatsApp desde: {from_number} hacia: {to_number}")
             
-            # Crear mensaje WhatsApp - sin persistent_action que no es válido
-            message = client.messages.create(
+            # Crear mensaje WhatsApp - sin persistent_action que no es válido.
+            # El despachador respeta el límite por número de origen y deja pasar antes a las respuestas interactivas
+            message = dispatch_send(from_number, lambda: client.messages.create(
                 body=mensaje,
                 from_=from_number,
                 to=to_number
-            )
+            ), PRIORITY_BULK)
             result = message.sid
             logger.info(f"Mensaje WhatsApp enviado con botones interactivos. SID: {result}")
             
@@ -313,12 +344,14 @@ Responde con *1* para CONFIRMAR o *2* para CANCELAR tu reserva.
                 result = send_whatsapp_message(
                     f"+{phone_clean}", 
                     mensaje,
-                    restaurant_config
+                    restaurant_config,
+                    priority=PRIORITY_BULK
                 )
-                if result:
+                if is_real_message_sid(result):
                     logger.info(f"✅ Fallback exitoso - Mensaje enviado sin botones: {result}")
                 else:
-                    logger.error("❌ Fallback también falló")
+                    # None o el SID simulado del modo de prueba: el mensaje no salió
+                    logger.error(f"❌ Fallback también falló (SID: {result})")
                     return None
             except Exception as fallback_error:
                 logger.error(f"❌ Error en fallback: {str(fallback_error)}")
@@ -326,6 +359,9 @@ Responde con *1* para CONFIRMAR o *2* para CANCELAR tu reserva.
 
         logger.info(f"Resultado envío de mensaje a +{phone_clean}: {result}")
         
+        if result and not actualizar_bd:
+            return result
+        
         if result:
             try:
                 # Actualizar estado en Supabase en una sola operación
@@ -358,16 +394,287 @@ Responde con *1* para CONFIRMAR o *2* para CANCELAR tu reserva.
         logger.error(traceback.format_exc())
         return False
 
-def enviar_recordatorios_reservas():
+class RecordatorioUpdateBatcher:
+    """
+    Acumula los IDs de reservas con recordatorio enviado y los marca en Supabase
+    con UPDATE ... WHERE id IN (...) de a `batch_size`, en lugar de un UPDATE por
+    reserva. Es seguro entre hilos; flush() debe llamarse al terminar la corrida
+    (también se registra en atexit para no perder un lote parcial si el proceso
+    termina a mitad de camino).
+    """
+    def __init__(self, supabase, fecha_recordatorio, batch_size=None):
+        self.supabase = supabase
+        self.update_data = {'recordatorio_enviado': True, 'fecha_recordatorio': fecha_recordatorio}
+        self.batch_size = max(1, batch_size or REMINDER_UPDATE_BATCH_SIZE)
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.marcadas = 0
+        self.fallidas = []
+        self.round_trips = 0
+        atexit.register(self.flush)
+
+    def add(self, reserva_id):
+        with self._lock:
+            self._pending.append(reserva_id)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self.flush(only_full=True)
+
+    def flush(self, only_full=False):
+        """Marca los IDs pendientes. Con only_full=True solo envía lotes completos."""
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    if not self._pending or (only_full and len(self._pending) < self.batch_size):
+                        return
+                    chunk = self._pending[:self.batch_size]
+                    del self._pending[:self.batch_size]
+                self._update_chunk(chunk)
+
+    def close(self):
+        self.flush()
+        atexit.unregister(self.flush)
+
+    def _update_chunk(self, chunk):
+        try:
+            self.round_trips += 1
+            response = self.supabase.table(RESERVAS_TABLE)\
+                .update(self.update_data)\
+                .in_('id', chunk)\
+                .execute()
+            actualizadas = {row.get('id') for row in (response.data or [])}
+            self.marcadas += len(actualizadas)
+            faltantes = [reserva_id for reserva_id in chunk if reserva_id not in actualizadas]
+            if faltantes:
+                logger.warning(f"⚠️  {len(faltantes)} reservas del lote no se marcaron en BD: {faltantes}")
+                self.fallidas.extend(faltantes)
+            else:
+                logger.info(f"✅ Lote de {len(chunk)} reservas marcadas como recordatorio enviado")
+        except Exception as e:
+            # Si falla el lote completo, reintentar de a una para no dejar reservas sin marcar
+            logger.error(f"Error marcando lote de {len(chunk)} reservas, reintentando individualmente: {str(e)}")
+            for reserva_id in chunk:
+                try:
+                    self.round_trips += 1
+                    response = self.supabase.table(RESERVAS_TABLE)\
+                        .update(self.update_data)\
+                        .eq('id', reserva_id)\
+                        .execute()
+                    if response.data:
+                        self.marcadas += 1
+                    else:
+                        self.fallidas.append(reserva_id)
+                except Exception as update_error:
+                    logger.error(f"Error actualizando BD para reserva {reserva_id}: {str(update_error)}")
+                    self.fallidas.append(reserva_id)
+
+def _procesar_recordatorio(reserva, i, total, batcher, nombres_restaurantes, journal=None, run_key=None):
+    """
+    Envía el recordatorio de una reserva y encola su ID en el batcher para marcarla en la BD.
+    Devuelve {'reserva_id', 'enviado', 'error'} (y 'omitida' si otra corrida ya la tomó);
+    nunca lanza excepciones.
+    """
+    reserva_id = reserva.get('id')
+    if journal and not journal.claim(run_key, reserva_id):
+        print(f"⏭️  Reserva {reserva_id} ya enviada o en curso en otra corrida")
+        return {'reserva_id': reserva_id, 'enviado': False, 'error': None, 'omitida': True}
+    try:
+        print(f"--- Procesando reserva {i}/{total}: ID {reserva_id} | "
+              f"Cliente: {reserva.get('nombre_cliente', 'Cliente')} | "
+              f"Teléfono: {reserva.get('telefono', 'N/A')} | Hora: {reserva.get('hora', 'N/A')}")
+        
+        message_sid = enviar_recordatorio(reserva, actualizar_bd=False, nombres_restaurantes=nombres_restaurantes)
+        # Un SID simulado (modo de prueba tras un error de Twilio) no es un envío: no se marca la reserva
+        if not is_real_message_sid(message_sid):
+            error_msg = f"Fallo al enviar recordatorio para reserva {reserva_id}" + \
+                        (f" (SID simulado {message_sid})" if message_sid else "")
+            print(f"❌ {error_msg}")
+            if journal:
+                journal.mark_failed(run_key, reserva_id, error_msg)
+            return {'reserva_id': reserva_id, 'enviado': False, 'error': error_msg}
+        
+        if journal:
+            journal.mark_sent(run_key, reserva_id, message_sid)
+        print(f"✅ Recordatorio enviado exitosamente (reserva {reserva_id})")
+        
+        # Se marca en la BD en lotes al final (o al completar batch_size)
+        batcher.add(reserva_id)
+        
+        return {'reserva_id': reserva_id, 'enviado': True, 'error': None}
+        
+    except Exception as e:
+        error_msg = f"Error general con reserva {reserva_id}: {str(e)}"
+        print(f"💥 {error_msg}")
+        print(f"📊 Traceback: {traceback.format_exc()}")
+        if journal:
+            try:
+                journal.mark_failed(run_key, reserva_id, error_msg)
+            except Exception as journal_error:
+                logger.error(f"Error registrando fallo en la bitácora: {str(journal_error)}")
+        return {'reserva_id': reserva_id, 'enviado': False, 'error': error_msg}
+
+def obtener_restaurantes_activos():
+    """Devuelve {restaurante_id: nombre} de todos los restaurantes activos (una consulta)."""
+    try:
+        response = supabase_client.table('restaurantes').select('id, nombre').eq('estado', 'activo').execute()
+        return {row['id']: row.get('nombre') or DEFAULT_RESTAURANT_NAME for row in (response.data or [])}
+    except Exception as e:
+        logger.error(f"Error al obtener restaurantes activos: {str(e)}")
+        return {}
+
+def intercalar_por_restaurante(reservas):
+    """
+    Ordena las reservas en ronda entre restaurantes (A1, B1, C1, A2, B2, ...) para
+    que el pool de envío atienda a todos por turnos y un restaurante grande no
+    demore los recordatorios de los demás. Conserva el orden dentro de cada uno.
+    """
+    grupos = {}
+    for reserva in reservas:
+        grupos.setdefault(reserva.get('restaurante_id'), []).append(reserva)
+    intercaladas = []
+    for ronda in zip_longest(*grupos.values()):
+        intercaladas.extend(reserva for reserva in ronda if reserva is not None)
+    return intercaladas
+
+def despachar_recordatorios(reservas_activas, total_reservas, ahora_argentina, nombres_restaurantes,
+                            intercalar=False, run_key=None):
+    """
+    Envía los recordatorios de `reservas_activas` con el pool de envío, marca en lotes
+    las enviadas y arma el resumen de la corrida.
+    
+    Con run_key registra cada reserva en la bitácora local: se omiten las que ya
+    figuran enviadas (y se vuelven a marcar en la BD por si se perdió el UPDATE) o
+    en curso en otra corrida.
+    """
+    mensajes_enviados = 0
+    mensajes_fallidos = 0
+    errores = []
+    supabase = supabase_client
+    batcher = RecordatorioUpdateBatcher(supabase, ahora_argentina.isoformat())
+    
+    journal = get_reminder_journal() if run_key else None
+    if journal:
+        journal.plan(run_key, reservas_activas)
+        estados = journal.statuses(run_key)
+        ya_enviadas = [r for r in reservas_activas if estados.get(str(r.get('id'))) == SENT]
+        en_curso = [r for r in reservas_activas if estados.get(str(r.get('id'))) == CLAIMED]
+        for reserva in ya_enviadas:
+            batcher.add(reserva.get('id'))
+        if ya_enviadas:
+            print(f"⏭️  {len(ya_enviadas)} reservas ya figuran enviadas en la bitácora, no se reenvían")
+        if en_curso:
+            print(f"⚠️  {len(en_curso)} reservas quedaron en envío sin resultado en una corrida anterior, "
+                  f"revisar manualmente: {[r.get('id') for r in en_curso]}")
+        reservas_activas = [r for r in reservas_activas if estados.get(str(r.get('id'))) in (PENDING, FAILED)]
+    
+    if intercalar:
+        reservas_activas = intercalar_por_restaurante(reservas_activas)
+    num_reservas_activas = len(reservas_activas)
+    
+    # Enviar recordatorios
+    print(f"\n🚀 Iniciando envío de recordatorios para {num_reservas_activas} reservas...")
+    
+    workers = max(1, min(REMINDER_WORKERS, num_reservas_activas))
+    print(f"⚙️  Envío con {workers} hilo(s), máximo {OUTBOUND_RATE_PER_SECOND} mensajes/s por número de Twilio")
+    print(f"🏪 Nombres precargados para {len(nombres_restaurantes)} restaurante(s)")
+    
+    def procesar(indexed_reserva):
+        i, reserva = indexed_reserva
+        return _procesar_recordatorio(reserva, i, num_reservas_activas, batcher, nombres_restaurantes, journal, run_key)
+    
+    try:
+        if workers == 1:
+            resultados = [procesar(item) for item in enumerate(reservas_activas, 1)]
+        else:
+            # map conserva el orden de las reservas en los resultados
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='recordatorios') as executor:
+                resultados = list(executor.map(procesar, enumerate(reservas_activas, 1)))
+    finally:
+        # Marcar en BD lo enviado aunque la corrida se haya interrumpido
+        batcher.close()
+    print(f"🗃️  Reservas marcadas en BD: {batcher.marcadas} en {batcher.round_trips} actualizaciones")
+    if batcher.fallidas:
+        print(f"⚠️  Recordatorio enviado pero no se pudo actualizar BD: {batcher.fallidas}")
+    
+    por_restaurante = {}
+    omitidas = 0
+    for reserva, resultado in zip(reservas_activas, resultados):
+        if resultado.get('omitida'):
+            omitidas += 1
+            continue
+        resumen_restaurante = por_restaurante.setdefault(
+            reserva.get('restaurante_id'), {'enviados': 0, 'fallidos': 0}
+        )
+        if resultado['enviado']:
+            mensajes_enviados += 1
+            resumen_restaurante['enviados'] += 1
+        else:
+            mensajes_fallidos += 1
+            resumen_restaurante['fallidos'] += 1
+            errores.append(resultado['error'])
+    
+    # Resumen final
+    print(f"\n=== RESUMEN FINAL ===")
+    print(f"📊 Reservas encontradas: {total_reservas}")
+    print(f"📊 Reservas activas procesadas: {num_reservas_activas}")
+    print(f"✅ Mensajes enviados: {mensajes_enviados}")
+    print(f"❌ Mensajes fallidos: {mensajes_fallidos}")
+    if omitidas:
+        print(f"⏭️  Omitidas (tomadas por otra corrida): {omitidas}")
+    
+    if errores:
+        print(f"⚠️  Errores encontrados:")
+        for error in errores:
+            print(f"   - {error}")
+    
+    if len(por_restaurante) > 1:
+        print(f"🏪 Detalle por restaurante:")
+        for rid, resumen_restaurante in por_restaurante.items():
+            nombre = nombres_restaurantes.get(rid, rid)
+            print(f"   - {nombre}: {resumen_restaurante['enviados']} enviados, {resumen_restaurante['fallidos']} fallidos")
+    
+    print(f"📋 Detalle por reserva:")
+    for i, resultado in enumerate(resultados, 1):
+        if resultado.get('omitida'):
+            estado = "⏭️  omitido"
+        else:
+            estado = "✅ enviado" if resultado['enviado'] else "❌ fallido"
+        print(f"   {i}. Reserva {resultado['reserva_id']}: {estado}")
+    
+    progreso = None
+    if journal:
+        progreso = journal.progress(run_key)
+        print(f"📈 Progreso de la corrida {run_key}: {progreso[SENT]}/{progreso['total']} enviados "
+              f"({progreso['porcentaje']}%), {progreso[FAILED]} fallidos, {progreso[CLAIMED]} sin resultado")
+    
+    return {
+        "success": True,
+        "reservas_encontradas": total_reservas,
+        "total_reservas": num_reservas_activas,
+        "reservas_activas": num_reservas_activas,
+        "mensajes_enviados": mensajes_enviados,
+        "mensajes_fallidos": mensajes_fallidos,
+        "errores": errores,
+        "resultados": resultados,
+        "reservas_marcadas": batcher.marcadas,
+        "por_restaurante": por_restaurante,
+        "progreso": progreso,
+        "resumen": f"Proceso completado: {mensajes_enviados} enviados, {mensajes_fallidos} fallidos"
+    }
+
+def enviar_recordatorios_reservas(todos_los_restaurantes=None):
     """
     Envía recordatorios de reserva para el día siguiente.
     Usa zona horaria de Argentina para calcular "mañana" correctamente.
+    
+    Con todos_los_restaurantes=True (o REMINDER_ALL_RESTAURANTS) recorre en una
+    sola corrida las reservas de todos los restaurantes activos, en lugar de
+    solo el restaurante por defecto.
     """
+    if todos_los_restaurantes is None:
+        todos_los_restaurantes = REMINDER_ALL_RESTAURANTS
     try:
-        mensajes_enviados = 0
-        mensajes_fallidos = 0
-        errores = []
-        
         print("=== INICIANDO PROCESO DE RECORDATORIOS ===")
         
         # Verificar si estamos en modo de prueba
@@ -389,9 +696,42 @@ def enviar_recordatorios_reservas():
         print(f"📅 Buscando reservas para mañana: {manana_display} ({manana_db})")
         
         # Obtener ID del restaurante si existe configuración multi-restaurante
-        restaurant_id = get_restaurant_id()
-        if restaurant_id:
-            print(f"🏪 Filtrando para restaurante con ID: {restaurant_id}")
+        restaurantes_activos = {}
+        restaurant_id = None
+        if todos_los_restaurantes:
+            restaurantes_activos = obtener_restaurantes_activos()
+            print(f"🏪 Modo multi-restaurante: {len(restaurantes_activos)} restaurantes activos")
+            if not restaurantes_activos:
+                return {
+                    "success": True,
+                    "reservas_encontradas": 0,
+                    "total_reservas": 0,
+                    "reservas_activas": 0,
+                    "mensajes_enviados": 0,
+                    "mensajes_fallidos": 0,
+                    "message": "No hay restaurantes activos"
+                }
+        else:
+            restaurant_id = get_restaurant_id()
+            if restaurant_id:
+                print(f"🏪 Filtrando para restaurante con ID: {restaurant_id}")
+        
+        # Si una corrida anterior para la misma fecha quedó a medias, retomarla desde la bitácora
+        run_key = f"{manana_db}:{'todos' if todos_los_restaurantes else (restaurant_id or 'default')}"
+        journal = get_reminder_journal()
+        if journal:
+            pendientes = journal.pending_reservations(run_key)
+            progreso = journal.progress(run_key)
+            if pendientes and progreso[CLAIMED] + progreso[SENT] > 0:
+                print(f"♻️  Retomando corrida {run_key}: {progreso[SENT]}/{progreso['total']} enviados "
+                      f"({progreso['porcentaje']}%), {len(pendientes)} pendientes")
+                nombres_restaurantes = restaurantes_activos or obtener_nombres_restaurantes(
+                    r.get('restaurante_id') for r in pendientes
+                )
+                return despachar_recordatorios(
+                    pendientes, progreso['total'], ahora_argentina, nombres_restaurantes,
+                    intercalar=bool(restaurantes_activos), run_key=run_key
+                )
         
         # Para propósitos de depuración, buscar algunas reservas recientes
         try:
@@ -416,8 +756,10 @@ def enviar_recordatorios_reservas():
         # Filtrar por fecha de mañana y que no hayan recibido recordatorio
         query = query.eq('fecha', manana_db).eq('recordatorio_enviado', False)
         
-        # Filtrar por restaurante si tenemos un ID específico
-        if restaurant_id:
+        # Filtrar por restaurante si tenemos un ID específico (o por todos los activos)
+        if restaurantes_activos:
+            query = query.in_('restaurante_id', list(restaurantes_activos.keys()))
+        elif restaurant_id:
             query = query.eq('restaurante_id', restaurant_id)
             
         print(f"🔍 Ejecutando consulta para reservas del {manana_db} sin recordatorio...")
@@ -463,81 +805,103 @@ def enviar_recordatorios_reservas():
                 "message": "No hay reservas activas que requieran recordatorio"
             }
 
-        # Enviar recordatorios
-        print(f"\n🚀 Iniciando envío de recordatorios para {num_reservas_activas} reservas...")
+        # Un solo SELECT para los nombres de todos los restaurantes de la corrida
+        if restaurantes_activos:
+            nombres_restaurantes = restaurantes_activos
+        else:
+            nombres_restaurantes = obtener_nombres_restaurantes(r.get('restaurante_id') for r in reservas_activas)
         
-        for i, reserva in enumerate(reservas_activas, 1):
-            try:
-                reserva_id = reserva.get('id')
-                nombre_cliente = reserva.get('nombre_cliente', 'Cliente')
-                telefono = reserva.get('telefono', 'N/A')
-                hora = reserva.get('hora', 'N/A')
-                
-                print(f"\n--- Procesando reserva {i}/{num_reservas_activas} ---")
-                print(f"📋 ID: {reserva_id}")
-                print(f"👤 Cliente: {nombre_cliente}")
-                print(f"📞 Teléfono: {telefono}")
-                print(f"🕒 Hora: {hora}")
-                
-                resultado = enviar_recordatorio(reserva)
-                
-                if resultado:
-                    mensajes_enviados += 1
-                    print(f"✅ Recordatorio enviado exitosamente")
-                    
-                    # Marcar como recordatorio enviado
-                    try:
-                        update_response = supabase.table(RESERVAS_TABLE)\
-                            .update({'recordatorio_enviado': True, 'fecha_recordatorio': ahora_argentina.isoformat()})\
-                            .eq('id', reserva_id)\
-                            .execute()
-                        
-                        if update_response.data:
-                            print(f"✅ Reserva marcada como recordatorio enviado en BD")
-                        else:
-                            print(f"⚠️  Recordatorio enviado pero no se pudo actualizar BD")
-                            
-                    except Exception as update_error:
-                        print(f"⚠️  Error actualizando BD: {str(update_error)}")
-                        
-                else:
-                    mensajes_fallidos += 1
-                    error_msg = f"Fallo al enviar recordatorio para reserva {reserva_id}"
-                    errores.append(error_msg)
-                    print(f"❌ {error_msg}")
-                    
-            except Exception as e:
-                mensajes_fallidos += 1
-                error_msg = f"Error general con reserva {reserva.get('id')}: {str(e)}"
-                errores.append(error_msg)
-                print(f"💥 {error_msg}")
-                print(f"📊 Traceback: {traceback.format_exc()}")
-                
-        # Resumen final
-        print(f"\n=== RESUMEN FINAL ===")
-        print(f"📊 Reservas encontradas: {total_reservas}")
-        print(f"📊 Reservas activas procesadas: {num_reservas_activas}")
-        print(f"✅ Mensajes enviados: {mensajes_enviados}")
-        print(f"❌ Mensajes fallidos: {mensajes_fallidos}")
-        
-        if errores:
-            print(f"⚠️  Errores encontrados:")
-            for error in errores:
-                print(f"   - {error}")
-        
-        return {
-            "success": True,
-            "reservas_encontradas": total_reservas,
-            "total_reservas": num_reservas_activas,
-            "reservas_activas": num_reservas_activas,
-            "mensajes_enviados": mensajes_enviados,
-            "mensajes_fallidos": mensajes_fallidos,
-            "errores": errores,
-            "resumen": f"Proceso completado: {mensajes_enviados} enviados, {mensajes_fallidos} fallidos"
-        }
+        return despachar_recordatorios(
+            reservas_activas, total_reservas, ahora_argentina, nombres_restaurantes,
+            intercalar=bool(restaurantes_activos), run_key=run_key
+        )
         
     except Exception as e:
         error_msg = f"Error crítico en el proceso de recordatorios: {str(e)}"
         print(f"💥 {error_msg}")
         print(f"📊 Traceback completo: {traceback.format_exc()}")
-        return {"success": False, "error": error_msg}
\ No newline at end of file
+        return {"success": False, "error": error_msg}
+
+def _fecha_hora_reserva(reserva):
+    """Fecha y hora de la reserva como datetime con zona horaria de Argentina, o None si no se puede leer."""
+    try:
+        hora = str(reserva.get('hora') or '')[:5]
+        fecha_hora = datetime.strptime(f"{reserva.get('fecha')} {hora}", '%Y-%m-%d %H:%M')
+        return ARGENTINA_TZ.localize(fecha_hora)
+    except (TypeError, ValueError):
+        return None
+
+def enviar_recordatorios_ventana(minutos_ventana=None, todos_los_restaurantes=None, ahora=None):
+    """
+    Modo de ventana deslizante: pensado para correr cada `minutos_ventana` minutos.
+    Envía recordatorio a las reservas sin recordatorio cuya fecha+hora cae antes de
+    ahora + REMINDER_LEAD_HOURS + minutos_ventana (y todavía no pasó), así la carga
+    se reparte a lo largo del día en corridas chicas en lugar de un envío masivo.
+    Las reservas que quedaron afuera de una corrida anterior se toman en la siguiente.
+
+    La primera corrida no tiene corridas anteriores: envía de una vez todas las
+    reservas sin recordatorio de las próximas REMINDER_LEAD_HOURS horas, incluidas
+    las de hoy. Recién desde la segunda la carga queda repartida en ventanas de
+    `minutos_ventana`.
+    """
+    minutos_ventana = minutos_ventana or REMINDER_WINDOW_MINUTES
+    if todos_los_restaurantes is None:
+        todos_los_restaurantes = REMINDER_ALL_RESTAURANTS
+    try:
+        ahora = ahora or datetime.now(ARGENTINA_TZ)
+        limite = ahora + timedelta(hours=REMINDER_LEAD_HOURS, minutes=minutos_ventana)
+        print(f"🕒 Ventana de recordatorios: reservas hasta {limite.strftime('%d/%m/%Y %H:%M')} "
+              f"(cada {minutos_ventana} min, {REMINDER_LEAD_HOURS} h de anticipación)")
+        
+        restaurantes_activos = {}
+        restaurant_id = None
+        if todos_los_restaurantes:
+            restaurantes_activos = obtener_restaurantes_activos()
+            if not restaurantes_activos:
+                return {"success": True, "reservas_encontradas": 0, "mensajes_enviados": 0,
+                        "mensajes_fallidos": 0, "errores": [], "message": "No hay restaurantes activos"}
+        else:
+            restaurant_id = get_restaurant_id()
+        
+        # Las fechas de la ventana son a lo sumo dos o tres días: filtrar por fecha en la BD y por hora aquí
+        query = supabase_client.table(RESERVAS_TABLE).select('*')\
+            .gte('fecha', ahora.strftime('%Y-%m-%d'))\
+            .lte('fecha', limite.strftime('%Y-%m-%d'))\
+            .eq('recordatorio_enviado', False)
+        if restaurantes_activos:
+            query = query.in_('restaurante_id', list(restaurantes_activos.keys()))
+        elif restaurant_id:
+            query = query.eq('restaurante_id', restaurant_id)
+        reservas = query.execute().data or []
+        
+        reservas_activas = []
+        for reserva in reservas:
+            if (reserva.get('estado') or '').lower() in ['cancelada', 'no asistió', 'cancelado']:
+                continue
+            fecha_hora = _fecha_hora_reserva(reserva)
+            if fecha_hora and ahora < fecha_hora <= limite:
+                reservas_activas.append(reserva)
+        
+        print(f"📊 Reservas en la ventana: {len(reservas_activas)} de {len(reservas)} sin recordatorio")
+        if not reservas_activas:
+            return {"success": True, "reservas_encontradas": len(reservas), "reservas_activas": 0,
+                    "mensajes_enviados": 0, "mensajes_fallidos": 0, "errores": [],
+                    "message": "No hay reservas en la ventana"}
+        
+        if restaurantes_activos:
+            nombres_restaurantes = restaurantes_activos
+        else:
+            nombres_restaurantes = obtener_nombres_restaurantes(r.get('restaurante_id') for r in reservas_activas)
+        
+        # Misma clave para todas las corridas de ventana: la bitácora evita reenvíos entre corridas superpuestas
+        run_key = f"ventana:{'todos' if todos_los_restaurantes else (restaurant_id or 'default')}"
+        return despachar_recordatorios(
+            reservas_activas, len(reservas), ahora, nombres_restaurantes,
+            intercalar=bool(restaurantes_activos), run_key=run_key
+        )
+    
+    except Exception as e:
+        error_msg = f"Error crítico en la corrida por ventana: {str(e)}"
+        print(f"💥 {error_msg}")
+        print(f"📊 Traceback completo: {traceback.format_exc()}")
+        return {"success": False, "error": error_msg}
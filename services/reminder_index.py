@@ -0,0 +1,154 @@
+"""
+Índice de recordatorios pendientes por teléfono.
+
+Cada recordatorio enviado se guarda una sola vez bajo (restaurante, teléfono
+canónico +549...), en lugar de copiarse en la sesión de cada variante del número.
+El webhook lo resuelve con una búsqueda por clave, sin probar variantes.
+
+La tabla pending_reminders vive en SQLite (REMINDER_INDEX_DB_PATH, por defecto
+el mismo archivo que las sesiones) y se comparte entre el cron y los workers del
+host. Cada proceso mantiene además un mapa en memoria que se descarta cuando otro
+proceso escribe en la base (PRAGMA data_version).
+
+REMINDER_INDEX_TTL_HOURS es cuánto se conserva cada entrada; la ventana en la que
+un mensaje del cliente se toma como respuesta al recordatorio es más corta
+(REMINDER_RESPONSE_WINDOW_MINUTES, por defecto la vida de una sesión, como cuando
+el recordatorio se guardaba en la sesión) y se pasa como `max_age_seconds`.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from config import REMINDER_INDEX_DB_PATH, REMINDER_INDEX_TTL_HOURS
+from utils.phone_utils import normalize_argentine_phone
+
+logger = logging.getLogger(__name__)
+
+def reminder_key(phone_number, restaurant_id):
+    return (str(restaurant_id or 'default'), normalize_argentine_phone(phone_number))
+
+class ReminderIndex:
+    def __init__(self, db_path, ttl_seconds):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._memory = {}  # (restaurant_id, phone) -> (reminder_data, updated_at)
+        self._lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'db_hits': 0, 'misses': 0, 'writes': 0}
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pending_reminders ("
+                " restaurant_id TEXT NOT NULL,"
+                " phone TEXT NOT NULL,"
+                " data TEXT NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " PRIMARY KEY (restaurant_id, phone)"
+                ") WITHOUT ROWID"
+            )
+            conn.execute("DELETE FROM pending_reminders WHERE updated_at < ?", (time.time() - ttl_seconds,))
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.data_version = None
+        return conn
+
+    def _sync_memory(self, conn):
+        """Descarta el mapa en memoria si otro proceso (o conexión) modificó la base."""
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if self._local.data_version is not None and version != self._local.data_version:
+            with self._lock:
+                self._memory.clear()
+        self._local.data_version = version
+
+    def get(self, phone_number, restaurant_id, max_age_seconds=None):
+        """Datos del recordatorio, si se escribió hace menos de `max_age_seconds` (por defecto, el TTL)."""
+        key = reminder_key(phone_number, restaurant_id)
+        max_age = min(self.ttl_seconds, max_age_seconds) if max_age_seconds else self.ttl_seconds
+        conn = self._connection()
+        self._sync_memory(conn)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+        if entry and now - entry[1] <= max_age:
+            self.stats['memory_hits'] += 1
+            return dict(entry[0])
+        row = conn.execute(
+            "SELECT data, updated_at FROM pending_reminders WHERE restaurant_id = ? AND phone = ?", key
+        ).fetchone()
+        if not row or now - row[1] > max_age:
+            self.stats['misses'] += 1
+            return None
+        data = json.loads(row[0])
+        with self._lock:
+            self._memory[key] = (data, row[1])
+        self.stats['db_hits'] += 1
+        return dict(data)
+
+    def put(self, phone_number, restaurant_id, reminder_data):
+        key = reminder_key(phone_number, restaurant_id)
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT INTO pending_reminders (restaurant_id, phone, data, updated_at) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT(restaurant_id, phone) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                key + (json.dumps(reminder_data, default=str), now)
+            )
+        with self._lock:
+            self._memory[key] = (dict(reminder_data), now)
+        self.stats['writes'] += 1
+
+    def update(self, phone_number, restaurant_id, **fields):
+        """Actualiza campos del recordatorio (lo crea si no existía). Devuelve los datos resultantes."""
+        data = self.get(phone_number, restaurant_id) or {}
+        data.update(fields)
+        self.put(phone_number, restaurant_id, data)
+        return data
+
+    def delete(self, phone_number, restaurant_id):
+        key = reminder_key(phone_number, restaurant_id)
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM pending_reminders WHERE restaurant_id = ? AND phone = ?", key)
+        with self._lock:
+            self._memory.pop(key, None)
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_reminder_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = ReminderIndex(REMINDER_INDEX_DB_PATH, REMINDER_INDEX_TTL_HOURS * 3600)
+    return _index
+
+def save_reminder(phone_number, restaurant_id, reminder_data):
+    """Registra el recordatorio enviado a `phone_number` (cualquier formato) para el restaurante."""
+    get_reminder_index().put(phone_number, restaurant_id, reminder_data)
+
+def get_reminder(phone_number, restaurant_id, max_age_seconds=None):
+    """Datos del último recordatorio enviado al número en el restaurante, o None."""
+    return get_reminder_index().get(phone_number, restaurant_id, max_age_seconds)
+
+def update_reminder(phone_number, restaurant_id, **fields):
+    return get_reminder_index().update(phone_number, restaurant_id, **fields)
+
+def delete_reminder(phone_number, restaurant_id):
+    get_reminder_index().delete(phone_number, restaurant_id)
+
+def get_reminder_index_stats():
+    return dict(get_reminder_index().stats)
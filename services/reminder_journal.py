@@ -0,0 +1,150 @@
+"""
+Bitácora local de corridas de recordatorios.
+
+Cada corrida (fecha objetivo + alcance) guarda su plan en SQLite y el estado de
+cada reserva: 'pending' -> 'claimed' (justo antes de enviar) -> 'sent' (con el
+SID de Twilio) o 'failed'. Así una corrida reiniciada o la de respaldo:
+- retoma el plan pendiente sin volver a consultar Supabase,
+- no reenvía lo que ya salió aunque se haya perdido el UPDATE de
+  recordatorio_enviado,
+- no reintenta reservas 'claimed' sin resultado (el proceso murió durante el
+  envío y no se sabe si el mensaje salió): se informan para revisión manual.
+
+Para que sirva entre corridas, REMINDER_JOURNAL_PATH debe apuntar a un disco
+persistente del host donde corre el cron.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from config import REMINDER_JOURNAL_ENABLED, REMINDER_JOURNAL_PATH, REMINDER_JOURNAL_RETENTION_DAYS
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+CLAIMED = 'claimed'
+SENT = 'sent'
+FAILED = 'failed'
+
+class ReminderJournal:
+    def __init__(self, db_path, retention_days=14):
+        self.db_path = db_path
+        self._local = threading.local()
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS reminder_journal ("
+                " run_key TEXT NOT NULL,"
+                " reserva_id TEXT NOT NULL,"
+                " restaurante_id TEXT,"
+                " reserva TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " message_sid TEXT,"
+                " error TEXT,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " updated_at REAL NOT NULL,"
+                " PRIMARY KEY (run_key, reserva_id)"
+                ")"
+            )
+            conn.execute("DELETE FROM reminder_journal WHERE updated_at < ?",
+                         (time.time() - retention_days * 86400,))
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def plan(self, run_key, reservas):
+        """Agrega al plan las reservas que todavía no estaban (las existentes conservan su estado)."""
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO reminder_journal"
+                " (run_key, reserva_id, restaurante_id, reserva, status, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (run_key, str(r.get('id')), r.get('restaurante_id'), json.dumps(r, default=str), PENDING, now)
+                    for r in reservas
+                ]
+            )
+
+    def pending_reservations(self, run_key):
+        """Reservas del plan que quedan por enviar ('pending' o 'failed'), en el orden original."""
+        rows = self._connection().execute(
+            "SELECT reserva FROM reminder_journal WHERE run_key = ? AND status IN (?, ?) ORDER BY rowid",
+            (run_key, PENDING, FAILED)
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def statuses(self, run_key):
+        rows = self._connection().execute(
+            "SELECT reserva_id, status FROM reminder_journal WHERE run_key = ?", (run_key,)
+        ).fetchall()
+        return dict(rows)
+
+    def claim(self, run_key, reserva_id):
+        """Marca la reserva como en envío. Devuelve False si ya fue enviada o la tomó otra corrida."""
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute(
+                "UPDATE reminder_journal SET status = ?, attempts = attempts + 1, updated_at = ?"
+                " WHERE run_key = ? AND reserva_id = ? AND status IN (?, ?)",
+                (CLAIMED, time.time(), run_key, str(reserva_id), PENDING, FAILED)
+            )
+            return cursor.rowcount == 1
+
+    def mark_sent(self, run_key, reserva_id, message_sid):
+        self._set_status(run_key, reserva_id, SENT, message_sid=message_sid)
+
+    def mark_failed(self, run_key, reserva_id, error):
+        self._set_status(run_key, reserva_id, FAILED, error=error)
+
+    def _set_status(self, run_key, reserva_id, status, message_sid=None, error=None):
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "UPDATE reminder_journal SET status = ?, message_sid = COALESCE(?, message_sid),"
+                " error = ?, updated_at = ? WHERE run_key = ? AND reserva_id = ?",
+                (status, message_sid, error, time.time(), run_key, str(reserva_id))
+            )
+
+    def progress(self, run_key):
+        """Cantidad de reservas por estado y porcentaje terminado (enviadas sobre el total del plan)."""
+        rows = self._connection().execute(
+            "SELECT status, COUNT(*) FROM reminder_journal WHERE run_key = ? GROUP BY status", (run_key,)
+        ).fetchall()
+        counts = {PENDING: 0, CLAIMED: 0, SENT: 0, FAILED: 0}
+        counts.update(dict(rows))
+        total = sum(counts.values())
+        counts['total'] = total
+        counts['porcentaje'] = round(100.0 * counts[SENT] / total, 1) if total else 100.0
+        return counts
+
+_journal = None
+_journal_lock = threading.Lock()
+
+def get_reminder_journal():
+    """Bitácora compartida del proceso, o None si REMINDER_JOURNAL_ENABLED es false o no se pudo abrir."""
+    global _journal
+    if not REMINDER_JOURNAL_ENABLED:
+        return None
+    if _journal is None:
+        with _journal_lock:
+            if _journal is None:
+                try:
+                    _journal = ReminderJournal(REMINDER_JOURNAL_PATH, REMINDER_JOURNAL_RETENTION_DAYS)
+                except Exception as e:
+                    logger.error(f"No se pudo abrir la bitácora de recordatorios en {REMINDER_JOURNAL_PATH}: {str(e)}")
+                    return None
+    return _journal
@@ -2,7 +2,9 @@ from datetime import datetime
 from config import SUPABASE_ENABLED
 from services.email_service import enviar_correo_confirmacion
 from services.twilio.messaging import send_whatsapp_message
+from services.twilio.dispatcher import PRIORITY_NORMAL
 from .validacion import validar_reserva
+from .daily_stats import registrar_en_estadisticas
 
 def get_restaurant_config_by_id(restaurant_id, supabase=None):
     """
@@ -103,6 +105,7 @@ def registrar_reserva(data, supabase=None):
                 # Obtener el ID de la reserva si está disponible
                 if hasattr(result, 'data') and result.data and len(result.data) > 0:
                     reserva_id = result.data[0].get('id', 'N/A')
+                    registrar_en_estadisticas(result.data)
                 else:
                     print(f"No se pudo extraer ID - data vacío o no existe")
             except Exception as e:
@@ -190,7 +193,7 @@ Si necesitas modificar o cancelar tu reserva, por favor contáctanos al {contact
 {restaurant_name}
 """
             # Usar la configuración real del restaurante que ya tenemos
-            whatsapp_sent = send_whatsapp_message(phone, whatsapp_message, restaurant_config)
+            whatsapp_sent = send_whatsapp_message(phone, whatsapp_message, restaurant_config, priority=PRIORITY_NORMAL)
         
         # Crear un mensaje de confirmación para el usuario
         confirmation_message = f"""
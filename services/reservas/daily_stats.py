@@ -0,0 +1,341 @@
+"""
+Agregados diarios de reservas por restaurante (reservas_daily_stats).
+
+Para cada (restaurante, fecha, estado) se guarda cuántas reservas hay y cuántas
+personas suman, así el dashboard y los chequeos de capacidad leen una fila por
+día en lugar de recorrer todas las reservas.
+
+El agregado se mantiene de forma incremental: cada escritura en reservas_prod
+(registrar_reserva, save_reservation, actualizar_estado_reserva, el endpoint
+update_reservation del admin y las respuestas a recordatorios) pasa las filas
+que devolvió Supabase a registrar_en_estadisticas(). Una tabla espejo
+(reservas_stats_rows) recuerda con qué fecha/estado/personas se contó cada
+reserva, así un cambio resta de su celda anterior y suma en la nueva, y aplicar
+dos veces la misma fila no duplica nada. Cada escritura además incrementa la
+versión del restaurante (reservas_stats_versions), que usan las cachés derivadas
+(dashboard) para invalidarse también en los demás workers.
+
+Las tablas viven en SQLite (DAILY_STATS_DB_PATH, por defecto el archivo de
+sesiones) y se comparten entre los workers del host. Un restaurante se considera
+completo (sus lecturas pueden salir del agregado) desde que se reconstruye su
+histórico (reservas_stats_rebuilds); el dashboard lo reconstruye solo la primera
+vez, y scripts/rebuild_daily_stats.py lo hace a mano (backfill o correcciones por
+ediciones hechas fuera de la app). Si una escritura no llega al agregado
+(DAILY_STATS_ENABLED=false), el restaurante deja de estar completo.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+from config import DAILY_STATS_ENABLED, DAILY_STATS_DB_PATH
+
+logger = logging.getLogger(__name__)
+
+# Mismo orden que las etiquetas del dashboard: Pendiente, Confirmada, Cancelada, No asistió
+ESTADOS = ('pendiente', 'confirmada', 'cancelada', 'no_asistio')
+OTRO = 'otro'
+_ESTADO_ALIAS = {
+    'pendiente': 'pendiente',
+    'confirmada': 'confirmada', 'confirmado': 'confirmada',
+    'cancelada': 'cancelada', 'cancelado': 'cancelada',
+    'no asistió': 'no_asistio', 'no asistio': 'no_asistio', 'no_asistio': 'no_asistio'
+}
+
+REBUILD_PAGE_SIZE = 1000
+
+def normalizar_estado(estado):
+    """Clave del estado en el agregado ('pendiente', 'confirmada', 'cancelada', 'no_asistio' u 'otro')."""
+    return _ESTADO_ALIAS.get((estado or '').strip().lower(), OTRO)
+
+def _personas(reserva):
+    try:
+        return int(reserva.get('personas') or 0)
+    except (TypeError, ValueError):
+        return 0
+
+def _celda(reserva):
+    """(restaurante, fecha ISO, estado, personas) con que se cuenta la reserva, o None si le faltan datos."""
+    restaurant_id = reserva.get('restaurante_id')
+    fecha = str(reserva.get('fecha') or '')[:10]
+    if not restaurant_id or len(fecha) != 10:
+        return None
+    return (str(restaurant_id), fecha, normalizar_estado(reserva.get('estado')), _personas(reserva))
+
+class DailyReservationStats:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        self.stats = {'applied': 0, 'unchanged': 0, 'skipped': 0, 'reads': 0, 'rebuilds': 0}
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS reservas_daily_stats ("
+                " restaurant_id TEXT NOT NULL,"
+                " fecha TEXT NOT NULL,"
+                " estado TEXT NOT NULL,"
+                " reservas INTEGER NOT NULL DEFAULT 0,"
+                " personas INTEGER NOT NULL DEFAULT 0,"
+                " updated_at REAL NOT NULL,"
+                " PRIMARY KEY (restaurant_id, fecha, estado)"
+                ") WITHOUT ROWID"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS reservas_stats_rows ("
+                " reserva_id TEXT PRIMARY KEY,"
+                " restaurant_id TEXT NOT NULL,"
+                " fecha TEXT NOT NULL,"
+                " estado TEXT NOT NULL,"
+                " personas INTEGER NOT NULL"
+                ")"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_reservas_stats_rows_restaurant ON reservas_stats_rows (restaurant_id)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS reservas_stats_versions ("
+                " restaurant_id TEXT PRIMARY KEY,"
+                " version INTEGER NOT NULL,"
+                " updated_at REAL NOT NULL"
+                ") WITHOUT ROWID"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS reservas_stats_rebuilds ("
+                " restaurant_id TEXT PRIMARY KEY,"
+                " rebuilt_at REAL NOT NULL"
+                ") WITHOUT ROWID"
+            )
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _sumar(conn, celda, signo, now):
+        restaurant_id, fecha, estado, personas = celda
+        conn.execute(
+            "INSERT INTO reservas_daily_stats (restaurant_id, fecha, estado, reservas, personas, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT(restaurant_id, fecha, estado) DO UPDATE SET"
+            " reservas = reservas + excluded.reservas, personas = personas + excluded.personas,"
+            " updated_at = excluded.updated_at",
+            (restaurant_id, fecha, estado, signo, signo * personas, now)
+        )
+
+    @staticmethod
+    def _incrementar_versiones(conn, restaurant_ids, now):
+        conn.executemany(
+            "INSERT INTO reservas_stats_versions (restaurant_id, version, updated_at) VALUES (?, 1, ?)"
+            " ON CONFLICT(restaurant_id) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at",
+            [(str(restaurant_id), now) for restaurant_id in restaurant_ids]
+        )
+
+    def marcar_cambio(self, restaurant_ids):
+        """
+        Incrementa la versión de los restaurantes sin tocar los contadores; como el
+        agregado no vio esa escritura, los restaurantes dejan de estar completos.
+        """
+        restaurant_ids = {str(restaurant_id) for restaurant_id in restaurant_ids}
+        conn = self._connection()
+        with conn:
+            self._incrementar_versiones(conn, restaurant_ids, time.time())
+            conn.executemany("DELETE FROM reservas_stats_rebuilds WHERE restaurant_id = ?",
+                             [(restaurant_id,) for restaurant_id in restaurant_ids])
+
+    def completo(self, restaurant_id):
+        """True si el agregado del restaurante se reconstruyó y desde entonces vio todas sus escrituras."""
+        return self._connection().execute(
+            "SELECT 1 FROM reservas_stats_rebuilds WHERE restaurant_id = ?", (str(restaurant_id),)
+        ).fetchone() is not None
+
+    def version(self, restaurant_id):
+        """Versión actual de las reservas del restaurante (0 si nunca se escribió)."""
+        row = self._connection().execute(
+            "SELECT version FROM reservas_stats_versions WHERE restaurant_id = ?", (str(restaurant_id),)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def aplicar(self, reservas):
+        """Lleva al agregado el estado actual de las reservas (filas completas de reservas_prod)."""
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            # IMMEDIATE: leer la fila espejo y ajustar los contadores sin que otro worker se cruce
+            conn.execute("BEGIN IMMEDIATE")
+            self._incrementar_versiones(conn, {reserva.get('restaurante_id') for reserva in reservas if reserva.get('restaurante_id')}, now)
+            for reserva in reservas:
+                reserva_id = reserva.get('id')
+                celda = _celda(reserva)
+                if reserva_id is None or celda is None:
+                    self.stats['skipped'] += 1
+                    continue
+                anterior = conn.execute(
+                    "SELECT restaurant_id, fecha, estado, personas FROM reservas_stats_rows WHERE reserva_id = ?",
+                    (str(reserva_id),)
+                ).fetchone()
+                if anterior == celda:
+                    self.stats['unchanged'] += 1
+                    continue
+                if anterior:
+                    self._sumar(conn, anterior, -1, now)
+                self._sumar(conn, celda, 1, now)
+                conn.execute(
+                    "INSERT INTO reservas_stats_rows (reserva_id, restaurant_id, fecha, estado, personas) VALUES (?, ?, ?, ?, ?)"
+                    " ON CONFLICT(reserva_id) DO UPDATE SET restaurant_id = excluded.restaurant_id, fecha = excluded.fecha,"
+                    " estado = excluded.estado, personas = excluded.personas",
+                    (str(reserva_id),) + celda
+                )
+                self.stats['applied'] += 1
+
+    def resumen(self, restaurant_id, desde, hasta):
+        """
+        Totales por día entre `desde` y `hasta` (fechas ISO, inclusive):
+        {fecha: {'reservas': n, 'personas': p, 'por_estado': {estado: {'reservas': n, 'personas': p}}}}
+        """
+        rows = self._connection().execute(
+            "SELECT fecha, estado, reservas, personas FROM reservas_daily_stats"
+            " WHERE restaurant_id = ? AND fecha >= ? AND fecha <= ? AND reservas > 0",
+            (str(restaurant_id), desde, hasta)
+        ).fetchall()
+        self.stats['reads'] += 1
+        dias = defaultdict(lambda: {'reservas': 0, 'personas': 0, 'por_estado': {}})
+        for fecha, estado, reservas, personas in rows:
+            dia = dias[fecha]
+            dia['reservas'] += reservas
+            dia['personas'] += personas
+            dia['por_estado'][estado] = {'reservas': reservas, 'personas': personas}
+        return dict(dias)
+
+    def reconstruir(self, reservas, restaurant_id=None):
+        """
+        Reemplaza el agregado (de un restaurante o de todos) por el calculado desde `reservas`.
+        Devuelve la cantidad de reservas contadas.
+        """
+        celdas = defaultdict(lambda: [0, 0])
+        espejo = []
+        for reserva in reservas:
+            celda = _celda(reserva)
+            if reserva.get('id') is None or celda is None:
+                continue
+            acumulado = celdas[celda[:3]]
+            acumulado[0] += 1
+            acumulado[1] += celda[3]
+            espejo.append((str(reserva['id']),) + celda)
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if restaurant_id:
+                conn.execute("DELETE FROM reservas_daily_stats WHERE restaurant_id = ?", (str(restaurant_id),))
+                conn.execute("DELETE FROM reservas_stats_rows WHERE restaurant_id = ?", (str(restaurant_id),))
+            else:
+                conn.execute("DELETE FROM reservas_daily_stats")
+                conn.execute("DELETE FROM reservas_stats_rows")
+            conn.executemany(
+                "INSERT INTO reservas_daily_stats (restaurant_id, fecha, estado, reservas, personas, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [key + (totales[0], totales[1], now) for key, totales in celdas.items()]
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO reservas_stats_rows (reserva_id, restaurant_id, fecha, estado, personas)"
+                " VALUES (?, ?, ?, ?, ?)",
+                espejo
+            )
+            restaurantes = {celda[0] for celda in celdas} | ({str(restaurant_id)} if restaurant_id else set())
+            self._incrementar_versiones(conn, restaurantes, now)
+            if not restaurant_id:
+                conn.execute("DELETE FROM reservas_stats_rebuilds")
+            conn.executemany(
+                "INSERT OR REPLACE INTO reservas_stats_rebuilds (restaurant_id, rebuilt_at) VALUES (?, ?)",
+                [(restaurante, now) for restaurante in restaurantes]
+            )
+        self.stats['rebuilds'] += 1
+        return len(espejo)
+
+_daily_stats = None
+_daily_stats_lock = threading.Lock()
+
+def get_daily_stats():
+    global _daily_stats
+    if _daily_stats is None:
+        with _daily_stats_lock:
+            if _daily_stats is None:
+                _daily_stats = DailyReservationStats(DAILY_STATS_DB_PATH)
+    return _daily_stats
+
+def registrar_en_estadisticas(reservas):
+    """
+    Aplica al agregado las filas devueltas por un insert/update de reservas_prod
+    (con DAILY_STATS_ENABLED=false solo incrementa la versión de los restaurantes).
+    Nunca interrumpe la escritura que la llama: los errores solo se registran.
+    """
+    if not reservas:
+        return
+    try:
+        if DAILY_STATS_ENABLED:
+            get_daily_stats().aplicar(reservas)
+        else:
+            get_daily_stats().marcar_cambio(r.get('restaurante_id') for r in reservas if r.get('restaurante_id'))
+    except Exception as e:
+        logger.error(f"Error actualizando reservas_daily_stats: {str(e)}")
+
+def version_restaurante(restaurant_id):
+    """Versión de las reservas del restaurante; cambia con cada escritura, en cualquier worker."""
+    try:
+        return get_daily_stats().version(restaurant_id)
+    except Exception as e:
+        logger.error(f"Error leyendo la versión de reservas de {restaurant_id}: {str(e)}")
+        return None
+
+def obtener_resumen_diario(restaurant_id, desde, hasta):
+    return get_daily_stats().resumen(restaurant_id, desde, hasta)
+
+def estadisticas_completas(restaurant_id):
+    """True si las lecturas del restaurante pueden salir del agregado (nunca lanza)."""
+    if not DAILY_STATS_ENABLED or not restaurant_id:
+        return False
+    try:
+        return get_daily_stats().completo(restaurant_id)
+    except Exception as e:
+        logger.error(f"Error consultando reservas_stats_rebuilds de {restaurant_id}: {str(e)}")
+        return False
+
+def asegurar_estadisticas(supabase, restaurant_id, table='reservas_prod'):
+    """
+    Como estadisticas_completas, pero si al restaurante le falta el histórico lo
+    reconstruye una vez (lectura completa de sus reservas). Nunca lanza.
+    """
+    if not DAILY_STATS_ENABLED or not restaurant_id:
+        return False
+    if estadisticas_completas(restaurant_id):
+        return True
+    try:
+        total = reconstruir_estadisticas(supabase, restaurant_id, table)
+        logger.info(f"Agregado diario de {restaurant_id} reconstruido con {total} reservas")
+        return True
+    except Exception as e:
+        logger.error(f"Error reconstruyendo reservas_daily_stats de {restaurant_id}: {str(e)}")
+        return False
+
+def reconstruir_estadisticas(supabase, restaurant_id=None, table='reservas_prod'):
+    """Recalcula el agregado desde reservas_prod (todas las reservas, paginando). Devuelve las reservas contadas."""
+    reservas = []
+    offset = 0
+    while True:
+        query = supabase.table(table).select('id, restaurante_id, fecha, estado, personas')
+        if restaurant_id:
+            query = query.eq('restaurante_id', restaurant_id)
+        page = query.order('id').range(offset, offset + REBUILD_PAGE_SIZE - 1).execute().data or []
+        reservas.extend(page)
+        if len(page) < REBUILD_PAGE_SIZE:
+            break
+        offset += REBUILD_PAGE_SIZE
+    return get_daily_stats().reconstruir(reservas, restaurant_id)
@@ -2,6 +2,7 @@ import os
 import json
 from datetime import datetime, timedelta
 import traceback
+from .daily_stats import registrar_en_estadisticas
 
 def get_supabase_client():
     """
@@ -173,6 +174,7 @@ def actualizar_reserva(data, supabase):
         
         # Verificar si la actualización fue exitosa
         if response.data and len(response.data) > 0:
+            registrar_en_estadisticas(response.data)
             return {
                 "success": True,
                 "message": "Reserva actualizada correctamente",
@@ -276,6 +278,7 @@ def actualizar_estado_reserva(reserva_id, nuevo_estado):
                 response = supabase.table('reservas_prod').update({'estado': nuevo_estado}).eq('id', reserva_id).execute()
                 
                 if response.data and len(response.data) > 0:
+                    registrar_en_estadisticas(response.data)
                     return {"success": True, "message": f"Estado actualizado a {nuevo_estado}"}
                 return {"success": False, "error": "No se pudo actualizar la reserva"}
         except Exception as e:
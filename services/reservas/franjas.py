@@ -0,0 +1,235 @@
+"""
+Disponibilidad por franjas horarias.
+
+Antes la capacidad era un único max_capacity contra la suma de personas de todo
+el día: almuerzo y cena compartían el cupo y en los picos se rechazaban reservas
+que sí entraban. Acá, por restaurante y fecha, se arma un arreglo de personas
+sentadas por franja de RESERVATION_SLOT_MINUTES (15 o 30) minutos:
+
+- Los turnos del día salen de info_json.opening_hours, con los días en castellano
+  (lunes...domingo) o en inglés (monday...sunday) y cualquiera de los formatos
+  existentes: almuerzo_abre / almuerzo_cierra / cena_abre / cena_cierra del bot,
+  open / close / is_closed del editor de ubicación o is_closed + slots[{open, close}]
+  de DEFAULT_RESTAURANT_DATA (routes/admin_routes.py). Un cierre a las 00:00 o
+  antes de la apertura se toma como medianoche.
+- Cada reserva pendiente o confirmada ocupa sus personas desde su hora durante
+  la duración de la reserva (info_json.capacity.reservation_duration_minutes o
+  RESERVATION_DURATION_MINUTES), sin pasar del cierre de su turno.
+- Para cada franja de inicio se precalcula el pico de ocupación de la ventana
+  que usaría una reserva nueva, así "¿entran N personas a las HH:MM?" es una
+  lectura del arreglo.
+
+El arreglo se arma una vez por (restaurante, fecha) con las reservas del día de
+la caché de ocupación (services/reservas/ocupacion.py) y se reutiliza mientras
+no cambie la versión de reservas del restaurante ni su capacidad u horarios.
+"""
+import json
+import logging
+import unicodedata
+
+from config import OCCUPANCY_CACHE_TTL, RESERVATION_SLOT_MINUTES, RESERVATION_DURATION_MINUTES
+from utils.ttl_cache import TTLCache
+from .daily_stats import version_restaurante
+from .ocupacion import reservas_del_dia, resolver_capacidad_total
+
+logger = logging.getLogger(__name__)
+
+DIAS = ('lunes', 'martes', 'miercoles', 'jueves', 'viernes', 'sabado', 'domingo')
+DIAS_EN = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+ESTADOS_QUE_OCUPAN = ('pendiente', 'confirmada')
+MINUTOS_DIA = 24 * 60
+CERRADO = -1
+
+_cache = TTLCache(ttl_seconds=OCCUPANCY_CACHE_TTL, max_entries=2048)
+
+def _sin_acentos(texto):
+    return ''.join(c for c in unicodedata.normalize('NFD', texto) if unicodedata.category(c) != 'Mn')
+
+def hora_a_minutos(hora):
+    """'HH:MM' (o 'HH:MM:SS') -> minutos desde las 00:00, o None si no es una hora válida."""
+    try:
+        horas, minutos = str(hora).strip().split(':')[:2]
+        horas, minutos = int(horas), int(minutos)
+    except (TypeError, ValueError):
+        return None
+    if not (0 <= horas <= 23 and 0 <= minutos <= 59):
+        return None
+    return horas * 60 + minutos
+
+def minutos_a_hora(minutos):
+    return f"{minutos // 60:02d}:{minutos % 60:02d}"
+
+def _opening_hours(restaurant_config):
+    horarios = (restaurant_config.get('info_json') or {}).get('opening_hours') or restaurant_config.get('opening_hours')
+    if isinstance(horarios, str):
+        try:
+            horarios = json.loads(horarios)
+        except ValueError:
+            return None
+    return horarios if isinstance(horarios, dict) else None
+
+def turnos_del_dia(restaurant_config, fecha):
+    """
+    Turnos [(abre, cierra)] en minutos para la fecha (date), según opening_hours.
+    [] si ese día está cerrado; None si el restaurante no tiene horarios cargados para ese día.
+    """
+    horarios = _opening_hours(restaurant_config)
+    if not horarios:
+        return None
+    dias = (DIAS[fecha.weekday()], DIAS_EN[fecha.weekday()])
+    horario = next((valor for clave, valor in horarios.items() if _sin_acentos(str(clave)).lower() in dias), None)
+    if isinstance(horario, str):
+        return [] if horario.strip().lower() == 'cerrado' else None
+    if not isinstance(horario, dict):
+        return None
+    if horario.get('is_closed') is True:
+        return []
+
+    rangos = [(horario.get(abre_key), horario.get(cierra_key)) for abre_key, cierra_key in
+              (('almuerzo_abre', 'almuerzo_cierra'), ('cena_abre', 'cena_cierra'), ('open', 'close'))]
+    slots = horario.get('slots')
+    if isinstance(slots, list):
+        rangos += [(slot.get('open'), slot.get('close')) for slot in slots if isinstance(slot, dict)]
+
+    turnos = []
+    for abre, cierra in rangos:
+        abre, cierra = hora_a_minutos(abre), hora_a_minutos(cierra)
+        if abre is None or cierra is None:
+            continue
+        if cierra <= abre:
+            cierra = MINUTOS_DIA  # cierra a medianoche (o después: la franja termina con el día)
+        turnos.append((abre, cierra))
+    if not turnos:
+        # Solo 'cerrado' (o vacío) en todos los campos
+        valores = [str(v).strip().lower() for k, v in horario.items() if k not in ('nota', 'note', 'slots', 'is_closed')]
+        return [] if valores and all(v in ('cerrado', '') for v in valores) else None
+    return sorted(turnos)
+
+def duracion_reserva(restaurant_config):
+    """Minutos que ocupa una reserva en la mesa."""
+    valor = ((restaurant_config.get('info_json') or {}).get('capacity') or {}).get('reservation_duration_minutes')
+    try:
+        return int(valor) if valor else RESERVATION_DURATION_MINUTES
+    except (TypeError, ValueError):
+        return RESERVATION_DURATION_MINUTES
+
+class FranjasDelDia:
+    """Personas sentadas por franja para un restaurante y una fecha."""
+
+    def __init__(self, turnos, capacidad, reservas, slot_minutes=30, duracion_minutos=120):
+        self.turnos = tuple(turnos)
+        self.capacidad = capacidad
+        self.slot = slot_minutes
+        franjas = MINUTOS_DIA // slot_minutes
+        duracion = max(1, -(-duracion_minutos // slot_minutes))
+
+        # Franja de cierre del turno de cada franja (CERRADO fuera de horario)
+        fin_turno = [CERRADO] * franjas
+        for abre, cierra in self.turnos:
+            fin = -(-cierra // slot_minutes)
+            for franja in range(abre // slot_minutes, fin):
+                fin_turno[franja] = max(fin_turno[franja], fin)
+
+        ocupados = [0] * franjas
+        for hora, personas, estado in reservas:
+            minuto = hora_a_minutos(hora)
+            if minuto is None or estado not in ESTADOS_QUE_OCUPAN or personas <= 0:
+                continue
+            inicio = minuto // slot_minutes
+            fin = min(inicio + duracion, fin_turno[inicio] if fin_turno[inicio] != CERRADO else franjas)
+            for franja in range(inicio, fin):
+                ocupados[franja] += personas
+        self.ocupados = ocupados
+
+        # Pico de ocupación de la ventana de una reserva nueva que empieza en cada franja
+        self._pico = [CERRADO] * franjas
+        for franja, fin in enumerate(fin_turno):
+            if fin != CERRADO:
+                self._pico[franja] = max(ocupados[franja:min(franja + duracion, fin)])
+
+    def libres(self, minuto):
+        """Lugares libres para una reserva que empieza a esa hora (minutos), o None si está fuera de horario."""
+        pico = self._pico[minuto // self.slot]
+        return None if pico == CERRADO else self.capacidad - pico
+
+    def puede_sentar(self, personas, minuto):
+        libres = self.libres(minuto)
+        return libres is not None and personas <= libres
+
+    def max_libres(self):
+        """Mayor cantidad de lugares libres en algún horario del día (0 si está cerrado)."""
+        picos = [pico for pico in self._pico if pico != CERRADO]
+        return self.capacidad - min(picos) if picos else 0
+
+    def sugerencias(self, personas, minuto, limite=3, desde=None):
+        """
+        Horarios (minutos, en orden de cercanía) más próximos a `minuto` donde entran `personas`.
+        `desde` (minutos) descarta las franjas que empiezan antes, p. ej. la hora actual si la fecha es hoy.
+        """
+        origen = minuto // self.slot
+        primera = 0 if desde is None else -(-desde // self.slot)
+        encontrados = []
+        for distancia in range(1, len(self._pico)):
+            for franja in (origen - distancia, origen + distancia):
+                if primera <= franja < len(self._pico) and self._pico[franja] != CERRADO \
+                        and personas <= self.capacidad - self._pico[franja]:
+                    encontrados.append(franja * self.slot)
+            if len(encontrados) >= limite:
+                break
+        return encontrados[:limite]
+
+def formatear_turnos(turnos):
+    return ' y '.join(f"{minutos_a_hora(abre)} a {minutos_a_hora(cierra % MINUTOS_DIA)}" for abre, cierra in turnos)
+
+def formatear_horarios(minutos):
+    horas = [minutos_a_hora(m) for m in minutos]
+    return horas[0] if len(horas) == 1 else f"{', '.join(horas[:-1])} o {horas[-1]}"
+
+def obtener_franjas(supabase, restaurant_config, fecha):
+    """
+    FranjasDelDia del restaurante para la fecha (date), o None si no tiene horarios
+    cargados para ese día (los llamadores vuelven al chequeo por día completo).
+    """
+    turnos = turnos_del_dia(restaurant_config, fecha)
+    if turnos is None:
+        return None
+    restaurant_id = restaurant_config.get('id')
+    capacidad, origen = resolver_capacidad_total(restaurant_config)
+    duracion = duracion_reserva(restaurant_config)
+    key = (str(restaurant_id), fecha.isoformat())
+    version = version_restaurante(restaurant_id)
+    signature = (version, capacidad, tuple(turnos), RESERVATION_SLOT_MINUTES, duracion)
+    if version is not None:
+        franjas = _cache.get(key, signature)
+        if franjas is not None:
+            return franjas
+
+    reservas = reservas_del_dia(supabase, restaurant_id, fecha.isoformat()) if turnos else ()
+    franjas = FranjasDelDia(turnos, capacidad, reservas, RESERVATION_SLOT_MINUTES, duracion)
+    logger.info(f"Franjas R:{restaurant_id} {fecha.isoformat()}: turnos {formatear_turnos(turnos) or 'cerrado'}, "
+                f"capacidad {capacidad} (desde {origen}), {duracion} min por reserva")
+    if version is not None:
+        _cache.set(key, franjas, signature)
+    return franjas
+
+def validar_horario(restaurant_config, fecha, hora_str):
+    """
+    (es_valido, mensaje_error) de que el restaurante reciba reservas a esa hora, según sus turnos.
+    None si el restaurante no tiene horarios cargados para ese día.
+    """
+    turnos = turnos_del_dia(restaurant_config, fecha)
+    if turnos is None:
+        return None
+    restaurant_name = restaurant_config.get('nombre_restaurante', 'el restaurante')
+    if not turnos:
+        return False, f"Ese día {restaurant_name} está cerrado. Por favor elige otra fecha."
+    minuto = hora_a_minutos(hora_str)
+    if minuto is None:
+        return False, "La hora proporcionada no es válida. Por favor usa el formato HH:MM."
+    if any(abre <= minuto < cierra for abre, cierra in turnos):
+        return True, ""
+    return False, (f"Ese día {restaurant_name} recibe reservas de {formatear_turnos(turnos)}. "
+                   f"Por favor elige un horario dentro de este rango.")
+
+def get_franjas_cache_stats():
+    return dict(_cache.stats, entries=len(_cache))
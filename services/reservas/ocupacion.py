@@ -0,0 +1,125 @@
+"""
+Ocupación (personas reservadas) por restaurante y fecha, para los chequeos de capacidad.
+
+verificar_capacidad_disponible se llama al menos dos veces por reserva del bot
+(validar_disponibilidad y el paso de personas de WhatsApp), y antes cada
+llamada traía todas las reservas del día para sumar `personas` en Python.
+Acá se cachean, por (restaurante, fecha), las reservas del día reducidas a
+(hora, personas, estado) (una consulta proyectada solo ante un miss), así cada
+llamador suma los estados que cuentan para él y el motor de franjas horarias
+(services/reservas/franjas.py) ubica cada reserva en su turno. El chequeo por
+día completo (restaurantes sin turnos cargados) lee directamente el agregado
+diario cuando está completo, sin tocar Supabase.
+
+La firma de cada entrada es la versión de reservas del restaurante
+(services/reservas/daily_stats): cualquier alta o cambio de reserva, en
+cualquier worker, hace que la próxima consulta vuelva a leer Supabase.
+OCCUPANCY_CACHE_TTL acota además los desvíos por ediciones hechas fuera de la app.
+"""
+import logging
+from collections import Counter
+
+from config import OCCUPANCY_CACHE_TTL
+from utils.ttl_cache import TTLCache
+from .daily_stats import normalizar_estado, version_restaurante, estadisticas_completas, obtener_resumen_diario
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CAPACITY = 100
+
+_cache = TTLCache(ttl_seconds=OCCUPANCY_CACHE_TTL, max_entries=2048)
+
+def resolver_capacidad_total(restaurant_config):
+    """
+    Capacidad total del restaurante y de dónde salió:
+    (capacidad, 'info_json.capacity.max_capacity' | ... | 'default').
+    Los valores 0 o negativos se saltean como si no estuvieran cargados
+    (DEFAULT_RESTAURANT_DATA trae max_capacity 0).
+    """
+    candidatos = (
+        ('info_json.capacity.max_capacity', (restaurant_config.get('info_json') or {}).get('capacity', {}), 'max_capacity'),
+        ('info_json.capacity.total', (restaurant_config.get('info_json') or {}).get('capacity', {}), 'total'),
+        ('config.capacity.max_capacity', (restaurant_config.get('config') or {}).get('capacity', {}), 'max_capacity'),
+        ('capacity.max_capacity', restaurant_config.get('capacity') or {}, 'max_capacity'),
+    )
+    for origen, seccion, clave in candidatos:
+        valor = (seccion or {}).get(clave)
+        if valor is None or valor == '':
+            continue
+        try:
+            capacidad = int(valor)
+        except (TypeError, ValueError):
+            logger.warning(f"Capacidad inválida en {origen} para R:{restaurant_config.get('id')}: {valor!r}")
+            continue
+        if capacidad > 0:
+            return capacidad, origen
+    return DEFAULT_CAPACITY, 'default'
+
+def reservas_del_dia(supabase, restaurant_id, fecha_iso):
+    """Tupla de (hora, personas, estado normalizado) de las reservas del restaurante en la fecha (ISO)."""
+    key = (str(restaurant_id), fecha_iso)
+    # La versión se lee antes de consultar: una escritura concurrente deja la entrada ya desactualizada
+    signature = version_restaurante(restaurant_id)
+    if signature is not None:
+        cached = _cache.get(key, signature)
+        if cached is not None:
+            return cached
+
+    response = (supabase.table('reservas_prod')
+        .select('hora, personas, estado')
+        .eq('fecha', fecha_iso)
+        .eq('restaurante_id', restaurant_id)
+        .execute())
+    reservas = []
+    for reserva in response.data or []:
+        try:
+            personas = int(reserva.get('personas') or 0)
+        except (TypeError, ValueError):
+            continue
+        reservas.append((str(reserva.get('hora') or ''), personas, normalizar_estado(reserva.get('estado'))))
+    reservas = tuple(reservas)
+    if signature is not None:
+        _cache.set(key, reservas, signature)
+    return reservas
+
+def personas_por_estado(supabase, restaurant_id, fecha_iso):
+    """
+    {estado normalizado: personas} de las reservas del restaurante en la fecha (ISO).
+    Sale del agregado diario (una fila por estado) si está completo para el restaurante.
+    """
+    if estadisticas_completas(restaurant_id):
+        dia = obtener_resumen_diario(restaurant_id, fecha_iso, fecha_iso).get(fecha_iso)
+        return {estado: totales['personas'] for estado, totales in (dia or {}).get('por_estado', {}).items()}
+    totales = Counter()
+    for _, personas, estado in reservas_del_dia(supabase, restaurant_id, fecha_iso):
+        totales[estado] += personas
+    return dict(totales)
+
+def obtener_ocupacion(supabase, restaurant_config, fecha_iso, estados=None):
+    """
+    Ocupación del día para los chequeos de capacidad:
+    {'capacidad_total', 'origen_capacidad', 'personas_reservadas', 'capacidad_disponible'}.
+    `estados` (normalizados, ej. ('confirmada',)) limita qué reservas ocupan lugar; None = todas.
+    """
+    restaurant_id = restaurant_config.get('id')
+    capacidad_total, origen = resolver_capacidad_total(restaurant_config)
+    por_estado = personas_por_estado(supabase, restaurant_id, fecha_iso)
+    reservadas = sum(personas for estado, personas in por_estado.items() if estados is None or estado in estados)
+    ocupacion = {
+        'capacidad_total': capacidad_total,
+        'origen_capacidad': origen,
+        'personas_reservadas': reservadas,
+        'capacidad_disponible': capacidad_total - reservadas
+    }
+    logger.info(f"Capacidad R:{restaurant_id} {fecha_iso}: {reservadas}/{capacidad_total} personas "
+                f"(capacidad desde {origen})")
+    return ocupacion
+
+def invalidar_ocupacion(restaurant_id=None):
+    """Descarta la ocupación cacheada del restaurante (o de todos) en este proceso."""
+    if restaurant_id is None:
+        return _cache.clear()
+    return _cache.invalidate_where(lambda key, value: key[0] == str(restaurant_id))
+
+def get_occupancy_cache_stats():
+    return dict(_cache.stats, entries=len(_cache))
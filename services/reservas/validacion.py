@@ -221,21 +221,33 @@ def validar_reserva(datos_reserva):
         print(f"Error en validación de reserva: {str(e)}")
         return False, f"Error al validar la reserva: {str(e)}"
     
-async def verificar_capacidad_disponible(fecha_str: str, personas: int, restaurant_config: dict):
+async def verificar_capacidad_disponible(fecha_str: str, personas: int, restaurant_config: dict, hora_str: str = None):
     """
     Verifica si hay capacidad disponible para la fecha y cantidad de personas solicitada.
-    Implementa fallbacks múltiples para obtener la configuración de capacidad.
+    Implementa fallbacks múltiples para obtener la configuración de capacidad
+    (ver resolver_capacidad_total).
+
+    Si el restaurante tiene opening_hours para ese día, la capacidad se cuenta por
+    franja horaria (services/reservas/franjas.py): con hora, en la ventana de esa
+    reserva, y sin hora, en el mejor horario del día. Si no, se cuentan las
+    reservas pendientes y confirmadas del día completo (services/reservas/ocupacion.py),
+    los mismos estados que ocupan lugar en las franjas.
     
     Args:
         fecha_str: Fecha en formato DD/MM/YYYY
         personas: Número de personas
         restaurant_config: Configuración del restaurante
+        hora_str: Hora en formato HH:MM (opcional)
         
     Returns:
         tuple (bool, str, int): (hay_capacidad, mensaje_error, capacidad_disponible)
     """
     try:
         from services.db.supabase import get_supabase_client
+        from services.reservas.ocupacion import obtener_ocupacion
+        from services.reservas.franjas import (
+            obtener_franjas, hora_a_minutos, minutos_a_hora, formatear_horarios, ESTADOS_QUE_OCUPAN
+        )
         
         restaurant_id = restaurant_config.get('id')
         restaurant_name = restaurant_config.get('nombre_restaurante', 'el restaurante')
@@ -253,27 +265,44 @@ async def verificar_capacidad_disponible(fecha_str: str, personas: int, restaura
             print(f"Error al verificar capacidad: Supabase client no disponible para R:{restaurant_id}")
             return True, "", 100  # Fallback para no bloquear el sistema
 
-        # Consultar reservas confirmadas para esa fecha y restaurante  
-        response = supabase.table("reservas_prod").select("personas").eq("fecha", fecha_iso).eq("restaurante_id", restaurant_id).eq("estado", "Confirmada").execute()
-        
-        # Calcular personas ya reservadas para esa fecha
-        reservas_existentes = response.data
-        personas_ya_reservadas = sum(r.get('personas', 0) for r in reservas_existentes)
-        
-        # Obtener la capacidad total del restaurante con fallbacks múltiples
-        # Intentar obtener de info_json primero, luego de config como fallback
-        capacidad_total = (restaurant_config.get('info_json', {}).get('capacity', {}).get('max_capacity') or
-                          restaurant_config.get('config', {}).get('capacity', {}).get('max_capacity') or  
-                          restaurant_config.get('capacity', {}).get('max_capacity'))
+        franjas = obtener_franjas(supabase, restaurant_config, fecha_obj)
+        minuto = hora_a_minutos(hora_str) if hora_str else None
+        if franjas is not None and not franjas.turnos:
+            return False, f"Lo siento, ese día {restaurant_name} está cerrado. ¿Te gustaría elegir otra fecha?", 0
+        if franjas is not None and minuto is not None:
+            capacidad_disponible = franjas.libres(minuto)
+            if capacidad_disponible is not None and personas <= capacidad_disponible:
+                return True, "", capacidad_disponible
+            # Si la reserva es para hoy, no sugerir horarios que ya pasaron
+            ahora = datetime.now()
+            desde = ahora.hour * 60 + ahora.minute if fecha_obj == ahora.date() else None
+            alternativas = franjas.sugerencias(personas, minuto, desde=desde)
+            if capacidad_disponible is None:
+                mensaje = f"Lo siento, a las {minutos_a_hora(minuto)} {restaurant_name} no recibe reservas."
+                capacidad_disponible = 0
+            else:
+                mensaje = f"Lo siento, a las {minutos_a_hora(minuto)} en {restaurant_name} solo tenemos lugar para {max(capacidad_disponible, 0)} personas más."
+            if alternativas:
+                mensaje += f" Para {personas} personas tenemos lugar a las {formatear_horarios(alternativas)}. ¿Te sirve alguno de esos horarios u otra fecha?"
+            else:
+                mensaje += " ¿Deseas modificar la cantidad de personas o elegir otra fecha?"
+            return False, mensaje, max(capacidad_disponible, 0)
+        if franjas is not None:
+            capacidad_disponible = franjas.max_libres()
+            if personas > capacidad_disponible:
+                return False, f"Lo siento, para esa fecha en {restaurant_name} solo tenemos capacidad para {capacidad_disponible} personas más. ¿Deseas modificar la cantidad de personas o elegir otra fecha?", capacidad_disponible
+            return True, "", capacidad_disponible
+
+        # Sin horarios cargados: personas en reservas pendientes o confirmadas para esa fecha
+        # (caché por restaurante y fecha); las pendientes de la web también ocupan lugar
+        ocupacion = obtener_ocupacion(supabase, restaurant_config, fecha_iso, estados=ESTADOS_QUE_OCUPAN)
 
-        if capacidad_total is None:
+        if ocupacion['origen_capacidad'] == 'default':
             print(f"Error: No se encontró la configuración de capacidad (max_capacity) para R:{restaurant_id}")
             print(f"restaurant_config disponible: {list(restaurant_config.keys())}")
-            # Fallback con valor por defecto
-            capacidad_total = 100
-            print(f"Usando capacidad por defecto: {capacidad_total}")
+            print(f"Usando capacidad por defecto: {ocupacion['capacidad_total']}")
 
-        capacidad_disponible = capacidad_total - personas_ya_reservadas
+        capacidad_disponible = ocupacion['capacidad_disponible']
         
         # Verificar si hay capacidad suficiente
         if personas > capacidad_disponible:
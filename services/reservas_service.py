@@ -5,6 +5,7 @@ from services.reservas.core import registrar_reserva as _registrar_reserva
 from services.reservas.validacion import (
     validar_reserva, validar_paso_reserva, verificar_capacidad_disponible as _verificar_capacidad_disponible
 )
+from services.reservas.franjas import validar_horario
 
 def registrar_reserva(data, supabase=None):
     """
@@ -35,6 +36,8 @@ def actualizar_estado_reserva(reserva_id, nuevo_estado):
 def validar_disponibilidad_horaria(fecha_str, hora_str, restaurant_config):
     """
     Valida si el horario de la reserva está dentro de los horarios de atención.
+    Usa los turnos de info_json.opening_hours del restaurante para ese día; si no
+    están cargados, los horarios generales de validar_paso_reserva.
     
     Args:
         fecha_str: Fecha en formato DD/MM/YYYY
@@ -50,13 +53,19 @@ def validar_disponibilidad_horaria(fecha_str, hora_str, restaurant_config):
         valida_fecha, msg_fecha = validar_paso_reserva('fecha', fecha_str, fecha_actual)
         if not valida_fecha:
             return False, msg_fecha
+
+        # Validar hora contra los turnos del restaurante
+        fecha_obj = datetime.strptime(fecha_str, '%d/%m/%Y').date() if '/' in fecha_str else datetime.strptime(fecha_str, '%Y-%m-%d').date()
+        resultado = validar_horario(restaurant_config, fecha_obj, hora_str)
+        if resultado is not None:
+            return resultado
             
         # Validar hora
         return validar_paso_reserva('hora', hora_str, fecha_actual)
     except Exception as e:
         return False, f"Error al validar disponibilidad: {str(e)}"
 
-async def verificar_capacidad_disponible(fecha_str, personas, restaurant_config):
+async def verificar_capacidad_disponible(fecha_str, personas, restaurant_config, hora_str=None):
     """
     Verifica si hay capacidad disponible para la fecha y cantidad de personas.
     
@@ -64,8 +73,9 @@ async def verificar_capacidad_disponible(fecha_str, personas, restaurant_config)
         fecha_str: Fecha en formato DD/MM/YYYY
         personas: Número de personas
         restaurant_config: Configuración del restaurante
+        hora_str: Hora en formato HH:MM (opcional; con hora se verifica esa franja)
         
     Returns:
         tuple (bool, str, int): (hay_capacidad, mensaje_error, capacidad_disponible)
     """
-    return await _verificar_capacidad_disponible(fecha_str, personas, restaurant_config)
\ No newline at end of file
+    return await _verificar_capacidad_disponible(fecha_str, personas, restaurant_config, hora_str)
\ No newline at end of file
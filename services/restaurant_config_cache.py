@@ -0,0 +1,106 @@
+"""
+Caché de la configuración de restaurantes usada por el webhook de WhatsApp.
+
+Guarda, por número de Twilio 'To' normalizado, el restaurant_config ya armado
+(fila de Supabase + menu_json/info_json locales + credenciales). Se invalida:
+- por TTL (RESTAURANT_CONFIG_CACHE_TTL), para cambios hechos directamente en Supabase;
+- por cambio de mtime de data/menus/<id>_menu.json o data/info/<id>_info.json,
+  lo que cubre ediciones hechas desde otro worker;
+- explícitamente con invalidate_restaurant_config() al guardar desde los editores del admin.
+"""
+import copy
+import json
+import logging
+import os
+
+from config import RESTAURANT_CONFIG_CACHE_TTL
+from utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+_cache = TTLCache(ttl_seconds=RESTAURANT_CONFIG_CACHE_TTL, max_entries=512)
+
+def normalize_twilio_number(twilio_number):
+    """'whatsapp:+1415...' -> '+1415...'"""
+    normalized = (twilio_number or '').strip()
+    if normalized.startswith('whatsapp:'):
+        normalized = normalized.split('whatsapp:')[1].strip()
+    return normalized
+
+def get_menu_file_path(restaurant_id):
+    return os.path.join(os.getcwd(), 'data', 'menus', f"{restaurant_id}_menu.json")
+
+def get_info_file_path(restaurant_id):
+    return os.path.join(os.getcwd(), 'data', 'info', f"{restaurant_id}_info.json")
+
+def _files_signature(restaurant_id):
+    signature = []
+    for path in (get_menu_file_path(restaurant_id), get_info_file_path(restaurant_id)):
+        try:
+            signature.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+def attach_local_restaurant_files(restaurant_data):
+    """Agrega menu_json e info_json desde los archivos locales del restaurante, si existen."""
+    restaurant_id = restaurant_data.get('id')
+    if not restaurant_id:
+        return restaurant_data
+    try:
+        menu_file = get_menu_file_path(restaurant_id)
+        if os.path.exists(menu_file):
+            with open(menu_file, 'r', encoding='utf-8') as f:
+                restaurant_data['menu_json'] = json.load(f)
+
+        info_file = get_info_file_path(restaurant_id)
+        if os.path.exists(info_file):
+            with open(info_file, 'r', encoding='utf-8') as f:
+                restaurant_data['info_json'] = json.load(f)
+    except Exception as e:
+        logger.warning(f"Error cargando archivos JSON: {str(e)}")
+    return restaurant_data
+
+def get_cached_restaurant_config(cache_key):
+    """
+    Devuelve una copia del restaurant_config cacheado para la clave (número 'To'
+    normalizado), o None si no está o quedó desactualizado.
+    """
+    entry = _cache.get(cache_key)
+    if entry is None:
+        return None
+    restaurant_id, signature, restaurant_config = entry
+    if restaurant_id and _files_signature(restaurant_id) != signature:
+        _cache.invalidate(cache_key)
+        logger.info(f"Caché de configuración invalidada por cambios en archivos de {restaurant_id}")
+        return None
+    # Los handlers modifican el dict (sesión, menú, etc.): nunca entregar el objeto cacheado
+    return copy.deepcopy(restaurant_config)
+
+def cache_restaurant_config(cache_key, restaurant_config):
+    restaurant_id = restaurant_config.get('id')
+    signature = _files_signature(restaurant_id) if restaurant_id else None
+    _cache.set(cache_key, (restaurant_id, signature, copy.deepcopy(restaurant_config)))
+
+def cache_restaurant_config_miss(cache_key):
+    """Recuerda que un número no tiene restaurante asignado, para no repetir la búsqueda en cada mensaje."""
+    _cache.set(f"miss:{cache_key}", True)
+
+def is_restaurant_config_miss(cache_key):
+    return _cache.get(f"miss:{cache_key}") is not None
+
+def invalidate_restaurant_config(restaurant_id=None):
+    """Elimina de la caché las configuraciones del restaurante indicado (o todas si es None)."""
+    if restaurant_id is None:
+        count = _cache.clear()
+    else:
+        # Los "no encontrado" también se descartan: el cambio pudo asignarle un número al restaurante
+        count = _cache.invalidate_where(
+            lambda key, entry: key.startswith('miss:') or str(entry[0]) == str(restaurant_id)
+        )
+    if count:
+        logger.info(f"Caché de configuración invalidada para {restaurant_id or 'todos los restaurantes'} ({count} entradas)")
+    return count
+
+def get_cache_stats():
+    return dict(_cache.stats, entries=len(_cache))
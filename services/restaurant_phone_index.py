@@ -0,0 +1,125 @@
+"""
+Índice en memoria de números de WhatsApp de contacto -> restaurant_id.
+
+El webhook necesita resolver el número 'To' contra info_json.contact.whatsapp
+cuando no coincide con config.twilio_phone_number. En lugar de traer todos los
+restaurantes activos y normalizar cada número en cada mensaje, el índice se arma
+al iniciar la app y se refresca en segundo plano cada
+RESTAURANT_PHONE_INDEX_REFRESH_SECONDS (y al guardar la información del restaurante
+desde el admin). La clave son los últimos 10 dígitos. Si el armado inicial falló, el
+webhook lo reintenta con ensure_phone_index(): una sola construcción a la vez, como
+mucho cada BUILD_RETRY_SECONDS, y mientras tanto no cachea el "no encontrado".
+"""
+import logging
+import re
+import threading
+import time
+
+from config import RESTAURANT_PHONE_INDEX_REFRESH_SECONDS
+
+logger = logging.getLogger(__name__)
+
+_index = {}
+_index_lock = threading.Lock()
+_refresher_thread = None
+_last_refresh = None
+_build_lock = threading.Lock()
+_last_build_attempt = 0.0
+
+# Espera mínima entre intentos de armar el índice cuando todavía no está listo
+BUILD_RETRY_SECONDS = 30
+
+def phone_index_key(phone_number):
+    """Últimos 10 dígitos del número, ignorando prefijos y separadores."""
+    return re.sub(r'\D', '', phone_number or '')[-10:]
+
+def refresh_phone_index(supabase_client=None):
+    """Reconstruye el índice con una sola consulta a los restaurantes activos."""
+    global _index, _last_refresh
+    if supabase_client is None:
+        from services.db.supabase import get_supabase_client
+        supabase_client = get_supabase_client()
+    if not supabase_client:
+        logger.warning("No se puede refrescar el índice de teléfonos: cliente Supabase no disponible")
+        return False
+
+    response = supabase_client.table('restaurantes') \
+        .select('id, info_json') \
+        .eq('estado', 'activo') \
+        .execute()
+
+    new_index = {}
+    for restaurant in response.data or []:
+        contact = (restaurant.get('info_json') or {}).get('contact') or {}
+        key = phone_index_key(contact.get('whatsapp', ''))
+        if not key:
+            continue
+        if key in new_index and new_index[key] != restaurant['id']:
+            # Se conserva el primero, igual que el recorrido lineal anterior
+            logger.warning(f"Número de WhatsApp {key} repetido en restaurantes {new_index[key]} y {restaurant['id']}")
+            continue
+        new_index[key] = restaurant['id']
+
+    with _index_lock:
+        _index = new_index
+        _last_refresh = time.time()
+    logger.info(f"Índice de teléfonos de restaurantes actualizado: {len(new_index)} números")
+    return True
+
+def lookup_restaurant_id_by_whatsapp(phone_number):
+    """Devuelve el restaurant_id cuyo WhatsApp de contacto coincide (O(1)), o None."""
+    key = phone_index_key(phone_number)
+    if not key:
+        return None
+    with _index_lock:
+        return _index.get(key)
+
+def is_phone_index_ready():
+    """True si el índice se armó al menos una vez (un miss en el índice es un miss real)."""
+    return _last_refresh is not None
+
+def ensure_phone_index(supabase_client=None):
+    """
+    True si el índice está listo. Si no, lo arma una sola vez (los demás hilos esperan
+    ese armado en lugar de lanzar el suyo) y como mucho cada BUILD_RETRY_SECONDS.
+    """
+    global _last_build_attempt
+    if is_phone_index_ready():
+        return True
+    with _build_lock:
+        if is_phone_index_ready():
+            return True
+        if time.time() - _last_build_attempt < BUILD_RETRY_SECONDS:
+            return False
+        _last_build_attempt = time.time()
+        try:
+            refresh_phone_index(supabase_client)
+        except Exception as e:
+            logger.error(f"Error al construir el índice de teléfonos de restaurantes: {str(e)}")
+    return is_phone_index_ready()
+
+def start_phone_index_refresher(interval_seconds=RESTAURANT_PHONE_INDEX_REFRESH_SECONDS):
+    """Arma el índice (bloqueante, una vez) y lanza el hilo que lo refresca periódicamente."""
+    global _refresher_thread
+    if _refresher_thread is not None and _refresher_thread.is_alive():
+        return _refresher_thread
+
+    try:
+        refresh_phone_index()
+    except Exception as e:
+        logger.error(f"Error al construir el índice de teléfonos de restaurantes: {str(e)}")
+
+    if interval_seconds <= 0:
+        return None
+
+    def refresher_loop():
+        stop = threading.Event()
+        while not stop.wait(interval_seconds):
+            try:
+                refresh_phone_index()
+            except Exception as e:
+                logger.error(f"Error al refrescar el índice de teléfonos de restaurantes: {str(e)}")
+
+    _refresher_thread = threading.Thread(target=refresher_loop, name='restaurant-phone-index', daemon=True)
+    _refresher_thread.start()
+    return _refresher_thread
@@ -0,0 +1,91 @@
+"""
+Registro de clientes REST de Twilio reutilizables, uno por Account SID.
+
+Crear un `Client` por mensaje abre una sesión HTTP nueva (y un handshake TLS)
+en cada envío. Aquí cada cuenta tiene un cliente de larga vida con una sesión
+de `requests` y un pool de conexiones keep-alive que comparten todos los hilos
+del proceso. Si cambia el Auth Token de una cuenta (rotación de credenciales)
+el cliente se reconstruye en la siguiente llamada.
+
+Los reintentos automáticos se limitan a errores de conexión (el request todavía
+no llegó a Twilio), así un POST de mensaje nunca se envía dos veces.
+"""
+import hashlib
+import logging
+import threading
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from twilio.rest import Client
+from twilio.http.http_client import TwilioHttpClient
+
+from config import TWILIO_HTTP_POOL_SIZE, TWILIO_HTTP_MAX_RETRIES, TWILIO_HTTP_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+_clients = {}  # account_sid -> (huella del token, Client)
+_clients_lock = threading.Lock()
+
+def _token_fingerprint(auth_token):
+    return hashlib.sha256(auth_token.encode('utf-8')).hexdigest()
+
+def _build_http_client():
+    """TwilioHttpClient con una sesión keep-alive y un pool de conexiones dimensionado para los hilos del proceso."""
+    http_client = TwilioHttpClient(pool_connections=True, timeout=TWILIO_HTTP_TIMEOUT)
+    retries = Retry(
+        total=TWILIO_HTTP_MAX_RETRIES,
+        connect=TWILIO_HTTP_MAX_RETRIES,
+        read=0,
+        backoff_factor=0.3,
+        status_forcelist=(429, 500, 502, 503, 504),  # solo aplica a métodos idempotentes (GET)
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(
+        pool_connections=TWILIO_HTTP_POOL_SIZE,
+        pool_maxsize=TWILIO_HTTP_POOL_SIZE,
+        max_retries=retries
+    )
+    http_client.session.mount('https://', adapter)
+    return http_client
+
+def _close_client(client):
+    try:
+        session = getattr(client.http_client, 'session', None)
+        if session is not None:
+            session.close()
+    except Exception as e:
+        logger.debug(f"Error cerrando sesión HTTP de Twilio: {str(e)}")
+
+def get_twilio_client(account_sid, auth_token):
+    """
+    Devuelve el cliente compartido para la cuenta, creándolo (o reconstruyéndolo
+    si cambió el token) cuando hace falta. Es seguro llamarlo desde varios hilos.
+    """
+    if not account_sid or not auth_token:
+        raise ValueError("Faltan credenciales de Twilio (Account SID / Auth Token)")
+
+    fingerprint = _token_fingerprint(auth_token)
+    entry = _clients.get(account_sid)
+    if entry and entry[0] == fingerprint:
+        return entry[1]
+
+    with _clients_lock:
+        entry = _clients.get(account_sid)
+        if entry and entry[0] == fingerprint:
+            return entry[1]
+        if entry:
+            logger.info(f"Credenciales de Twilio rotadas para la cuenta {account_sid[:8]}..., reconstruyendo cliente")
+            _close_client(entry[1])
+        client = Client(account_sid, auth_token, http_client=_build_http_client())
+        _clients[account_sid] = (fingerprint, client)
+        logger.info(f"Cliente de Twilio creado para la cuenta {account_sid[:8]}... (pool de {TWILIO_HTTP_POOL_SIZE} conexiones)")
+        return client
+
+def reset_twilio_clients(account_sid=None):
+    """Descarta los clientes en caché (todos o solo el de una cuenta)."""
+    with _clients_lock:
+        sids = [account_sid] if account_sid else list(_clients.keys())
+        for sid in sids:
+            entry = _clients.pop(sid, None)
+            if entry:
+                _close_client(entry[1])
@@ -0,0 +1,285 @@
+"""
+Despachador central de mensajes salientes de WhatsApp.
+
+Todo envío a la API de Twilio (respuestas del bot, recordatorios, confirmaciones,
+pedidos de feedback) pasa por acá en lugar de llamar a messages.create
+directamente:
+
+- Un token bucket por número de origen ('From'), para no superar el throughput
+  que Twilio admite por número aunque haya una ráfaga de recordatorios.
+- Carriles por prioridad: las respuestas interactivas salen antes que las
+  notificaciones y estas antes que los envíos masivos.
+- Reintentos con backoff exponencial (y jitter) ante 429 y errores 5xx.
+- Métricas de profundidad de cola y latencia de envío (ver get_stats()).
+
+El que llama sigue siendo síncrono: `send()` bloquea hasta que el mensaje sale
+(o falla definitivamente) y devuelve lo mismo que la llamada original, así que
+los manejos de errores existentes no cambian.
+"""
+import atexit
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from config import (
+    OUTBOUND_DISPATCHER_ENABLED, OUTBOUND_WORKERS, OUTBOUND_RATE_PER_SECOND,
+    OUTBOUND_MAX_RETRIES, OUTBOUND_BACKOFF_SECONDS, OUTBOUND_BACKOFF_MAX_SECONDS
+)
+from utils.rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0  # respuestas a un mensaje del cliente
+PRIORITY_NORMAL = 1       # confirmaciones, feedback y otros envíos programados
+PRIORITY_BULK = 2         # recordatorios masivos
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: 'interactive', PRIORITY_NORMAL: 'normal', PRIORITY_BULK: 'bulk'}
+
+LATENCY_SAMPLES = 1000
+
+def is_retryable_error(error):
+    """429 (límite de tasa) y 5xx de Twilio se reintentan; el resto de los errores no."""
+    status = getattr(error, 'status', None)
+    try:
+        status = int(status)
+    except (TypeError, ValueError):
+        return False
+    return status == 429 or 500 <= status < 600
+
+class _Job:
+    __slots__ = ('from_number', 'func', 'priority', 'future', 'enqueued_at', 'attempts')
+
+    def __init__(self, from_number, func, priority):
+        self.from_number = from_number
+        self.func = func
+        self.priority = priority
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+
+class _Sender:
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.lanes = {priority: deque() for priority in PRIORITY_NAMES}
+
+    def pending(self):
+        return sum(len(lane) for lane in self.lanes.values())
+
+    def pop(self):
+        for priority in sorted(self.lanes):
+            if self.lanes[priority]:
+                return self.lanes[priority].popleft()
+        return None
+
+class OutboundDispatcher:
+    def __init__(self, workers=8, rate_per_second=5, burst=None, max_retries=3,
+                 backoff_seconds=1.0, backoff_max_seconds=30.0, name='outbound'):
+        self.name = name
+        self.rate = float(rate_per_second or 0)
+        self.burst = burst
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_seconds = backoff_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self._lock = threading.Lock()
+        self._work = threading.Condition(self._lock)   # despierta al planificador
+        self._ready = threading.Condition(self._lock)  # despierta a los hilos de envío
+        self._senders = {}
+        self._ready_heap = []
+        self._retry_heap = []
+        self._seq = itertools.count()
+        self._closed = False
+        self.stats = {'submitted': 0, 'sent': 0, 'failed': 0, 'retried': 0, 'rate_limited_by_twilio': 0}
+        self._latencies = {priority: deque(maxlen=LATENCY_SAMPLES) for priority in PRIORITY_NAMES}
+        self._queue_waits = {priority: deque(maxlen=LATENCY_SAMPLES) for priority in PRIORITY_NAMES}
+        self._scheduler = threading.Thread(target=self._schedule, name=f'{name}-scheduler', daemon=True)
+        self._scheduler.start()
+        self._workers = [
+            threading.Thread(target=self._work_loop, name=f'{name}-{i}', daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, from_number, func, priority=PRIORITY_INTERACTIVE):
+        """Encola func() (la llamada a Twilio) para el número de origen dado. Devuelve un Future."""
+        job = _Job(from_number or '', func, priority if priority in PRIORITY_NAMES else PRIORITY_NORMAL)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(f"El despachador {self.name} está cerrado")
+            self._sender(job.from_number).lanes[job.priority].append(job)
+            self.stats['submitted'] += 1
+            self._work.notify()
+        return job.future
+
+    def send(self, from_number, func, priority=PRIORITY_INTERACTIVE, timeout=None):
+        """Como submit(), pero espera el resultado (o relanza el error final)."""
+        return self.submit(from_number, func, priority).result(timeout)
+
+    def _sender(self, from_number):
+        sender = self._senders.get(from_number)
+        if sender is None:
+            bucket = TokenBucket(self.rate, self.burst) if self.rate > 0 else None
+            sender = self._senders[from_number] = _Sender(bucket)
+        return sender
+
+    def _schedule(self):
+        """Libera trabajos a los hilos de envío a medida que cada número de origen tiene tokens."""
+        with self._lock:
+            while not self._closed:
+                now = time.monotonic()
+                while self._retry_heap and self._retry_heap[0][0] <= now:
+                    _, _, job = heapq.heappop(self._retry_heap)
+                    self._sender(job.from_number).lanes[job.priority].appendleft(job)
+
+                wait = None
+                for sender in self._senders.values():
+                    while sender.pending():
+                        delay = sender.bucket.try_acquire() if sender.bucket else 0.0
+                        if delay > 0:
+                            wait = delay if wait is None else min(wait, delay)
+                            break
+                        job = sender.pop()
+                        heapq.heappush(self._ready_heap, (job.priority, next(self._seq), job))
+                        self._ready.notify()
+
+                if self._retry_heap:
+                    retry_in = max(0.0, self._retry_heap[0][0] - now)
+                    wait = retry_in if wait is None else min(wait, retry_in)
+                self._work.wait(wait)
+
+    def _work_loop(self):
+        while True:
+            with self._lock:
+                while not self._ready_heap and not self._closed:
+                    self._ready.wait()
+                if not self._ready_heap:
+                    return
+                _, _, job = heapq.heappop(self._ready_heap)
+            self._execute(job)
+
+    def _execute(self, job):
+        if job.attempts == 0:
+            if not job.future.set_running_or_notify_cancel():
+                return
+            with self._lock:
+                self._queue_waits[job.priority].append(time.monotonic() - job.enqueued_at)
+        try:
+            result = job.func()
+        except Exception as e:
+            retryable = is_retryable_error(e)
+            with self._lock:
+                if getattr(e, 'status', None) == 429:
+                    self.stats['rate_limited_by_twilio'] += 1
+                if retryable and job.attempts < self.max_retries and not self._closed:
+                    job.attempts += 1
+                    delay = min(self.backoff_max_seconds, self.backoff_seconds * (2 ** (job.attempts - 1)))
+                    delay *= random.uniform(0.5, 1.5)
+                    heapq.heappush(self._retry_heap, (time.monotonic() + delay, next(self._seq), job))
+                    self.stats['retried'] += 1
+                    self._work.notify()
+                    logger.warning(f"[{self.name}] Error {getattr(e, 'status', '?')} de Twilio desde {job.from_number}, "
+                                   f"reintento {job.attempts}/{self.max_retries} en {delay:.1f}s")
+                    return
+                self.stats['failed'] += 1
+            job.future.set_exception(e)
+        else:
+            with self._lock:
+                self.stats['sent'] += 1
+                self._latencies[job.priority].append(time.monotonic() - job.enqueued_at)
+            job.future.set_result(result)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            queued = {name: 0 for name in PRIORITY_NAMES.values()}
+            por_numero = {}
+            for from_number, sender in self._senders.items():
+                for priority, lane in sender.lanes.items():
+                    queued[PRIORITY_NAMES[priority]] += len(lane)
+                if sender.pending():
+                    por_numero[from_number] = sender.pending()
+            stats['queued'] = queued
+            stats['queued_by_sender'] = por_numero
+            stats['ready'] = len(self._ready_heap)
+            stats['waiting_retry'] = len(self._retry_heap)
+            stats['latency_ms'] = {PRIORITY_NAMES[p]: _summary(samples) for p, samples in self._latencies.items()}
+            stats['queue_wait_ms'] = {PRIORITY_NAMES[p]: _summary(samples) for p, samples in self._queue_waits.items()}
+        stats['rate_per_second'] = self.rate
+        stats['workers'] = len(self._workers)
+        return stats
+
+    def shutdown(self, timeout=10):
+        """Deja de planificar y envía ya mismo lo que quedaba en cola (sin más reintentos)."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            remaining = [job for _, _, job in self._retry_heap]
+            self._retry_heap = []
+            for sender in self._senders.values():
+                job = sender.pop()
+                while job is not None:
+                    remaining.append(job)
+                    job = sender.pop()
+            for job in remaining:
+                heapq.heappush(self._ready_heap, (job.priority, next(self._seq), job))
+            self._work.notify_all()
+            self._ready.notify_all()
+        if remaining:
+            logger.warning(f"[{self.name}] Cierre con {len(remaining)} envíos en cola, enviándolos ahora")
+        deadline = time.monotonic() + timeout
+        for worker in self._workers:
+            worker.join(max(0, deadline - time.monotonic()))
+
+def _summary(samples):
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+    return {
+        'count': len(ordered),
+        'avg': round(sum(ordered) / len(ordered) * 1000, 1),
+        'p50': round(ordered[len(ordered) // 2] * 1000, 1),
+        'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1),
+        'max': round(ordered[-1] * 1000, 1)
+    }
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+def get_outbound_dispatcher():
+    """Despachador del proceso (se crea al primer uso)."""
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = OutboundDispatcher(
+                    workers=OUTBOUND_WORKERS,
+                    rate_per_second=OUTBOUND_RATE_PER_SECOND,
+                    max_retries=OUTBOUND_MAX_RETRIES,
+                    backoff_seconds=OUTBOUND_BACKOFF_SECONDS,
+                    backoff_max_seconds=OUTBOUND_BACKOFF_MAX_SECONDS
+                )
+                atexit.register(_dispatcher.shutdown)
+    return _dispatcher
+
+def dispatch_send(from_number, func, priority=PRIORITY_INTERACTIVE):
+    """
+    Ejecuta func() (una llamada a messages.create) a través del despachador y devuelve su resultado.
+    Con OUTBOUND_DISPATCHER_ENABLED=false se llama directo, como antes.
+    """
+    if not OUTBOUND_DISPATCHER_ENABLED:
+        return func()
+    return get_outbound_dispatcher().send(from_number, func, priority)
+
+def get_dispatcher_stats():
+    if not OUTBOUND_DISPATCHER_ENABLED:
+        return {'enabled': False}
+    if _dispatcher is None:
+        return {'enabled': True, 'started': False}
+    stats = _dispatcher.get_stats()
+    stats['enabled'] = True
+    return stats
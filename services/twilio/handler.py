@@ -6,7 +6,8 @@ import json
 import random
 import time
 import os
-from services.twilio.messaging import send_whatsapp_message
+from services.twilio.messaging import send_whatsapp_message, send_whatsapp_message_async
+from services.twilio.dispatcher import PRIORITY_NORMAL
 from services.twilio.utils import es_consulta_relevante, get_or_create_session, validar_paso_reserva, get_day_name
 from services.twilio.reservation_handler import handle_reservation_flow, RESERVATION_STATES
 from services.ai.deepseek_service import DeepSeekService
@@ -1045,39 +1046,29 @@ def handle_whatsapp_message(message, from_number, restaurant_config, message_sid
 def request_feedback_after_reservation(from_number, restaurant_config, delay_minutes=2):
     """
     Solicita feedback al cliente después de un tiempo de la reserva confirmada.
+    El envío queda guardado en el planificador persistente (sobrevive a reinicios).
     
     Args:
         from_number (str): Número de WhatsApp del cliente
         restaurant_config (dict): Configuración del restaurante
         delay_minutes (int): Minutos a esperar antes de solicitar feedback
     """
-    import threading
-    import time
-    
-    def delayed_feedback_request():
-        try:
-            # Esperar el tiempo especificado
-            time.sleep(delay_minutes * 60)
-            
-            restaurant_name = restaurant_config.get('nombre_restaurante', 'el restaurante')
-            
-            mensaje_feedback = f"¡Hola! 😊\n\n"
-            mensaje_feedback += f"Esperamos que hayas disfrutado de tu experiencia en {restaurant_name}.\n\n"
-            mensaje_feedback += f"¿Te gustaría dejarnos tu opinión? Nos ayuda mucho a mejorar:\n\n"
-            mensaje_feedback += f"• Puedes calificarnos del 1 al 5 (donde 5 es excelente)\n"
-            mensaje_feedback += f"• O simplemente contarnos cómo te pareció todo\n\n"
-            mensaje_feedback += f"¡Tu opinión es muy valiosa para nosotros! ⭐"
-            
-            send_whatsapp_message(from_number, mensaje_feedback, restaurant_config)
-            logger.info(f"✅ Solicitud de feedback enviada a {from_number} para restaurante {restaurant_name}")
-            
-        except Exception as e:
-            logger.error(f"❌ Error enviando solicitud de feedback a {from_number}: {str(e)}")
-    
-    # Ejecutar en un hilo separado para no bloquear el flujo principal
-    feedback_thread = threading.Thread(target=delayed_feedback_request)
-    feedback_thread.daemon = True
-    feedback_thread.start()
+    try:
+        restaurant_name = restaurant_config.get('nombre_restaurante', 'el restaurante')
+        
+        mensaje_feedback = f"¡Hola! 😊\n\n"
+        mensaje_feedback += f"Esperamos que hayas disfrutado de tu experiencia en {restaurant_name}.\n\n"
+        mensaje_feedback += f"¿Te gustaría dejarnos tu opinión? Nos ayuda mucho a mejorar:\n\n"
+        mensaje_feedback += f"• Puedes calificarnos del 1 al 5 (donde 5 es excelente)\n"
+        mensaje_feedback += f"• O simplemente contarnos cómo te pareció todo\n\n"
+        mensaje_feedback += f"¡Tu opinión es muy valiosa para nosotros! ⭐"
+        
+        send_whatsapp_message_async(from_number, mensaje_feedback, restaurant_config,
+                                    delay=delay_minutes * 60, priority=PRIORITY_NORMAL)
+        logger.info(f"✅ Solicitud de feedback programada para {from_number} en {delay_minutes} minuto(s) ({restaurant_name})")
+        
+    except Exception as e:
+        logger.error(f"❌ Error programando solicitud de feedback a {from_number}: {str(e)}")
 
 def detect_and_save_feedback(from_number, message, restaurant_config):
     """
@@ -0,0 +1,164 @@
+"""
+Deduplicación de mensajes entrantes por MessageSid.
+
+Cuando el webhook tarda, Twilio reintenta la misma entrega con el mismo
+MessageSid y, sin este control, la reserva o el feedback se registran dos veces.
+claim_message() marca el SID como visto y devuelve False si ya lo estaba; se
+llama antes de cualquier consulta a la base o a la IA.
+
+Backends (MESSAGE_DEDUP_BACKEND):
+- 'sqlite' (default): tabla processed_messages en MESSAGE_DEDUP_DB_PATH, compartida
+  por todos los workers de gunicorn del host.
+- 'memory': diccionario acotado en el proceso (no se comparte entre workers).
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from config import MESSAGE_DEDUP_BACKEND, MESSAGE_DEDUP_DB_PATH, MESSAGE_DEDUP_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+class MemoryMessageStore:
+    def __init__(self, ttl_seconds, max_entries=50000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._seen = OrderedDict()  # message_sid -> monotonic de la primera vez
+        self._lock = threading.Lock()
+
+    def claim(self, message_sid):
+        now = time.monotonic()
+        with self._lock:
+            # Las entradas están en orden de llegada: descartar las vencidas del principio
+            while self._seen:
+                oldest_sid, seen_at = next(iter(self._seen.items()))
+                if now - seen_at <= self.ttl_seconds and len(self._seen) < self.max_entries:
+                    break
+                self._seen.popitem(last=False)
+            if message_sid in self._seen:
+                return False
+            self._seen[message_sid] = now
+            return True
+
+    def release(self, message_sid):
+        with self._lock:
+            self._seen.pop(message_sid, None)
+
+class SqliteMessageStore:
+    PRUNE_EVERY = 500
+
+    def __init__(self, db_path, ttl_seconds):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._claims = 0
+        self._claims_lock = threading.Lock()
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS processed_messages ("
+                " message_sid TEXT PRIMARY KEY,"
+                " seen_at REAL NOT NULL"
+                ") WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_processed_messages_seen_at ON processed_messages (seen_at)")
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def claim(self, message_sid):
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO processed_messages (message_sid, seen_at) VALUES (?, ?)",
+                (message_sid, now)
+            )
+            claimed = cursor.rowcount == 1
+            if not claimed:
+                # Un SID vencido cuenta como nuevo
+                cursor = conn.execute(
+                    "UPDATE processed_messages SET seen_at = ? WHERE message_sid = ? AND seen_at < ?",
+                    (now, message_sid, now - self.ttl_seconds)
+                )
+                claimed = cursor.rowcount == 1
+        with self._claims_lock:
+            self._claims += 1
+            prune_due = self._claims % self.PRUNE_EVERY == 0
+        if prune_due:
+            self.prune()
+        return claimed
+
+    def release(self, message_sid):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM processed_messages WHERE message_sid = ?", (message_sid,))
+
+    def prune(self):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM processed_messages WHERE seen_at < ?", (time.time() - self.ttl_seconds,))
+
+_store = None
+_store_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'errors': 0}
+_stats_lock = threading.Lock()
+
+def _get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if MESSAGE_DEDUP_BACKEND == 'memory':
+                    _store = MemoryMessageStore(MESSAGE_DEDUP_TTL_SECONDS)
+                else:
+                    _store = SqliteMessageStore(MESSAGE_DEDUP_DB_PATH, MESSAGE_DEDUP_TTL_SECONDS)
+    return _store
+
+def _count(counter):
+    with _stats_lock:
+        _stats[counter] += 1
+
+def claim_message(message_sid):
+    """
+    Registra el MessageSid como procesado.
+
+    Returns:
+        bool: True si es la primera entrega (hay que procesarla), False si es un reintento.
+              Ante errores del almacenamiento devuelve True para no perder mensajes.
+    """
+    if not message_sid:
+        return True
+    try:
+        claimed = _get_store().claim(message_sid)
+    except Exception as e:
+        _count('errors')
+        logger.error(f"Error en deduplicación de mensajes, se procesa igual: {str(e)}")
+        return True
+    _count('misses' if claimed else 'hits')
+    return claimed
+
+def release_message(message_sid):
+    """Libera un MessageSid para que un reintento de Twilio pueda procesarlo (p. ej. si el procesamiento falló)."""
+    if not message_sid:
+        return
+    try:
+        _get_store().release(message_sid)
+    except Exception as e:
+        logger.error(f"Error liberando MessageSid {message_sid}: {str(e)}")
+
+def get_dedup_stats():
+    with _stats_lock:
+        return dict(_stats, backend=MESSAGE_DEDUP_BACKEND)
@@ -1,15 +1,16 @@
 import traceback
 import json
-import time
-import threading
 import logging
-from twilio.rest import Client
 from twilio.base.exceptions import TwilioRestException
 from datetime import datetime
 
 # Importar desde el archivo config.py raíz - Global template SID might still be used or also moved to restaurant_config
 from config import TWILIO_TEMPLATE_SID
 
+from services.twilio.client_pool import get_twilio_client
+from services.twilio.dispatcher import dispatch_send, PRIORITY_INTERACTIVE, PRIORITY_NORMAL
+from services.job_scheduler import get_job_scheduler
+
 # Importar desde demo_utils para verificar si es un restaurante de demostración
 from utils.demo_utils import is_demo_restaurant
 
@@ -19,7 +20,7 @@ logger = logging.getLogger(__name__)
 # Modo de prueba - se activa cuando las credenciales de Twilio fallan
 TEST_MODE = False
 
-def send_whatsapp_message_mock(to_number, message, restaurant_config, content_variables=None, template_sid_override=None, with_typing=False):
+def send_whatsapp_message_mock(to_number, message, restaurant_config, content_variables=None, template_sid_override=None):
     """
     Función mock que simula el envío de mensajes de WhatsApp para pruebas
     """
@@ -47,11 +48,17 @@ def send_whatsapp_message_mock(to_number, message, restaurant_config, content_va
         logger.error(f"[MODO PRUEBA] Error en simulación de envío: {str(e)}")
         return None
 
+def is_real_message_sid(sid):
+    """False para None y para el SID simulado que devuelve el modo de prueba cuando Twilio falla."""
+    return bool(sid) and 'mock' not in sid
+
 # Modified to accept restaurant_config for dynamic credentials
-def send_whatsapp_message(to_number, message, restaurant_config, content_variables=None, template_sid_override=None, with_typing=False):
+def send_whatsapp_message(to_number, message, restaurant_config, content_variables=None, template_sid_override=None,
+                          priority=PRIORITY_INTERACTIVE):
     """
-    Envía un mensaje de WhatsApp usando Twilio, con soporte para templates, botones interactivos
-    y el efecto de "escribiendo..." (typing indicator).
+    Envía un mensaje de WhatsApp usando Twilio, con soporte para templates y botones interactivos.
+    Para demorar un envío (p. ej. simular que se está escribiendo) usar
+    send_whatsapp_message_async(delay=...), que lo programa sin bloquear el hilo.
     Utiliza credenciales específicas del restaurante desde restaurant_config.
     Si el restaurante es el de demostración, utiliza la configuración de sandbox de Twilio.
     
@@ -62,7 +69,7 @@ def send_whatsapp_message(to_number, message, restaurant_config, content_variabl
                                   con 'twilio_account_sid', 'twilio_auth_token', 'twilio_phone_number'.
         content_variables (dict): Variables para el template
         template_sid_override (str): ID del template a usar (sobrescribe el global o el del restaurante si se define allí)
-        with_typing (bool): Si es True, muestra el indicador "escribiendo..." antes de enviar el mensaje
+        priority (int): Carril del despachador saliente (PRIORITY_INTERACTIVE, PRIORITY_NORMAL o PRIORITY_BULK)
     
     Returns:
         str: SID del mensaje enviado o None si hay error
@@ -122,18 +129,8 @@ def send_whatsapp_message(to_number, message, restaurant_config, content_variabl
         
         logger.info(f"Enviando mensaje desde {from_whatsapp} (Restaurante: {restaurant_config.get('nombre_restaurante', 'Desconocido')}) a {to_number}")
         
-        # Inicializar cliente de Twilio con las credenciales del restaurante
-        client = Client(twilio_account_sid, twilio_auth_token)
-        
-        # Typing indicator logic (can remain as is, or be enhanced)
-        if with_typing and not template_sid_override: # Only if not using a template, as templates might have their own timing
-            try:
-                # Simular efecto de escritura basado en la longitud del mensaje
-                wait_time = min(3, max(1, len(message) * 0.01))
-                time.sleep(wait_time)
-                logger.debug(f"Esperado {wait_time} segundos para simular escritura")
-            except Exception as typing_error:
-                logger.error(f"Error al simular demora de escritura: {str(typing_error)}")
+        # Cliente compartido de la cuenta (reutiliza conexiones entre mensajes)
+        client = get_twilio_client(twilio_account_sid, twilio_auth_token)
         
         message_args = {
             'from_': from_whatsapp,
@@ -155,8 +152,8 @@ def send_whatsapp_message(to_number, message, restaurant_config, content_variabl
         else:
             message_args['body'] = message
 
-        # Enviar el mensaje
-        sent_message = client.messages.create(**message_args) 
+        # Enviar el mensaje por el despachador (límite por número de origen y reintentos ante 429/5xx)
+        sent_message = dispatch_send(from_whatsapp, lambda: client.messages.create(**message_args), priority)
         
         logger.info(f"Mensaje enviado con SID: {sent_message.sid} para restaurante {restaurant_config.get('id')}")
         return sent_message.sid
@@ -166,25 +163,64 @@ def send_whatsapp_message(to_number, message, restaurant_config, content_variabl
         # Si hay error de autenticación, usar modo de prueba
         if "20003" in str(twilio_error) or "Authenticate" in str(twilio_error):
             logger.warning("Credenciales de Twilio inválidas, activando modo de prueba")
-            return send_whatsapp_message_mock(to_number, message, restaurant_config, content_variables, template_sid_override, with_typing)
+            return send_whatsapp_message_mock(to_number, message, restaurant_config, content_variables, template_sid_override)
         return None
     except Exception as e:
         logger.error(f"Error general al enviar mensaje de WhatsApp para restaurante {restaurant_config.get('id', 'N/A')}: {str(e)}")
         logger.error(traceback.format_exc())
         # En caso de cualquier error, intentar modo de prueba
         logger.warning("Error general, intentando modo de prueba")
-        return send_whatsapp_message_mock(to_number, message, restaurant_config, content_variables, template_sid_override, with_typing)
+        return send_whatsapp_message_mock(to_number, message, restaurant_config, content_variables, template_sid_override)
+
+SCHEDULED_SEND_JOB = 'whatsapp_send'
+
+def _scheduled_restaurant_config(restaurant_config):
+    """Lo que send_whatsapp_message usa de la configuración, sin credenciales: se guarda en la tabla de trabajos."""
+    config = (restaurant_config or {}).get('config') or {}
+    return {
+        'id': (restaurant_config or {}).get('id'),
+        'nombre_restaurante': (restaurant_config or {}).get('nombre_restaurante'),
+        'config': {key: config[key] for key in ('twilio_phone_number', 'twilio_template_sid') if config.get(key)}
+    }
+
+def _run_scheduled_send(payload):
+    # send_whatsapp_message no lanza excepciones: sin SID real (None o el del modo de prueba)
+    # el envío falló y el planificador tiene que reintentarlo en lugar de darlo por hecho
+    sid = send_whatsapp_message(
+        payload['to_number'], payload['message'], payload['restaurant_config'],
+        payload.get('content_variables'), payload.get('template_sid_override'),
+        priority=payload.get('priority', PRIORITY_NORMAL)
+    )
+    if not is_real_message_sid(sid):
+        raise RuntimeError(f"No se pudo enviar el mensaje programado a {payload['to_number']} (SID: {sid})")
+    return sid
+
+def start_scheduled_sends():
+    """
+    Registra el envío diferido en el planificador persistente y arranca su temporizador
+    (idempotente). Lo llama solo la app web (app.py); los scripts únicamente encolan.
+    """
+    scheduler = get_job_scheduler()
+    scheduler.register(SCHEDULED_SEND_JOB, _run_scheduled_send)
+    scheduler.start()
+    return scheduler
 
 # Función que envía mensajes en segundo plano, útil para respuestas largas o múltiples
-# Needs to accept restaurant_config as well
-def send_whatsapp_message_async(to_number, message, restaurant_config, delay=0, content_variables=None, template_sid_override=None):
-    """Envía un mensaje de WhatsApp en un hilo separado después de un retraso opcional."""
-    
-    def send_after_delay():
-        if delay > 0:
-            time.sleep(delay)
-        send_whatsapp_message(to_number, message, restaurant_config, content_variables, template_sid_override)
-
-    thread = threading.Thread(target=send_after_delay)
-    thread.start()
-    print(f"Mensaje programado para envío asíncrono a {to_number} para restaurante {restaurant_config.get('id')}")
\ No newline at end of file
+def send_whatsapp_message_async(to_number, message, restaurant_config, delay=0, content_variables=None, template_sid_override=None,
+                                priority=PRIORITY_NORMAL):
+    """
+    Programa el envío de un mensaje de WhatsApp tras un retraso opcional, sin bloquear
+    el hilo que llama. El envío se guarda en el planificador persistente, así que
+    sobrevive a un reinicio, y lo ejecuta el temporizador de la app web (un script que
+    encola no arranca el suyo). Devuelve el id del trabajo.
+    """
+    job_id = get_job_scheduler().schedule(SCHEDULED_SEND_JOB, {
+        'to_number': to_number,
+        'message': message,
+        'restaurant_config': _scheduled_restaurant_config(restaurant_config),
+        'content_variables': content_variables,
+        'template_sid_override': template_sid_override,
+        'priority': priority
+    }, delay_seconds=delay)
+    logger.info(f"Mensaje programado para envío asíncrono a {to_number} en {delay}s para restaurante {restaurant_config.get('id')}")
+    return job_id
@@ -2,11 +2,11 @@ import logging
 import traceback
 import random
 from datetime import datetime, timedelta
-from config import SUPABASE_ENABLED
+from config import SUPABASE_ENABLED, REMINDER_RESPONSE_WINDOW_MINUTES
 from db.supabase_client import supabase_client
 from services.twilio.messaging import send_whatsapp_message
-from utils.session_manager import get_session, save_session, delete_session
-from utils.phone_utils import normalize_argentine_phone, get_phone_variants
+from services.reminder_index import get_reminder, update_reminder, delete_reminder
+from services.reservas.daily_stats import registrar_en_estadisticas
 
 logger = logging.getLogger(__name__)
 
@@ -129,32 +129,18 @@ def send_help_message(phone_number: str, restaurant_config: dict) -> str:
 
 def get_user_session_data(phone_number: str, restaurant_id: str) -> dict:
     """
-    Obtiene los datos de la sesión del usuario para el recordatorio enviado, específico del restaurante.
+    Obtiene los datos del recordatorio enviado al usuario en el restaurante.
+    Se resuelve con una búsqueda en el índice de recordatorios por número canónico,
+    sin importar el formato en que llegue phone_number. Solo cuenta si se escribió
+    dentro de REMINDER_RESPONSE_WINDOW_MINUTES.
     """
     try:
-        logger.info(f"🔍 DEBUG: Intentando obtener sesión para: {phone_number} en Restaurante ID: {restaurant_id}")
-        
-        phone_variants = get_phone_variants(phone_number)
-        logger.info(f"🔍 DEBUG: Probando variantes de número: {phone_variants} para R:{restaurant_id}")
-        
-        for variant in phone_variants:
-            logger.info(f"🔍 DEBUG: Probando variante: {variant}")
-            session = get_session(variant, restaurant_id) 
-            if session:
-                logger.info(f"🔍 DEBUG: Sesión encontrada para variante: {variant} en R:{restaurant_id}")
-                logger.info(f"🔍 DEBUG: Contenido completo de sesión: {session}")
-                
-                if 'reminder_data' in session:
-                    logger.info(f"✅ DEBUG: reminder_data encontrado para {variant} en R:{restaurant_id}: {session['reminder_data']}")
-                    return session['reminder_data']
-                else:
-                    logger.warning(f"⚠️ DEBUG: Sesión encontrada pero sin 'reminder_data' para {variant} en R:{restaurant_id}")
-                    logger.warning(f"⚠️ DEBUG: Claves disponibles en sesión: {list(session.keys())}")
-            else:
-                logger.info(f"🔍 DEBUG: No se encontró sesión para variante: {variant}")
-        
-        logger.warning(f"❌ DEBUG: No se encontró sesión o 'reminder_data' para ninguna variante de {phone_number} en R:{restaurant_id}")
-        return None
+        reminder_data = get_reminder(phone_number, restaurant_id, REMINDER_RESPONSE_WINDOW_MINUTES * 60)
+        if reminder_data:
+            logger.info(f"✅ reminder_data encontrado para {phone_number} en R:{restaurant_id}: {reminder_data}")
+        else:
+            logger.info(f"No hay recordatorio indexado para {phone_number} en R:{restaurant_id}")
+        return reminder_data
         
     except Exception as e:
         logger.error(f"Error al obtener la sesión del usuario para R:{restaurant_id}: {str(e)}")
@@ -176,20 +162,13 @@ def mark_conversation_completed(phone_number: str, restaurant_id: str, status: s
     try:
         logger.info(f"Marcando conversación como {status} para {phone_number} en R:{restaurant_id}")
         
-        current_session = get_session(phone_number, restaurant_id)
-        if not current_session:
-            current_session = {}
-
-        if 'reminder_data' not in current_session:
-            current_session['reminder_data'] = {}
-            logger.info(f"Clave 'reminder_data' creada en sesión para {phone_number} R:{restaurant_id}")
-        
-        current_session['reminder_data']['conversation_status'] = status
-        current_session['reminder_data']['completed_at'] = datetime.now().isoformat()
-        current_session['reminder_data']['is_reminder'] = True
-
-        save_session(phone_number, current_session, restaurant_id)
-        logger.info(f"Sesión guardada con estado de conversación {status} para {phone_number} R:{restaurant_id}")
+        update_reminder(
+            phone_number, restaurant_id,
+            conversation_status=status,
+            completed_at=datetime.now().isoformat(),
+            is_reminder=True
+        )
+        logger.info(f"Recordatorio actualizado con estado de conversación {status} para {phone_number} R:{restaurant_id}")
         
         return True
     except Exception as e:
@@ -219,16 +198,8 @@ def reset_user_session(phone_number: str, restaurant_id: str, restaurant_config:
     """
     logger.info(f"Iniciando reinicio de sesión para {phone_number} en R:{restaurant_id}")
     try:
-        current_session = get_session(phone_number, restaurant_id)
-        if current_session and 'reminder_data' in current_session:
-            del current_session['reminder_data']
-            save_session(phone_number, current_session, restaurant_id)
-            logger.info(f"Datos de recordatorio eliminados de la sesión para {phone_number} R:{restaurant_id}")
-        elif current_session:
-            save_session(phone_number, current_session, restaurant_id)
-        else:
-            logger.info(f"No se encontró sesión existente para {phone_number} R:{restaurant_id} para limpiar reminder_data.")
-
+        # Descartar los datos del recordatorio y dejar solo la marca de conversación reiniciada
+        delete_reminder(phone_number, restaurant_id)
         mark_conversation_completed(phone_number, restaurant_id, "reset")
 
         restaurant_name = restaurant_config.get('nombre_restaurante', 'el restaurante')
@@ -270,6 +241,7 @@ def process_confirmation(phone_number: str, restaurant_id: str, restaurant_confi
                 response = supabase_client.table('reservas_prod').update(update_data).eq('id', reserva_id).eq('restaurante_id', restaurant_id).execute()
                 
                 if response.data:
+                    registrar_en_estadisticas(response.data)
                     logger.info(f"Reserva {reserva_id} actualizada a 'Confirmada' en Supabase para R:{restaurant_id}.")
                     mark_conversation_completed(phone_number, restaurant_id, "confirmed")
                     mensaje_confirmacion = f"¡Gracias! Tu reserva en {restaurant_name} ha sido confirmada exitosamente. ¡Te esperamos!"
@@ -321,6 +293,7 @@ def process_cancellation(phone_number: str, restaurant_id: str, restaurant_confi
                 response = supabase_client.table('reservas_prod').update(update_data).eq('id', reserva_id).eq('restaurante_id', restaurant_id).execute()
                 
                 if response.data:
+                    registrar_en_estadisticas(response.data)
                     logger.info(f"Reserva {reserva_id} actualizada a 'Cancelada' en Supabase para R:{restaurant_id}.")
                     mark_conversation_completed(phone_number, restaurant_id, "cancelled")
                     mensaje_cancelacion = f"Tu reserva en {restaurant_name} ha sido cancelada exitosamente. Esperamos verte en otra ocasión."
@@ -6,6 +6,7 @@ from routes.bot import validar_fecha_reserva, verificar_capacidad_disponible
 from services.twilio.messaging import send_whatsapp_message
 from utils.session_manager import save_session
 from db.supabase_client import supabase_client
+from services.reservas.daily_stats import registrar_en_estadisticas
 from services.twilio.intelligent_parser import intelligent_parser
 import logging
 import locale
@@ -361,9 +362,10 @@ async def process_persons_input(from_number, message, restaurant_config, session
             send_whatsapp_message(from_number, mensaje, restaurant_config)
             return None  # No enviar mensaje de debug al cliente
         
-        # Verificar capacidad disponible usando el sistema existente
+        # Verificar capacidad disponible (en la franja de la hora, si ya la indicó)
         fecha_str = reservation_data['fecha']
-        hay_capacidad, mensaje_error, capacidad_disponible = await verificar_capacidad_disponible(fecha_str, personas, restaurant_config)
+        hay_capacidad, mensaje_error, capacidad_disponible = await verificar_capacidad_disponible(
+            fecha_str, personas, restaurant_config, reservation_data.get('hora'))
         
         if not hay_capacidad:
             # Ofrecer alternativas inteligentes
@@ -671,6 +673,7 @@ async def save_reservation(from_number, restaurant_config, session, reservation_
             result = supabase.table("reservas_prod").insert(reserva_data).execute()
             
             if result.data:
+                registrar_en_estadisticas(result.data)
                 logger.info(f"✅ SAVE: Reserva guardada exitosamente para {from_number}")
                 logger.info(f"📧 SAVE: Email guardado: {reservation_data['email']}")
                 
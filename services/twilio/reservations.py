@@ -138,6 +138,8 @@ def handle_reservation_confirmation(phone_number, confirmed):
                     logging.info(f"Reintento de actualización: {response}")
                     
                     if hasattr(response, 'data') and response.data and len(response.data) > 0:
+                        from services.reservas.daily_stats import registrar_en_estadisticas
+                        registrar_en_estadisticas(response.data)
                         resultado = {"success": True, "message": f"Estado actualizado a {nuevo_estado}"}
                         logging.info("Actualización exitosa en el reintento")
             except Exception as e:
@@ -242,7 +244,7 @@ def check_upcoming_reservations():
         from config import SUPABASE_ENABLED, TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_WHATSAPP_NUMBER
         from services.db.supabase import get_supabase_client
         from datetime import datetime, timedelta
-        from twilio.rest import Client
+        from services.twilio.client_pool import get_twilio_client
         
         # Inicializar contadores para seguimiento
         resultado = {
@@ -264,7 +266,7 @@ def check_upcoming_reservations():
         
         # Obtener cliente de Twilio
         try:
-            twilio_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+            twilio_client = get_twilio_client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
         except Exception as e:
             logging.error(f"Error al inicializar cliente de Twilio: {str(e)}")
             return resultado
@@ -76,7 +76,7 @@ def get_day_name(fecha_str):
         return fecha_str # Return original string if date parsing fails
 
 # Gestión de sesiones para el flujo de reservas
-# SESSIONS = {} # This global in-memory dict is removed, using file-based session_manager directly.
+# SESSIONS = {} # This global in-memory dict is removed, using utils.session_manager (pluggable backend) directly.
 
 def get_or_create_session(phone_number, restaurant_id):
     """Obtiene o crea una sesión para un número de teléfono y restaurante específicos."""
@@ -0,0 +1,50 @@
+"""
+Cola de procesamiento en segundo plano para el webhook de WhatsApp.
+
+Con WEBHOOK_PROCESSING_MODE=async el webhook valida el mensaje, lo encola aquí y
+responde a Twilio enseguida con TwiML vacío; las respuestas se envían después por
+la API REST. Cada conversación (número 'To' del restaurante + remitente) tiene su
+propio carril en un KeyedExecutor: sus mensajes se procesan de a uno y en orden,
+mientras que conversaciones distintas avanzan en paralelo. Si el carril (o la
+cola) está lleno, el webhook responde 503 y Twilio reintenta: un mensaje nunca
+se procesa fuera de su carril.
+
+La cola vive en memoria del proceso: los mensajes encolados se pierden si el
+worker de gunicorn muere antes de procesarlos.
+"""
+import atexit
+import logging
+import threading
+
+from config import WEBHOOK_WORKERS, WEBHOOK_QUEUE_SIZE, WEBHOOK_LANE_DEPTH
+from utils.keyed_executor import KeyedExecutor
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_webhook_pool():
+    """Pool compartido del proceso para procesar mensajes entrantes (se crea al primer uso)."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = KeyedExecutor(
+                    max_workers=WEBHOOK_WORKERS,
+                    max_lane_depth=WEBHOOK_LANE_DEPTH,
+                    max_pending=WEBHOOK_QUEUE_SIZE,
+                    name='webhook'
+                )
+                atexit.register(_pool.shutdown)
+                logger.info(
+                    f"Cola del webhook iniciada con {WEBHOOK_WORKERS} hilos "
+                    f"(máx. {WEBHOOK_QUEUE_SIZE} mensajes, {WEBHOOK_LANE_DEPTH} por conversación)"
+                )
+    return _pool
+
+def conversation_key(twilio_to_number, sender):
+    """Clave de carril: el número 'To' identifica al restaurante antes de resolver su configuración."""
+    to_number = (twilio_to_number or '').replace('whatsapp:', '').strip()
+    from_number = (sender or '').replace('whatsapp:', '').strip()
+    return (to_number, from_number)
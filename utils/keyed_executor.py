@@ -0,0 +1,129 @@
+"""
+Ejecutor con "carriles" por clave.
+
+Las tareas con la misma clave (por ejemplo restaurante + teléfono) se ejecutan
+de a una y en el orden en que llegaron; las de claves distintas corren en
+paralelo sobre un pool de hilos compartido. Un carril ejecuta una tarea por
+turno y vuelve al final de la cola del pool, así un remitente con muchos
+mensajes no acapara un hilo frente a los demás.
+
+La profundidad de cada carril y el total de tareas pendientes están acotados:
+submit() devuelve False cuando no hay lugar (contrapresión). El llamador debe
+rechazar la tarea (por ejemplo, responder 503 para que se reintente) y no
+ejecutarla por fuera: correría en paralelo con las de su carril y se perdería
+el orden que el carril garantiza.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+class KeyedExecutor:
+    def __init__(self, max_workers, max_lane_depth, max_pending, name='keyed'):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.max_lane_depth = max(1, max_lane_depth)
+        self.max_pending = max(1, max_pending)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        # Un carril existe en el dict mientras tenga un ejecutor agendado o corriendo
+        self._lanes = {}
+        self._pending = 0
+        self._running = 0
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._closed = False
+        self.stats = {
+            'submitted': 0, 'completed': 0, 'failed': 0,
+            'rejected_lane_full': 0, 'rejected_queue_full': 0,
+            'max_lane_depth_seen': 0, 'max_pending_seen': 0,
+            'total_wait_ms': 0.0, 'max_wait_ms': 0.0
+        }
+
+    def submit(self, key, func, *args, **kwargs):
+        """Encola func(*args, **kwargs) en el carril `key`. Devuelve False si no hay lugar."""
+        with self._lock:
+            if self._closed:
+                return False
+            if self._pending >= self.max_pending:
+                self.stats['rejected_queue_full'] += 1
+                return False
+            lane = self._lanes.get(key)
+            schedule = lane is None
+            if schedule:
+                lane = deque()
+            elif len(lane) >= self.max_lane_depth:
+                self.stats['rejected_lane_full'] += 1
+                return False
+            lane.append((func, args, kwargs, time.monotonic()))
+            if schedule:
+                self._lanes[key] = lane
+            self._pending += 1
+            self.stats['submitted'] += 1
+            self.stats['max_lane_depth_seen'] = max(self.stats['max_lane_depth_seen'], len(lane))
+            self.stats['max_pending_seen'] = max(self.stats['max_pending_seen'], self._pending)
+        if schedule:
+            self._executor.submit(self._run_lane, key)
+        return True
+
+    def _run_lane(self, key):
+        with self._lock:
+            func, args, kwargs, enqueued_at = self._lanes[key].popleft()
+            self._running += 1
+        wait_ms = (time.monotonic() - enqueued_at) * 1000
+        failed = False
+        try:
+            func(*args, **kwargs)
+        except Exception as e:
+            failed = True
+            logger.error(f"[{self.name}] Error en tarea del carril {key}: {str(e)}")
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._pending -= 1
+                self.stats['failed' if failed else 'completed'] += 1
+                self.stats['total_wait_ms'] += wait_ms
+                self.stats['max_wait_ms'] = max(self.stats['max_wait_ms'], wait_ms)
+                reschedule = bool(self._lanes[key])
+                if not reschedule:
+                    del self._lanes[key]
+                if self._pending == 0:
+                    self._idle.notify_all()
+        if reschedule:
+            # Volver al final de la cola del pool: turnos justos entre carriles
+            self._executor.submit(self._run_lane, key)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['pending'] = self._pending
+            stats['running'] = self._running
+            stats['active_lanes'] = len(self._lanes)
+            stats['deepest_lane'] = max((len(lane) for lane in self._lanes.values()), default=0)
+        finished = stats['completed'] + stats['failed']
+        stats['avg_wait_ms'] = round(stats.pop('total_wait_ms') / finished, 2) if finished else 0.0
+        stats['max_wait_ms'] = round(stats['max_wait_ms'], 2)
+        stats['workers'] = self.max_workers
+        return stats
+
+    def wait_idle(self, timeout=None):
+        """Espera hasta que no queden tareas pendientes. Devuelve False si venció el timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def shutdown(self, timeout=10):
+        """Deja de aceptar tareas y espera hasta `timeout` segundos a que terminen las pendientes."""
+        with self._lock:
+            self._closed = True
+        drained = self.wait_idle(timeout)
+        if not drained:
+            logger.warning(f"[{self.name}] Cierre con {self._pending} tareas sin procesar")
+        self._executor.shutdown(wait=drained)
@@ -0,0 +1,63 @@
+"""
+Limitadores de tasa tipo token bucket, seguros entre hilos.
+
+`TokenBucket` limita un único flujo; `KeyedRateLimiter` mantiene un bucket por
+clave (por ejemplo, el número 'From' de Twilio) para respetar el throughput de
+cada remitente sin frenar a los demás.
+"""
+import threading
+import time
+
+class TokenBucket:
+    def __init__(self, rate_per_second, burst=None):
+        self.rate = float(rate_per_second)
+        self.capacity = float(burst if burst is not None else max(1.0, self.rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens=1):
+        """Toma `tokens` si hay disponibles; si no, devuelve los segundos a esperar."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens=1):
+        """Bloquea hasta poder tomar `tokens`. Devuelve el tiempo total esperado en segundos."""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+class KeyedRateLimiter:
+    def __init__(self, rate_per_second, burst=None):
+        self.rate = rate_per_second
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, key):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    bucket = TokenBucket(self.rate, self.burst)
+                    self._buckets[key] = bucket
+        return bucket
+
+    def acquire(self, key, tokens=1):
+        return self.bucket(key).acquire(tokens)
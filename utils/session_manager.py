@@ -1,47 +1,92 @@
-import json
-import os
 import logging
+import threading
 from datetime import datetime, timedelta
 
+from config import SESSION_BACKEND, SESSION_CACHE_MAX_ENTRIES, SESSION_FLUSH_INTERVAL, SESSION_DB_PATH
+from utils.session_backends import (
+    FileSessionBackend, MemorySessionBackend, SqliteSessionBackend, SessionConflictError
+)
+
 logger = logging.getLogger(__name__)
 
-# Simple file-based session storage
-SESSIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'sessions')
 # Tiempo máximo de una sesión (30 minutos)
 SESSION_TIMEOUT = timedelta(minutes=30)
 
-def get_session_file_path(phone_number, restaurant_id):
-    """
-    Obtiene la ruta del archivo de sesión para un número de teléfono y un ID de restaurante.
-    Maneja diferentes formatos de número y asegura que el ID del restaurante sea parte del path.
+_backend = None
+_backend_lock = threading.Lock()
+
+def create_session_backend(backend_name):
+    """Construye el backend de sesiones indicado ('file', 'memory' o 'sqlite')."""
+    if backend_name == 'sqlite':
+        return SqliteSessionBackend(SESSION_DB_PATH)
+    if backend_name == 'memory':
+        return MemorySessionBackend(
+            persistent_backend=FileSessionBackend(),
+            max_entries=SESSION_CACHE_MAX_ENTRIES,
+            ttl_seconds=SESSION_TIMEOUT.total_seconds(),
+            flush_interval=SESSION_FLUSH_INTERVAL
+        )
+    if backend_name != 'file':
+        logger.warning(f"SESSION_BACKEND desconocido '{backend_name}'. Usando backend de archivos.")
+    return FileSessionBackend()
+
+def get_session_backend():
+    """Devuelve el backend de sesiones del proceso, creándolo la primera vez según SESSION_BACKEND."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_session_backend(SESSION_BACKEND)
+                logger.info(f"Backend de sesiones inicializado: {_backend.name}")
+    return _backend
+
+def set_session_backend(backend):
+    """Reemplaza el backend de sesiones (útil para scripts y pruebas). Devuelve el anterior."""
+    global _backend
+    with _backend_lock:
+        previous, _backend = _backend, backend
+    return previous
+
+def flush_sessions():
+    """Fuerza el volcado de las escrituras diferidas del backend actual."""
+    return get_session_backend().flush()
+
+def reap_expired_sessions(max_age=None, dry_run=False):
     """
-    if not restaurant_id:
-        logger.warning("get_session_file_path llamado sin restaurant_id. Usando directorio 'global_sessions'.")
-        restaurant_specific_dir = os.path.join(SESSIONS_DIR, 'global_sessions')
-    else:
-        restaurant_specific_dir = os.path.join(SESSIONS_DIR, str(restaurant_id))
+    Elimina en una sola pasada las sesiones de todos los restaurantes sin actividad
+    en `max_age` (timedelta, por defecto SESSION_TIMEOUT).
 
-    # Asegurar que el directorio específico del restaurante (o global) existe
-    try:
-        if not os.path.exists(restaurant_specific_dir):
-            os.makedirs(restaurant_specific_dir)
-    except Exception as e:
-        logger.error(f"Error al crear directorio de sesiones: {str(e)}")
-        return None
-        
-    # Normalizar el número de teléfono para el nombre del archivo
-    try:
-        phone_clean = phone_number.replace('whatsapp:', '').replace('+', '_')
-        
-        if not phone_clean.startswith('_'):
-            phone_clean = f"_{phone_clean}"
-            
-        filename = f"{phone_clean}.json"
-        
-        return os.path.join(restaurant_specific_dir, filename)
-    except Exception as e:
-        logger.error(f"Error al generar ruta de sesión: {str(e)}")
-        return None
+    Returns:
+        dict: scanned, deleted, bytes_freed y restaurants ({restaurant_id: eliminadas})
+    """
+    max_age = max_age or SESSION_TIMEOUT
+    report = get_session_backend().reap(max_age.total_seconds(), dry_run=dry_run)
+    logger.info(
+        f"Limpieza de sesiones{' (simulada)' if dry_run else ''}: {report['deleted']} de {report['scanned']} "
+        f"eliminadas, {report['bytes_freed']} bytes liberados"
+    )
+    return report
+
+_reaper_thread = None
+
+def start_session_reaper(interval_seconds):
+    """Lanza (una vez por proceso) un hilo que ejecuta reap_expired_sessions cada `interval_seconds`."""
+    global _reaper_thread
+    if interval_seconds <= 0 or (_reaper_thread is not None and _reaper_thread.is_alive()):
+        return _reaper_thread
+
+    def reaper_loop():
+        stop = threading.Event()
+        while not stop.wait(interval_seconds):
+            try:
+                reap_expired_sessions()
+            except Exception as e:
+                logger.error(f"Error en la limpieza periódica de sesiones: {str(e)}")
+
+    _reaper_thread = threading.Thread(target=reaper_loop, name='session-reaper', daemon=True)
+    _reaper_thread.start()
+    logger.info(f"Limpieza periódica de sesiones activada cada {interval_seconds} segundos")
+    return _reaper_thread
 
 def is_session_expired(session_data):
     """
@@ -62,27 +107,17 @@ def get_session(phone_number, restaurant_id):
     Obtiene los datos de sesión para un número de teléfono y un ID de restaurante.
     """
     try:
-        session_file = get_session_file_path(phone_number, restaurant_id)
-        if not session_file:
+        session_data = get_session_backend().load(phone_number, restaurant_id)
+        if session_data is None:
             return None
-            
-        if os.path.exists(session_file):
-            with open(session_file, 'r', encoding='utf-8') as f:
-                session_data = json.load(f)
-                
-                # Verificar si la sesión ha expirado
-                if is_session_expired(session_data):
-                    logger.info(f"Sesión expirada para {phone_number} en R:{restaurant_id}")
-                    delete_session(phone_number, restaurant_id)
-                    return None
-                    
-                return session_data
-        return None
-    except json.JSONDecodeError as e:
-        logger.error(f"Error al decodificar sesión para {phone_number} R:{restaurant_id}: {str(e)}")
-        # Si el archivo está corrupto, intentar eliminarlo
-        delete_session(phone_number, restaurant_id)
-        return None
+
+        # Verificar si la sesión ha expirado
+        if is_session_expired(session_data):
+            logger.info(f"Sesión expirada para {phone_number} en R:{restaurant_id}")
+            delete_session(phone_number, restaurant_id)
+            return None
+
+        return session_data
     except Exception as e:
         logger.error(f"Error al obtener sesión para {phone_number} R:{restaurant_id}: {str(e)}")
         return None
@@ -90,23 +125,20 @@ def get_session(phone_number, restaurant_id):
 def save_session(phone_number, session_data, restaurant_id):
     """
     Guarda los datos de sesión para un número de teléfono y un ID de restaurante.
+    Lanza SessionConflictError si otro worker la modificó sin pausa mientras se guardaba
+    (backend sqlite): el paso no se guardó y el mensaje debe reprocesarse.
     """
     try:
-        session_file = get_session_file_path(phone_number, restaurant_id)
-        if not session_file:
-            return False
-        
-        # Asegurar que el directorio (base y específico del restaurante) existe
-        os.makedirs(os.path.dirname(session_file), exist_ok=True)
-        
         session_data['timestamp'] = datetime.now().isoformat()
-        
-        with open(session_file, 'w', encoding='utf-8') as f:
-            json.dump(session_data, f, indent=2, ensure_ascii=False)
+
+        if not get_session_backend().store(phone_number, session_data, restaurant_id):
+            return False
             
         logger.info(f"Sesión guardada para {phone_number} (Restaurante: {restaurant_id})")
         return True
         
+    except SessionConflictError:
+        raise
     except Exception as e:
         logger.error(f"Error al guardar sesión para {phone_number} (Restaurante: {restaurant_id}): {str(e)}")
         return False
@@ -116,12 +148,7 @@ def delete_session(phone_number, restaurant_id):
     Elimina los datos de sesión para un número de teléfono y un ID de restaurante.
     """
     try:
-        session_file = get_session_file_path(phone_number, restaurant_id)
-        if not session_file:
-            return False
-        
-        if os.path.exists(session_file):
-            os.remove(session_file)
+        if get_session_backend().remove(phone_number, restaurant_id):
             logger.info(f"Sesión eliminada para {phone_number} (Restaurante: {restaurant_id})")
             return True
         logger.info(f"No se encontró sesión para eliminar para {phone_number} (Restaurante: {restaurant_id})")
@@ -133,55 +160,33 @@ def delete_session(phone_number, restaurant_id):
 
 def clear_all_sessions_for_restaurant(restaurant_id):
     """
-    Elimina todos los archivos de sesión para un ID de restaurante específico.
+    Elimina todas las sesiones para un ID de restaurante específico.
     ¡Usar con precaución!
     """
     if not restaurant_id:
         logger.error("clear_all_sessions_for_restaurant llamado sin restaurant_id. Operación cancelada.")
         return False
-        
-    restaurant_specific_dir = os.path.join(SESSIONS_DIR, str(restaurant_id))
-    count = 0
-    if os.path.exists(restaurant_specific_dir):
-        try:
-            for filename in os.listdir(restaurant_specific_dir):
-                file_path = os.path.join(restaurant_specific_dir, filename)
-                if os.path.isfile(file_path) and filename.endswith('.json'):
-                    os.remove(file_path)
-                    count += 1
-            logger.info(f"Se eliminaron {count} sesiones para el restaurante {restaurant_id}.")
-            return True
-        except Exception as e:
-            logger.error(f"Error al eliminar todas las sesiones para el restaurante {restaurant_id}: {str(e)}")
-            return False
-    else:
-        logger.info(f"No se encontró directorio de sesiones para el restaurante {restaurant_id}. No hay sesiones que eliminar.")
+
+    try:
+        count = get_session_backend().clear(restaurant_id)
+        logger.info(f"Se eliminaron {count} sesiones para el restaurante {restaurant_id}.")
         return True
+    except Exception as e:
+        logger.error(f"Error al eliminar todas las sesiones para el restaurante {restaurant_id}: {str(e)}")
+        return False
 
 def clear_all_sessions():
     """
-    Elimina TODOS los archivos de sesión de TODOS los restaurantes.
+    Elimina TODAS las sesiones de TODOS los restaurantes.
     ¡USAR CON EXTREMA PRECAUCIÓN! Ideal para desarrollo o reseteos completos.
     """
-    count = 0
-    if os.path.exists(SESSIONS_DIR):
-        try:
-            for item_name in os.listdir(SESSIONS_DIR):
-                item_path = os.path.join(SESSIONS_DIR, item_name)
-                if os.path.isdir(item_path):
-                    for filename in os.listdir(item_path):
-                        file_path = os.path.join(item_path, filename)
-                        if os.path.isfile(file_path) and filename.endswith('.json'):
-                            os.remove(file_path)
-                            count += 1
-            logger.info(f"Se eliminaron {count} sesiones de todos los directorios.")
-            return True
-        except Exception as e:
-            logger.error(f"Error al eliminar todas las sesiones: {str(e)}")
-            return False
-    else:
-        logger.info("El directorio principal de sesiones no existe. No hay sesiones que eliminar.")
+    try:
+        count = get_session_backend().clear()
+        logger.info(f"Se eliminaron {count} sesiones de todos los directorios.")
         return True
+    except Exception as e:
+        logger.error(f"Error al eliminar todas las sesiones: {str(e)}")
+        return False
 
 def clear_session(phone_number, restaurant_id=None):
     """
@@ -189,14 +194,11 @@ def clear_session(phone_number, restaurant_id=None):
     """
     if restaurant_id is None:
         restaurant_id = "global_sessions"
-    
-    session_file = get_session_file_path(phone_number, restaurant_id)
-    if session_file and os.path.exists(session_file):
-        try:
-            os.remove(session_file)
+
+    try:
+        if get_session_backend().remove(phone_number, restaurant_id):
             logger.info(f"Sesión eliminada para {phone_number} en restaurante {restaurant_id}")
-            return True
-        except Exception as e:
-            logger.error(f"Error eliminando sesión: {str(e)}")
-            return False
-    return True
\ No newline at end of file
+        return True
+    except Exception as e:
+        logger.error(f"Error eliminando sesión: {str(e)}")
+        return False
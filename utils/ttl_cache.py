@@ -0,0 +1,79 @@
+"""
+Caché en memoria con expiración por tiempo (TTL), segura entre hilos.
+
+Se usa para datos que cambian poco y se leen en cada mensaje (configuración de
+restaurantes, resultados agregados, etc.). Cada entrada puede llevar una
+"firma" opcional: si al leer la firma actual no coincide con la guardada, la
+entrada se considera inválida (por ejemplo, mtimes de archivos editados por
+otro worker).
+"""
+import threading
+import time
+
+class TTLCache:
+    def __init__(self, ttl_seconds, max_entries=1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = {}  # key -> (expires_at, signature, value)
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def get(self, key, signature=None):
+        """Devuelve el valor cacheado o None si no existe, expiró o cambió la firma."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, cached_signature, value = entry
+                if expires_at > now and cached_signature == signature:
+                    self.stats['hits'] += 1
+                    return value
+                del self._entries[key]
+            self.stats['misses'] += 1
+            return None
+
+    def set(self, key, value, signature=None, ttl_seconds=None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        if ttl <= 0:
+            return
+        with self._lock:
+            if len(self._entries) >= self.max_entries and key not in self._entries:
+                self._evict_locked()
+            self._entries[key] = (time.monotonic() + ttl, signature, value)
+
+    def _evict_locked(self):
+        now = time.monotonic()
+        expired = [k for k, (expires_at, _, _) in self._entries.items() if expires_at <= now]
+        for k in expired:
+            del self._entries[k]
+        if len(self._entries) >= self.max_entries:
+            # Sin expiradas: descartar la que vence antes
+            oldest = min(self._entries, key=lambda k: self._entries[k][0])
+            del self._entries[oldest]
+
+    def invalidate(self, key):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.stats['invalidations'] += 1
+                return True
+            return False
+
+    def invalidate_where(self, predicate):
+        """Elimina las entradas cuyo (key, value) cumpla el predicado. Devuelve la cantidad."""
+        with self._lock:
+            keys = [k for k, (_, _, value) in self._entries.items() if predicate(k, value)]
+            for k in keys:
+                del self._entries[k]
+            self.stats['invalidations'] += len(keys)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            self.stats['invalidations'] += count
+            return count
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)